@@ -0,0 +1,445 @@
+import json
+import os
+import sqlite3
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+# Shared activity model for the analysis scripts.
+#
+# Activities are parsed once into a columnar table (a structured NumPy
+# array) with SI units and pre-parsed dates:
+#   start       - UTC start as epoch seconds
+#   local_date  - YYYYMMDD in the athlete's local time
+#   month       - YYYYMM in the athlete's local time
+#                 (the older scripts bucket by UTC month instead: utc_month)
+#   distance (m), moving_time / elapsed_time (s), elevation_gain (m),
+#   speeds (m/s), heart rates (bpm, NaN when not recorded)
+# Names are kept in a parallel list so the table itself is all fixed-width.
+#
+# Load from strava.db (one query) or from any of the JSON files in this
+# folder. By default the database snapshot written by ingestion
+# (pro/database/snapshot.py) is memory-mapped instead, so startup costs
+# milliseconds whatever the history size; if the snapshot is missing or
+# was built before strava.db's last data_version bump, the database is
+# queried directly. A snapshot also carries the per-activity aggregates
+# of the feature store (run_type, trimp, gap_speed, ctl, ...).
+# The report scripts load the default and take a JSON file instead as
+# their first argument. They then filter and aggregate whole columns:
+#   runs = load_activities().runs()
+#   runs["distance"].sum()
+#
+# Run directly to benchmark against the dict-of-strings approach:
+#   python activities.py --benchmark
+
+PRO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pro")
+DB_PATH = os.path.join(PRO_DIR, "strava.db")
+
+# Memory-mapped copy of the activities table written by pro/database/snapshot.py
+SNAPSHOT_DIR = os.path.join(PRO_DIR, "data_processed", "snapshot")
+SNAPSHOT_VERSION = 2
+
+MILES_PER_METER = 0.000621371  # the factor the original scripts used
+FEET_PER_METER = 3.28084
+
+MONTH_NAMES = ["January", "February", "March", "April", "May", "June", "July",
+               "August", "September", "October", "November", "December"]
+
+ACTIVITY_DTYPE = np.dtype([
+    ("id", "i8"),
+    ("type", "U16"),
+    ("start", "i8"),
+    ("local_date", "i4"),
+    ("month", "i4"),
+    ("distance", "f8"),
+    ("moving_time", "f8"),
+    ("elapsed_time", "f8"),
+    ("elevation_gain", "f8"),
+    ("average_speed", "f8"),
+    ("max_speed", "f8"),
+    ("average_heartrate", "f8"),
+    ("max_heartrate", "f8"),
+])
+
+
+class Activity:
+    """One activity as plain attributes (a row of an Activities table)."""
+    __slots__ = ("name",) + ACTIVITY_DTYPE.names
+
+    def __init__(self, name, row):
+        self.name = name
+        for field, value in zip(ACTIVITY_DTYPE.names, row.tolist()):
+            setattr(self, field, value)
+
+    @property
+    def miles(self):
+        return self.distance * MILES_PER_METER
+
+    @property
+    def pace(self):
+        """Seconds per mile (NaN without distance)"""
+        return self.moving_time / self.miles if self.distance > 0 else float("nan")
+
+    def __repr__(self):
+        return f"Activity({self.id}, {self.type}, {self.local_date}, {self.miles:.2f} mi, {self.name!r})"
+
+
+class Activities:
+    """Columnar activity table: structured array + parallel list of names."""
+    __slots__ = ("data", "names")
+
+    def __init__(self, data, names):
+        self.data = data
+        self.names = names
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        for name, row in zip(self.names, self.data):
+            yield Activity(name, row)
+
+    def __getitem__(self, key):
+        """A column by name, or the subset selected by a mask / index array."""
+        if isinstance(key, str):
+            return self.data[key]
+        idx = np.arange(len(self.data))[key]
+        return Activities(self.data[idx], [self.names[i] for i in idx])
+
+    def runs(self):
+        return self[self.data["type"] == "Run"]
+
+    def sorted(self):
+        return self[np.argsort(self.data["start"], kind="stable")]
+
+    # Derived columns
+    @property
+    def miles(self):
+        return self.data["distance"] * MILES_PER_METER
+
+    @property
+    def hours(self):
+        return self.data["moving_time"] / 3600
+
+    @property
+    def pace(self):
+        """Seconds per mile (NaN without distance)"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(self.data["distance"] > 0, self.data["moving_time"] / self.miles, np.nan)
+
+    @property
+    def utc_month(self):
+        """YYYYMM of the UTC start (the month key the original scripts used)"""
+        months = self.data["start"].astype("datetime64[s]").astype("datetime64[M]").astype(int)
+        return (months // 12 + 1970) * 100 + months % 12 + 1
+
+    def listed(self):
+        """
+        (miles, minutes, pace in min/mile) at the precision the cleaned
+        JSON files list them - 0.01 mile, whole minutes, whole seconds per
+        mile (from average_speed) - which is what the race prediction
+        scripts have always computed with.
+        """
+        speed = self.data["average_speed"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            seconds = np.where(speed > 0, np.round(1 / (speed * MILES_PER_METER)), np.nan)
+        return np.round(self.miles, 2), np.round(self.data["moving_time"] / 60), seconds // 60 + seconds % 60 / 60
+
+    def days_ago(self, now=None):
+        now = time.time() if now is None else now
+        return (now - self.data["start"]) // 86400
+
+
+def summarize(activities, keys):
+    """
+    Totals per distinct key (an array aligned with activities):
+    {key: {total_distance (miles), total_time (hours), total_elevation (ft),
+    total_hr, count_hr, count}}, keys in order of first appearance.
+    """
+    if len(activities) == 0:
+        return {}
+    unique, first, group = np.unique(keys, return_index=True, return_inverse=True)
+    order = np.argsort(first, kind="stable")
+    hr = activities["average_heartrate"]
+    has_hr = ~np.isnan(hr)
+
+    totals = {
+        "total_distance": np.nan_to_num(activities.miles),
+        "total_time": np.nan_to_num(activities.hours),
+        "total_elevation": np.nan_to_num(activities["elevation_gain"]) * FEET_PER_METER,
+        "total_hr": np.where(has_hr, hr, 0),
+        "count_hr": has_hr,
+        "count": np.ones(len(activities))
+    }
+    sums = {name: np.bincount(group, weights=values, minlength=len(unique)) for name, values in totals.items()}
+    return {
+        key: {name: (int(values[i]) if name.startswith("count") else float(values[i])) for name, values in sums.items()}
+        for i, key in zip(order.tolist(), unique[order].tolist())
+    }
+
+
+def month_label(month):
+    """YYYYMM -> 'January 2024'"""
+    return f"{MONTH_NAMES[month % 100 - 1]} {month // 100}"
+
+
+def parse_dates(utc_strings, local_strings):
+    """ISO 'YYYY-MM-DDTHH:MM:SSZ' strings -> (epoch seconds, local YYYYMMDD, local YYYYMM), vectorized."""
+    start = np.array([s.rstrip("Z") for s in utc_strings], dtype="datetime64[s]").astype(np.int64)
+    local = np.array([s.rstrip("Z") for s in local_strings], dtype="datetime64[D]")
+    year = local.astype("datetime64[Y]").astype(int) + 1970
+    month = local.astype("datetime64[M]").astype(int) % 12 + 1
+    day = (local - local.astype("datetime64[M]")).astype(int) + 1
+    return start, year * 10000 + month * 100 + day, year * 100 + month
+
+
+def build_table(ids, types, utc_dates, local_dates, numeric, names):
+    """
+    Assemble an Activities table; numeric is a (n, 8) float array in
+    ACTIVITY_DTYPE order. Rows keep the input (file) order; call
+    .sorted() for chronological order.
+    """
+    data = np.zeros(len(ids), dtype=ACTIVITY_DTYPE)
+    data["id"] = ids
+    data["type"] = types
+    if len(ids):
+        data["start"], data["local_date"], data["month"] = parse_dates(utc_dates, local_dates)
+    for i, field in enumerate(ACTIVITY_DTYPE.names[5:]):
+        data[field] = numeric[:, i]
+    return Activities(data, list(names))
+
+
+def load_db(db_path=DB_PATH):
+    """Every activity in strava.db, in one query (dates are parsed by SQLite)."""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA table_info(activities)")
+    local_column = "start_date_local" if "start_date_local" in {row[1] for row in cursor.fetchall()} else "start_date"
+
+    cursor.execute(f"""
+        SELECT id, sport_type,
+               CAST(strftime('%s', start_date) AS INTEGER),
+               CAST(strftime('%Y%m%d', COALESCE({local_column}, start_date)) AS INTEGER),
+               distance, moving_time, elapsed_time, total_elevation_gain,
+               average_speed, max_speed, average_heartrate, max_heartrate,
+               name
+        FROM activities
+        ORDER BY start_date
+    """)
+    rows = cursor.fetchall()
+    conn.close()
+
+    data = np.zeros(len(rows), dtype=ACTIVITY_DTYPE)
+    if rows:
+        columns = list(zip(*rows))
+        data["id"] = columns[0]
+        data["type"] = [t or "Unknown" for t in columns[1]]
+        data["start"] = columns[2]
+        data["local_date"] = columns[3]
+        data["month"] = data["local_date"] // 100
+        for i, field in enumerate(ACTIVITY_DTYPE.names[5:]):
+            data[field] = np.array(columns[4 + i], dtype=float)  # NULL -> NaN
+    return Activities(data, [row[-1] for row in rows])
+
+
+def load_raw_json(json_file):
+    """Raw Strava activity list (strava_raw_data.json / activities_raw.json)."""
+    with open(json_file, "r") as f:
+        raw = json.load(f)
+    raw = [a for a in raw if a.get("start_date")]
+
+    fields = ("distance", "moving_time", "elapsed_time", "total_elevation_gain",
+              "average_speed", "max_speed", "average_heartrate", "max_heartrate")
+    numeric = np.array([[a.get(f) for f in fields] for a in raw], dtype=float).reshape(-1, len(fields))
+
+    return build_table(
+        [a["id"] for a in raw],
+        [a.get("type") or a.get("sport_type") or "Unknown" for a in raw],
+        [a["start_date"] for a in raw],
+        [a.get("start_date_local") or a["start_date"] for a in raw],
+        numeric,
+        [a.get("name", "Unnamed") for a in raw]
+    )
+
+
+def parse_pace(pace):
+    """'m:ss' (optionally followed by ' min/mile') -> whole seconds per mile, or None."""
+    if ":" not in pace:
+        return None
+    m, s = pace.split()[0].split(":")
+    return int(m) * 60 + int(s)
+
+
+def load_clean_json(json_file):
+    """
+    Cleaned run list (strava_running_clean.json, written by running.py)
+    at the precision it lists: distance to 0.01 mile, moving time to the
+    minute and average_speed from the m:ss pace. The file has no
+    activity ids, so rows are numbered in file order.
+    """
+    with open(json_file, "r") as f:
+        raw = json.load(f)
+
+    def number(text):
+        value = text.split()[0]
+        return np.nan if value == "N/A" else float(value)
+
+    numeric = []
+    for run in raw:
+        h, m = run["time"].split()[0].split(":")
+        pace = parse_pace(run["average_pace"])
+        numeric.append((number(run["distance"]) / MILES_PER_METER, (int(h) * 60 + int(m)) * 60, np.nan,
+                        number(run["total_elevation"]) / FEET_PER_METER,
+                        1 / (pace * MILES_PER_METER) if pace else np.nan, np.nan,
+                        number(run["average_hr"]), number(run["max_hr"])))
+
+    dates = [run["date"] for run in raw]
+    return build_table(np.arange(len(raw)), ["Run"] * len(raw), dates, dates,
+                       np.array(numeric, dtype=float).reshape(-1, 8), [run["name"] for run in raw])
+
+
+def load_splits_json(json_file):
+    """
+    Mile-split file ({id: {name, date, distance_miles, mile_splits}}) as runs,
+    read the way the original race_predictions_mile.py read it: the pace is
+    the average split in whole seconds, average_speed comes from that pace,
+    and moving_time is pace times distance to the minute. Runs with no
+    valid split get NaN.
+    """
+    with open(json_file, "r") as f:
+        raw = json.load(f)
+
+    ids, dates, names, numeric = [], [], [], []
+    for activity_id, run in raw.items():
+        seconds = [parse_pace(split) for split in run["mile_splits"] if ":" in split]
+        miles = run["distance_miles"]
+        if seconds:
+            pace = int(sum(seconds) / len(seconds))
+            moving_time = int((pace // 60 + pace % 60 / 60) * miles) * 60
+            speed = 1 / (pace * MILES_PER_METER)
+        else:
+            moving_time = speed = np.nan
+        ids.append(int(activity_id))
+        dates.append(run["date"])
+        names.append(run["name"])
+        numeric.append((miles / MILES_PER_METER, moving_time, np.nan, np.nan, speed, np.nan, np.nan, np.nan))
+
+    return build_table(ids, ["Run"] * len(ids), dates, dates,
+                       np.array(numeric, dtype=float).reshape(-1, 8), names)
+
+
+def data_version(db_path=DB_PATH):
+    """strava.db's data_version counter (None without a database)."""
+    if not os.path.exists(db_path):
+        return None
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        row = conn.execute("SELECT version FROM data_version WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        row = None  # database from before the counter existed
+    finally:
+        conn.close()
+    return row[0] if row else 0
+
+
+def load_snapshot(snapshot_dir=SNAPSHOT_DIR, db_path=DB_PATH):
+    """
+    Memory-mapped snapshot of strava.db, or None if it is missing or
+    was built from an older data version.
+    """
+    try:
+        with open(os.path.join(snapshot_dir, "header.json"), "r") as f:
+            header = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if header.get("version") != SNAPSHOT_VERSION or header.get("data_version") != data_version(db_path):
+        return None
+
+    data = np.load(os.path.join(snapshot_dir, "activities.npy"), mmap_mode="r")
+    names = np.load(os.path.join(snapshot_dir, "names.npy"), mmap_mode="r")
+    if len(data) != header.get("rows") or len(names) != len(data):
+        return None
+    return Activities(data, names)
+
+
+def load_activities(source=None):
+    """
+    Activities from the strava.db snapshot / strava.db (default),
+    a .db path, or one of the JSON formats.
+    """
+    if source is None:
+        snapshot = load_snapshot()
+        if snapshot is not None:
+            return snapshot
+        source = DB_PATH
+
+    if source.endswith(".db"):
+        return load_db(source)
+
+    with open(source, "r") as f:
+        head = f.read(4096)
+    if not head.startswith("["):
+        return load_splits_json(source)
+    return load_clean_json(source) if '"average_pace"' in head else load_raw_json(source)
+
+
+# Benchmark
+def load_dict_of_strings(json_file):
+    """The old approach: raw JSON -> list of dicts of formatted strings (as in running.py)."""
+    import datetime
+    with open(json_file, "r") as f:
+        raw = json.load(f)
+
+    runs = []
+    for act in raw:
+        distance_miles = act.get("distance", 0) * 0.000621371
+        time_hours = act.get("moving_time", 0) / 3600
+        date = datetime.datetime.strptime(act["start_date"], "%Y-%m-%dT%H:%M:%SZ")
+        seconds = time_hours * 3600 / distance_miles if distance_miles else 0
+        runs.append({
+            "name": act.get("name"),
+            "type": act.get("type"),
+            "date": act["start_date"],
+            "month": date.strftime("%B %Y"),
+            "distance": f"{round(distance_miles, 2)} miles",
+            "time": f"{int(time_hours)}:{int(time_hours * 60 % 60):02d} h",
+            "average_pace": f"{int(seconds // 60)}:{int(seconds % 60):02d} min/mile",
+            "total_elevation": f"{round(act.get('total_elevation_gain', 0) * FEET_PER_METER, 2)} ft",
+        })
+    return runs
+
+
+def measure(label, load, repeats=5):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        load()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    result = load()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<34}{len(result):>7}{best * 1000:>11.1f} ms{retained / 1024:>11.0f} KiB")
+
+
+def benchmark(json_file="strava_raw_data.json"):
+    print(f"{'Loader':<34}{'Rows':>7}{'Time':>14}{'Memory':>15}")
+    measure("dict of strings (raw JSON)", lambda: load_dict_of_strings(json_file))
+    measure("Activities (raw JSON)", lambda: load_raw_json(json_file))
+    if os.path.exists(DB_PATH):
+        measure("Activities (strava.db)", lambda: load_db(DB_PATH))
+    if load_snapshot() is not None:
+        measure("Activities (mmap snapshot)", load_snapshot)
+
+
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark()
+    else:
+        source = "snapshot" if load_snapshot() is not None else DB_PATH
+        activities = load_activities()
+        print(f"Loaded {len(activities)} activities ({len(activities.runs())} runs) from {source}")
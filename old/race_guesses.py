@@ -1,7 +1,9 @@
 import json
+import sys
+import bisect
 import numpy as np
 from datetime import datetime, timedelta
-from collections import defaultdict
+from collections import defaultdict, deque
 
 def parse_pace(pace_str):
     """Convert pace string (MM:SS) to seconds per mile"""
@@ -57,178 +59,279 @@ def load_strava_data(json_file):
     
     return sorted(runs, key=lambda x: x['date'])
 
-def calculate_best_performances(runs):
-    """Calculate best performances across all data"""
-    fastest_mile = min([r['fastest_mile'] for r in runs])
-    best_avg_pace = min([r['avg_pace'] for r in runs])
+def runs_as_of(runs, as_of=None):
+    """Runs on or before the as-of date (all runs when as_of is None)"""
+    if as_of is None:
+        return runs
+    return [r for r in runs if r['date'] <= as_of]
+
+def fatigue_slowdown(run):
+    """Slowdown over a long run (None for runs under 10 miles or 8 splits)"""
+    if run['distance'] < 10 or len(run['paces']) < 8:
+        return None
     
-    # Best paces at various distances
-    best_5k = min([r['avg_pace'] for r in runs if 3.0 <= r['distance'] <= 3.5], default=None)
-    best_10k = min([r['avg_pace'] for r in runs if 5.5 <= r['distance'] <= 7.0], default=None)
-    best_half = min([r['avg_pace'] for r in runs if 12.5 <= r['distance'] <= 13.5], default=None)
-    best_marathon = min([r['avg_pace'] for r in runs if 26.0 <= r['distance'] <= 26.5], default=None)
+    # Compare last 25% to first 25% pace
+    split_point = max(2, len(run['paces']) // 4)
+    first_portion = np.mean(run['paces'][:split_point])
+    last_portion = np.mean(run['paces'][-split_point:])
+    return (last_portion - first_portion) / first_portion
+
+EPOCH = datetime(1970, 1, 1)
+
+# Distance classes (in miles) the calculators filter on
+RUN_CLASSES = {
+    'speed': lambda d: d <= 8,
+    'medium': lambda d: (d >= 6) & (d < 10),
+    'long': lambda d: d >= 10,
+    'long13': lambda d: d >= 13,
+    '5k': lambda d: (d >= 3.0) & (d <= 3.5),
+    '10k': lambda d: (d >= 5.5) & (d <= 7.0),
+    'half': lambda d: (d >= 12.5) & (d <= 13.5),
+    'marathon': lambda d: (d >= 26.0) & (d <= 26.5)
+}
+
+class RunIndex:
+    """Date-sorted NumPy columns over the runs for "last N days" queries
+
+    A window is located with two searchsorted calls on the epoch-day column.
+    Sums and counts come from prefix sums and single best-of queries from a
+    sparse table, so both are O(1) once the window is known. Top-k queries
+    partition only the runs inside the window.
+    """
+
+    def __init__(self, runs):
+        self.runs = runs
+        self.days = np.array([(r['date'] - EPOCH).total_seconds() / 86400 for r in runs], dtype=float)
+        
+        slowdowns = [fatigue_slowdown(r) for r in runs]
+        self.columns = {
+            'distance': np.array([r['distance'] for r in runs], dtype=float),
+            'avg_pace': np.array([r['avg_pace'] for r in runs], dtype=float),
+            'fastest_mile': np.array([r['fastest_mile'] for r in runs], dtype=float),
+            'slowdown': np.array([s or 0.0 for s in slowdowns], dtype=float),
+            'slowdown_count': np.array([s is not None for s in slowdowns], dtype=float)
+        }
+        
+        # Positions (into the full arrays) of the runs in each distance class
+        distance = self.columns['distance']
+        self.positions = {None: np.arange(len(runs))}
+        for name, in_class in RUN_CLASSES.items():
+            self.positions[name] = np.flatnonzero(in_class(distance))
+        
+        # Built lazily, keyed by (column, class)
+        self._values = {}
+        self._prefix = {}
+        self._sparse = {}
+
+    def __len__(self):
+        return len(self.runs)
+
+    def epoch_day(self, as_of=None):
+        """Fractional days since 1970-01-01 (defaults to now)"""
+        return ((as_of or datetime.now()) - EPOCH).total_seconds() / 86400
+
+    def upto(self, as_of=None):
+        """Number of runs on or before as_of"""
+        return int(np.searchsorted(self.days, self.epoch_day(as_of), side='right'))
+
+    def window(self, days, as_of=None):
+        """(lo, hi) index range of runs in the `days` days ending at as_of"""
+        end = self.epoch_day(as_of)
+        hi = int(np.searchsorted(self.days, end, side='right'))
+        lo = int(np.searchsorted(self.days, end - days, side='left'))
+        return min(lo, hi), hi
+
+    def values(self, column, where=None):
+        """Column values for the runs in a distance class, in date order"""
+        key = (column, where)
+        if key not in self._values:
+            self._values[key] = self.columns[column][self.positions[where]]
+        return self._values[key]
+
+    def span(self, lo, hi, where=None):
+        """Translate a (lo, hi) range over all runs into one over a distance class"""
+        positions = self.positions[where]
+        return int(np.searchsorted(positions, lo)), int(np.searchsorted(positions, hi))
+
+    def count(self, lo, hi, where=None):
+        a, b = self.span(lo, hi, where)
+        return b - a
+
+    def sum(self, column, lo, hi, where=None):
+        key = (column, where)
+        if key not in self._prefix:
+            self._prefix[key] = np.concatenate(([0.0], np.cumsum(self.values(column, where))))
+        a, b = self.span(lo, hi, where)
+        return self._prefix[key][b] - self._prefix[key][a]
+
+    def mean(self, column, lo, hi, where=None):
+        n = self.count(lo, hi, where)
+        return self.sum(column, lo, hi, where) / n if n else None
+
+    def _extreme(self, column, where, a, b, largest):
+        """O(1) range min/max over [a, b) of a class using a sparse table"""
+        key = (column, where, largest)
+        if key not in self._sparse:
+            reduce = np.maximum if largest else np.minimum
+            levels = [self.values(column, where)]
+            width = 1
+            while width * 2 <= len(levels[0]):
+                prev = levels[-1]
+                levels.append(reduce(prev[:-width], prev[width:]))
+                width *= 2
+            self._sparse[key] = (levels, reduce)
+        levels, reduce = self._sparse[key]
+        level = (b - a).bit_length() - 1
+        return reduce(levels[level][a], levels[level][b - (1 << level)])
+
+    def best(self, column, lo, hi, k=1, where=None, largest=False):
+        """Up to k smallest (or largest) values in the window, best first"""
+        a, b = self.span(lo, hi, where)
+        if a == b:
+            return np.array([])
+        if k == 1:
+            return np.array([self._extreme(column, where, a, b, largest)])
+        
+        window_values = self.values(column, where)[a:b]
+        if largest:
+            window_values = -window_values
+        if len(window_values) > k:
+            window_values = np.partition(window_values, k - 1)[:k]
+        window_values = np.sort(window_values)
+        return -window_values if largest else window_values
+
+def run_index(runs):
+    """Accept either a list of runs or an already built RunIndex"""
+    return runs if isinstance(runs, RunIndex) else RunIndex(runs)
+
+def calculate_best_performances(runs, as_of=None):
+    """Calculate best performances across all data"""
+    index = run_index(runs)
+    hi = index.upto(as_of)
     
-    total_miles = sum([r['distance'] for r in runs])
-    total_runs = len(runs)
-    longest_run = max([r['distance'] for r in runs])
+    def best_pace(where):
+        best = index.best('avg_pace', 0, hi, where=where)
+        return best[0] if len(best) else None
     
     return {
-        'fastest_mile': fastest_mile,
-        'best_avg_pace': best_avg_pace,
-        'best_5k': best_5k,
-        'best_10k': best_10k,
-        'best_half': best_half,
-        'best_marathon': best_marathon,
-        'total_miles': total_miles,
-        'total_runs': total_runs,
-        'longest_run': longest_run
+        'fastest_mile': index.best('fastest_mile', 0, hi)[0],
+        'best_avg_pace': best_pace(None),
+        # Best paces at various distances
+        'best_5k': best_pace('5k'),
+        'best_10k': best_pace('10k'),
+        'best_half': best_pace('half'),
+        'best_marathon': best_pace('marathon'),
+        'total_miles': index.sum('distance', 0, hi),
+        'total_runs': hi,
+        'longest_run': index.best('distance', 0, hi, largest=True)[0]
     }
 
-def calculate_speed_score(runs, days=60):
+def calculate_speed_score(runs, days=60, as_of=None):
     """Calculate raw speed capability from recent fast runs"""
-    cutoff = datetime.now() - timedelta(days=days)
-    recent = [r for r in runs if r['date'] >= cutoff]
-    
-    if not recent:
-        recent = runs[-20:]  # Use last 20 runs if no recent data
-    
-    # Get fastest miles from runs under 8 miles (speed work)
-    speed_runs = [r for r in recent if r['distance'] <= 8]
-    if speed_runs:
-        fastest_miles = [r['fastest_mile'] for r in speed_runs]
-        # Average of top 5 fastest miles
-        top_miles = sorted(fastest_miles)[:5]
-        speed_score = np.mean(top_miles)
-    else:
-        speed_score = min([r['fastest_mile'] for r in recent])
+    index = run_index(runs)
+    lo, hi = index.window(days, as_of)
+    
+    if lo == hi:
+        lo = max(0, hi - 20)  # Use last 20 runs if no recent data
     
-    return speed_score
+    # Average of top 5 fastest miles from runs under 8 miles (speed work)
+    top_miles = index.best('fastest_mile', lo, hi, k=5, where='speed')
+    if len(top_miles):
+        return np.mean(top_miles)
+    return index.best('fastest_mile', lo, hi)[0]
 
-def calculate_endurance_score(runs, days=90):
+def calculate_endurance_score(runs, days=90, as_of=None):
     """Calculate endurance capability from long runs"""
-    cutoff = datetime.now() - timedelta(days=days)
-    recent = [r for r in runs if r['date'] >= cutoff]
-    
-    if not recent:
-        recent = runs[-30:]
-    
-    # Get paces from long runs (10+ miles)
-    long_runs = [r for r in recent if r['distance'] >= 10]
-    
-    if long_runs:
-        # Average pace of best 3 long runs
-        best_long_paces = sorted([r['avg_pace'] for r in long_runs])[:3]
-        endurance_score = np.mean(best_long_paces)
-    else:
-        # Use medium distance runs
-        medium_runs = [r for r in recent if 6 <= r['distance'] < 10]
-        if medium_runs:
-            endurance_score = np.mean([r['avg_pace'] for r in medium_runs])
-        else:
-            endurance_score = np.mean([r['avg_pace'] for r in recent])
-    
-    return endurance_score
+    index = run_index(runs)
+    lo, hi = index.window(days, as_of)
+    
+    if lo == hi:
+        lo = max(0, hi - 30)
+    
+    # Average pace of best 3 long runs (10+ miles)
+    best_long_paces = index.best('avg_pace', lo, hi, k=3, where='long')
+    if len(best_long_paces):
+        return np.mean(best_long_paces)
+    
+    # Use medium distance runs
+    medium_pace = index.mean('avg_pace', lo, hi, where='medium')
+    if medium_pace is not None:
+        return medium_pace
+    return index.mean('avg_pace', lo, hi)
 
-def calculate_fatigue_resistance(runs):
+def calculate_fatigue_resistance(runs, as_of=None):
     """Calculate how well runner maintains pace when fatigued"""
-    fatigue_scores = []
+    index = run_index(runs)
+    hi = index.upto(as_of)
     
     # Look at runs 10+ miles
-    long_runs = [r for r in runs if r['distance'] >= 10 and len(r['paces']) >= 8]
-    
-    for run in long_runs:
-        # Compare last 25% to first 25% pace
-        split_point = max(2, len(run['paces']) // 4)
-        first_portion = np.mean(run['paces'][:split_point])
-        last_portion = np.mean(run['paces'][-split_point:])
-        
-        # Calculate slowdown percentage
-        slowdown = (last_portion - first_portion) / first_portion
-        fatigue_scores.append(slowdown)
-    
-    avg_slowdown = np.mean(fatigue_scores) if fatigue_scores else 0.05
+    count = index.sum('slowdown_count', 0, hi)
+    avg_slowdown = index.sum('slowdown', 0, hi) / count if count else 0.05
     # Convert to resistance score (0-1, higher is better)
     resistance = max(0, 1 - (avg_slowdown * 5))
     return resistance
 
-def calculate_training_volume(runs, days=90):
+def calculate_training_volume(runs, days=90, as_of=None):
     """Calculate recent training volume and consistency"""
-    cutoff = datetime.now() - timedelta(days=days)
-    recent = [r for r in runs if r['date'] >= cutoff]
+    index = run_index(runs)
+    lo, hi = index.window(days, as_of)
     
-    if not recent:
+    if lo == hi:
         return 0, 0
     
-    total_miles = sum([r['distance'] for r in recent])
     weeks = days / 7
-    avg_weekly_miles = total_miles / weeks
+    avg_weekly_miles = index.sum('distance', lo, hi) / weeks
     
     # Long run capability
-    long_runs = [r['distance'] for r in recent if r['distance'] >= 13]
-    max_long_run = max(long_runs) if long_runs else max([r['distance'] for r in recent])
+    long_runs = index.best('distance', lo, hi, where='long13', largest=True)
+    max_long_run = long_runs[0] if len(long_runs) else index.best('distance', lo, hi, largest=True)[0]
     
     return avg_weekly_miles, max_long_run
 
-def calculate_training_metrics(runs):
+def calculate_training_metrics(runs, as_of=None):
     """Calculate training metrics from all data"""
-    cutoff_90 = datetime.now() - timedelta(days=90)
-    recent_90 = [r for r in runs if r['date'] >= cutoff_90]
-    
-    cutoff_30 = datetime.now() - timedelta(days=30)
-    recent_30 = [r for r in runs if r['date'] >= cutoff_30]
+    index = run_index(runs)
+    lo_90, hi = index.window(90, as_of)
+    lo_30, _ = index.window(30, as_of)
     
-    weekly_miles_90 = sum([r['distance'] for r in recent_90]) / (90/7) if recent_90 else 0
-    weekly_miles_30 = sum([r['distance'] for r in recent_30]) / (30/7) if recent_30 else 0
-    
-    long_runs = [r['distance'] for r in recent_90 if r['distance'] >= 10]
-    max_long_run = max(long_runs) if long_runs else 0
+    long_runs = index.best('distance', lo_90, hi, where='long', largest=True)
     
     return {
-        'weekly_miles_90': weekly_miles_90,
-        'weekly_miles_30': weekly_miles_30,
-        'max_long_run': max_long_run,
-        'recent_runs_90': len(recent_90),
-        'recent_runs_30': len(recent_30)
+        'weekly_miles_90': index.sum('distance', lo_90, hi) / (90/7),
+        'weekly_miles_30': index.sum('distance', lo_30, hi) / (30/7),
+        'max_long_run': long_runs[0] if len(long_runs) else 0,
+        'recent_runs_90': hi - lo_90,
+        'recent_runs_30': hi - lo_30
     }
 
-def calculate_fitness_trend(runs):
+def calculate_fitness_trend(runs, as_of=None):
     """Calculate recent fitness trend"""
-    cutoff = datetime.now() - timedelta(days=60)
-    recent = [r for r in runs if r['date'] >= cutoff]
+    index = run_index(runs)
+    lo, hi = index.window(60, as_of)
     
-    if len(recent) < 10:
+    if hi - lo < 10:
         return 1.0
     
-    split = len(recent) // 4
-    first_quarter_pace = np.mean([r['avg_pace'] for r in recent[:split]])
-    last_quarter_pace = np.mean([r['avg_pace'] for r in recent[-split:]])
+    split = (hi - lo) // 4
+    first_quarter_pace = index.mean('avg_pace', lo, lo + split)
+    last_quarter_pace = index.mean('avg_pace', hi - split, hi)
     
     trend = first_quarter_pace / last_quarter_pace
     return trend
 
-def predict_race_times(json_file):
-    """Main prediction function using custom algorithm"""
-    runs = load_strava_data(json_file)
-    
-    if not runs:
-        print("No valid run data found")
-        return
-    
-    # Calculate all metrics
-    best_perfs = calculate_best_performances(runs)
-    training_metrics = calculate_training_metrics(runs)
-    fitness_trend = calculate_fitness_trend(runs)
-    
-    # Core performance indicators
-    speed_score = calculate_speed_score(runs)  # Best recent speed capability
-    endurance_score = calculate_endurance_score(runs)  # Best recent endurance
-    fatigue_resistance = calculate_fatigue_resistance(runs)  # How well you hold pace
-    weekly_volume, max_long = calculate_training_volume(runs)  # Training load
-    
-    # Calculate base fitness from speed and endurance
-    # Faster runners have lower pace numbers, so lower is better
-    base_fitness = (speed_score * 0.4 + endurance_score * 0.6)
-    
+RACES = {
+    'Mile': 1.0,
+    '5K': 3.1,
+    '10K': 6.2,
+    'Half Marathon': 13.1,
+    'Marathon': 26.2,
+    '50K': 31.0,
+    '50 Mile': 50.0,
+    '100 Mile': 100.0
+}
+
+def predict_from_scores(speed_score, endurance_score, fatigue_resistance, weekly_volume, max_long):
+    """Apply the custom race formulas to a set of readiness scores"""
     # Volume readiness (0-1 scale)
     volume_readiness = min(1.0, weekly_volume / 50)  # 50+ mpw = fully ready
     
@@ -238,21 +341,9 @@ def predict_race_times(json_file):
     # Ultra experience (0-1 scale)
     ultra_readiness = min(1.0, max_long / 26)  # 26+ mile run = ultra ready
     
-    # Race predictions with custom formula
-    races = {
-        'Mile': 1.0,
-        '5K': 3.1,
-        '10K': 6.2,
-        'Half Marathon': 13.1,
-        'Marathon': 26.2,
-        '50K': 31.0,
-        '50 Mile': 50.0,
-        '100 Mile': 100.0
-    }
-    
     predictions = {}
     
-    for race_name, race_dist in races.items():
+    for race_name, race_dist in RACES.items():
         if race_name == 'Mile':
             # Pure speed - use best recent mile with small fatigue buffer
             predicted_pace = speed_score * 1.15
@@ -299,13 +390,46 @@ def predict_race_times(json_file):
         total_time = predicted_pace * race_dist
         predictions[race_name] = total_time
     
+    return predictions, volume_readiness, long_run_readiness, ultra_readiness
+
+def predict_race_times(json_file, as_of=None):
+    """Main prediction function using custom algorithm
+
+    Pass as_of (a datetime) to backtest: only runs on or before that date are
+    used and every "last N days" window ends there instead of at now().
+    """
+    runs = runs_as_of(load_strava_data(json_file), as_of)
+    
+    if not runs:
+        print("No valid run data found")
+        return
+    
+    # Every calculator shares one date index instead of re-filtering the runs
+    index = RunIndex(runs)
+    
+    # Calculate all metrics
+    best_perfs = calculate_best_performances(index, as_of)
+    training_metrics = calculate_training_metrics(index, as_of)
+    fitness_trend = calculate_fitness_trend(index, as_of)
+    
+    # Core performance indicators
+    speed_score = calculate_speed_score(index, as_of=as_of)  # Best recent speed capability
+    endurance_score = calculate_endurance_score(index, as_of=as_of)  # Best recent endurance
+    fatigue_resistance = calculate_fatigue_resistance(index, as_of)  # How well you hold pace
+    weekly_volume, max_long = calculate_training_volume(index, as_of=as_of)  # Training load
+    
+    # Race predictions with custom formula
+    predictions, volume_readiness, long_run_readiness, ultra_readiness = predict_from_scores(
+        speed_score, endurance_score, fatigue_resistance, weekly_volume, max_long)
+    races = RACES
+    
     # Print and save results
     print_results(runs, best_perfs, training_metrics, fatigue_resistance, 
                   fitness_trend, predictions, races, speed_score, endurance_score,
                   volume_readiness, long_run_readiness, ultra_readiness)
     write_predictions_to_file(runs, best_perfs, training_metrics, 
                               fatigue_resistance, fitness_trend, 
-                              predictions, races)
+                              predictions, races, as_of)
     
     return predictions
 
@@ -360,13 +484,13 @@ def print_results(runs, best_perfs, training_metrics, fatigue_resistance,
 
 def write_predictions_to_file(runs, best_perfs, training_metrics, 
                               fatigue_resistance, fitness_trend, 
-                              predictions, races):
+                              predictions, races, as_of=None):
     """Write predictions to output file"""
     with open('race_predictions.txt', 'w') as f:
         f.write("=" * 70 + "\n")
         f.write("RACE TIME PREDICTIONS\n")
         f.write("=" * 70 + "\n\n")
-        f.write(f"Analysis Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write(f"Analysis Date: {(as_of or datetime.now()).strftime('%Y-%m-%d %H:%M:%S')}\n")
         f.write(f"Based on {best_perfs['total_runs']} runs from {runs[0]['date'].date()} to {runs[-1]['date'].date()}\n")
         f.write(f"Total Miles: {best_perfs['total_miles']:.1f}\n\n")
         
@@ -405,6 +529,150 @@ def write_predictions_to_file(runs, best_perfs, training_metrics,
     
     print("\nPredictions saved to 'race_predictions.txt'")
 
+class SlidingWindow:
+    """Trailing window over date-sorted runs, advanced one as-of date at a time"""
+
+    def __init__(self, runs, days):
+        self.runs = runs
+        self.days = days
+        self.lo = 0  # index of the oldest run inside the window
+        self.hi = 0  # one past the newest run on or before the as-of date
+
+    def advance(self, as_of):
+        """Slide the window to end at as_of and return (entered, left) run indices"""
+        first_new = self.hi
+        while self.hi < len(self.runs) and self.runs[self.hi]['date'] <= as_of:
+            self.hi += 1
+        
+        first_old = self.lo
+        cutoff = as_of - timedelta(days=self.days)
+        while self.lo < self.hi and self.runs[self.lo]['date'] < cutoff:
+            self.lo += 1
+        return range(first_new, self.hi), range(first_old, self.lo)
+
+def push_extreme(window_deque, values, i, better):
+    """Add run i to a monotonic deque so window_deque[0] is always the window's best value"""
+    while window_deque and not better(values[window_deque[-1]], values[i]):
+        window_deque.pop()
+    window_deque.append(i)
+
+def expire_extreme(window_deque, lo):
+    """Drop runs that have slid out of the window from the front of a monotonic deque"""
+    while window_deque and window_deque[0] < lo:
+        window_deque.popleft()
+
+def predict_race_history(json_file, start=None, end=None, output_file='race_prediction_history.json'):
+    """Backtest predictions for every day from start to end in a single pass
+
+    Equivalent to calling predict_race_times(json_file, as_of=day) for each day,
+    but the 60/90 day windows slide forward over the date-sorted runs and keep
+    their volume, long run, speed and fatigue state incrementally instead of
+    re-filtering every run for every date.
+    """
+    runs = load_strava_data(json_file)
+    
+    if not runs:
+        print("No valid run data found")
+        return
+    
+    start = start or runs[0]['date']
+    end = end or datetime.now()
+    
+    # Window totals come from the index's prefix sums
+    index = RunIndex(runs)
+    distances = [r['distance'] for r in runs]
+    fastest_miles = [r['fastest_mile'] for r in runs]
+    
+    speed_window = SlidingWindow(runs, 60)
+    endurance_window = SlidingWindow(runs, 90)
+    
+    speed_miles = []        # sorted fastest miles of runs <= 8 miles in the 60 day window
+    fastest_deque = deque() # fastest mile of any run in the 60 day window
+    long_paces = []         # sorted avg paces of 10+ mile runs in the 90 day window
+    longest_deque = deque() # longest run in the 90 day window
+    long_13_deque = deque() # longest 13+ mile run in the 90 day window
+    
+    history = {}
+    day = datetime(start.year, start.month, start.day, 23, 59, 59)
+    
+    while day <= end:
+        entered, left = speed_window.advance(day)
+        for i in entered:
+            if distances[i] <= 8:
+                bisect.insort(speed_miles, fastest_miles[i])
+            push_extreme(fastest_deque, fastest_miles, i, lambda a, b: a < b)
+        for i in left:
+            if distances[i] <= 8:
+                del speed_miles[bisect.bisect_left(speed_miles, fastest_miles[i])]
+        expire_extreme(fastest_deque, speed_window.lo)
+        
+        entered, left = endurance_window.advance(day)
+        for i in entered:
+            if distances[i] >= 10:
+                bisect.insort(long_paces, runs[i]['avg_pace'])
+            push_extreme(longest_deque, distances, i, lambda a, b: a > b)
+            if distances[i] >= 13:
+                push_extreme(long_13_deque, distances, i, lambda a, b: a > b)
+        for i in left:
+            if distances[i] >= 10:
+                del long_paces[bisect.bisect_left(long_paces, runs[i]['avg_pace'])]
+        expire_extreme(longest_deque, endurance_window.lo)
+        expire_extreme(long_13_deque, endurance_window.lo)
+        
+        hi = speed_window.hi
+        if hi == 0:
+            day += timedelta(days=1)
+            continue
+        
+        # Speed score (60 days)
+        lo = speed_window.lo
+        if lo == hi:
+            speed_score = calculate_speed_score(index, as_of=day)
+        elif speed_miles:
+            speed_score = np.mean(speed_miles[:5])
+        else:
+            speed_score = fastest_miles[fastest_deque[0]]
+        
+        # Endurance, volume and long run (90 days)
+        lo = endurance_window.lo
+        if lo == hi:
+            endurance_score = calculate_endurance_score(index, as_of=day)
+            weekly_volume, max_long = 0, 0
+        else:
+            if long_paces:
+                endurance_score = np.mean(long_paces[:3])
+            elif index.count(lo, hi, where='medium'):
+                endurance_score = index.mean('avg_pace', lo, hi, where='medium')
+            else:
+                endurance_score = index.mean('avg_pace', lo, hi)
+            weekly_volume = index.sum('distance', lo, hi) / (90 / 7)
+            max_long = distances[long_13_deque[0]] if long_13_deque else distances[longest_deque[0]]
+        
+        # Fatigue resistance uses every run up to the as-of date
+        fatigue_resistance = calculate_fatigue_resistance(index, day)
+        
+        predictions = predict_from_scores(speed_score, endurance_score, fatigue_resistance,
+                                          weekly_volume, max_long)[0]
+        
+        history[day.strftime('%Y-%m-%d')] = {
+            'speed_score': float(speed_score),
+            'endurance_score': float(endurance_score),
+            'fatigue_resistance': float(fatigue_resistance),
+            'weekly_miles_90': float(weekly_volume),
+            'max_long_run': float(max_long),
+            'predictions': {race: float(t) for race, t in predictions.items()}
+        }
+        day += timedelta(days=1)
+    
+    with open(output_file, 'w') as f:
+        json.dump(history, f, indent=2)
+    
+    print(f"Saved {len(history)} days of predictions to '{output_file}'")
+    return history
+
 # Run the analysis
 if __name__ == "__main__":
-    predict_race_times('strava_running_splits.json')
\ No newline at end of file
+    if len(sys.argv) > 1 and sys.argv[1] == '--history':
+        predict_race_history('strava_running_splits.json')
+    else:
+        predict_race_times('strava_running_splits.json')
\ No newline at end of file
@@ -1,8 +1,13 @@
 import json
 import math
-import datetime
+import sys
 
-INPUT_FILE = "strava_running_clean.json"
+import numpy as np
+
+from activities import load_activities
+
+# The strava.db snapshot by default, or a JSON export (e.g. strava_running_clean.json)
+INPUT_FILE = sys.argv[1] if len(sys.argv) > 1 else None
 OUTPUT_FILE = "running_race_predictions4.json"
 
 # Target races in miles
@@ -17,34 +22,18 @@ RACES = {
     "100 Mile": 100
 }
 
-# Load cleaned running data
-with open(INPUT_FILE, "r") as f:
-    runs = json.load(f)
-
-# Convert pace "m:ss min/mile" or "mm min/mile" to minutes
-def pace_to_minutes(pace_str):
-    if pace_str == "N/A":
-        return None
-    pace_str = pace_str.replace(" min/mile", "")
-    if ":" in pace_str:
-        m, s = pace_str.split(":")
-        return int(m) + int(s)/60
-    else:
-        return float(pace_str)
+# Load runs
+runs = load_activities(INPUT_FILE).runs()
+run_miles, run_minutes, run_pace = runs.listed()  # miles, minutes, min/mile
 
 # Get fastest pace from all runs
-fastest_pace_min = min(
-    [pace_to_minutes(run["average_pace"]) for run in runs if pace_to_minutes(run["average_pace"])],
-    default=None
-)
+fastest_pace_min = float(np.nanmin(run_pace)) if np.isfinite(run_pace).any() else None
 
 # Get longest run distance and time
-longest_run = max(runs, key=lambda x: float(x["distance"].split()[0]), default=None)
-if longest_run:
-    longest_distance = float(longest_run["distance"].split()[0])
-    longest_time_hm = longest_run["time"].split()[0]  # "h:mm"
-    h, m = map(int, longest_time_hm.split(":"))
-    longest_time_hours = h + m/60
+if len(runs):
+    longest = int(np.nanargmax(run_miles))
+    longest_distance = float(run_miles[longest])
+    longest_time_hours = float(run_minutes[longest] // 60 + run_minutes[longest] % 60 / 60)
 else:
     longest_distance = 0
     longest_time_hours = 0
@@ -83,64 +72,34 @@ def cameron(time_hours, distance_miles, target_miles):
 # Helper: Find best time at or near a target distance
 def find_best_time_near_distance(runs, target_miles, tolerance=0.25):
     """Find the fastest run within tolerance of target distance (default 25%)"""
-    candidates = []
-    for run in runs:
-        dist = float(run["distance"].split()[0])
-        if abs(dist - target_miles) / target_miles <= tolerance:
-            pace = pace_to_minutes(run["average_pace"])
-            if pace:
-                time_str = run["time"].split()[0]
-                h, m = map(int, time_str.split(":"))
-                total_minutes = h * 60 + m
-                candidates.append((total_minutes, dist, pace))
-    
-    if not candidates:
+    miles, minutes, pace = runs.listed()
+    near = (np.abs(miles - target_miles) / target_miles <= tolerance) & np.isfinite(pace)
+    if not near.any():
         return None, None, None
-    
+
     # Return the fastest total time (total_minutes, distance, pace)
-    return min(candidates, key=lambda x: x[0])
+    i = np.flatnonzero(near)[np.argmin(minutes[near])]
+    return float(minutes[i]), float(miles[i]), float(pace[i])
 
 # Improved Beckstrand formula
 def beckstrand_formula(runs, target_miles):
-    now = datetime.datetime.now()
-    
     # Find current PR at this distance
     pr_time, pr_dist, pr_pace = find_best_time_near_distance(runs, target_miles)
-    
-    # Collect weighted recent runs
-    recent_runs = []
-    for run in runs:
-        pace_str = run.get("average_pace", "N/A")
-        if pace_str == "N/A":
-            continue
-        
-        pace = pace_str.replace(" min/mile","")
-        if ":" in pace:
-            m, s = pace.split(":")
-            pace_min = int(m) + int(s)/60
-        else:
-            pace_min = float(pace)
 
-        dist = float(run["distance"].split()[0])
-        date = datetime.datetime.strptime(run["date"], "%Y-%m-%dT%H:%M:%SZ")
-        days_ago = (now - date).days
-        
-        # Weight by recency
-        if days_ago <= 90:        # 0-3 months
-            weight = 1.0
-        elif days_ago <= 180:     # 3-6 months
-            weight = 0.6
-        elif days_ago <= 365:     # 6-12 months
-            weight = 0.3
-        else:
-            weight = 0.1
-
-        recent_runs.append({
-            'pace': pace_min,
-            'distance': dist,
-            'weight': weight,
-            'days_ago': days_ago
-        })
+    # Collect weighted recent runs
+    miles, _, pace = runs.listed()
+    days_ago = runs.days_ago()
+    weights = np.select(
+        [days_ago <= 90, days_ago <= 180, days_ago <= 365],  # 0-3, 3-6, 6-12 months
+        [1.0, 0.6, 0.3],
+        default=0.1
+    )
+    valid = np.isfinite(pace)
+    recent_runs = [
+        {'pace': p, 'distance': dist, 'weight': weight, 'days_ago': days}
+        for p, dist, weight, days in zip(pace[valid].tolist(), miles[valid].tolist(),
+                                         weights[valid].tolist(), days_ago[valid].tolist())
+    ]
 
     if not recent_runs:
         return "N/A", "0%", "N/A"
@@ -1,6 +1,10 @@
 import json
 import math
-import datetime
+import time
+
+import numpy as np
+
+from activities import load_activities
 
 INPUT_FILE = "strava_running_splits.json"  # New file name
 OUTPUT_FILE = "running_race_predictions_v2.json"
@@ -17,81 +21,26 @@ RACES = {
     "100 Mile": 100
 }
 
-# Load cleaned running data
-with open(INPUT_FILE, "r") as f:
-    data = json.load(f)
-
-# Convert new format to old format for compatibility
-runs = []
-for activity_id, activity in data.items():
-    # Calculate average pace from mile splits
-    splits = activity["mile_splits"]
-    if splits:
-        # Convert pace strings like "9:17" to total seconds
-        total_seconds = 0
-        valid_splits = 0
-        for split in splits:
-            if ":" in split:
-                parts = split.split(":")
-                mins = int(parts[0])
-                secs = int(parts[1])
-                total_seconds += mins * 60 + secs
-                valid_splits += 1
-        
-        if valid_splits > 0:
-            avg_seconds_per_mile = total_seconds / valid_splits
-            avg_mins = int(avg_seconds_per_mile // 60)
-            avg_secs = int(avg_seconds_per_mile % 60)
-            avg_pace = f"{avg_mins}:{avg_secs:02d} min/mile"
-        else:
-            avg_pace = "N/A"
-    else:
-        avg_pace = "N/A"
-    
-    # Calculate total time from distance and average pace
-    distance = activity["distance_miles"]
-    if avg_pace != "N/A":
-        pace_parts = avg_pace.replace(" min/mile", "").split(":")
-        pace_mins = int(pace_parts[0]) + int(pace_parts[1]) / 60
-        total_mins = pace_mins * distance
-        hours = int(total_mins // 60)
-        mins = int(total_mins % 60)
-        time_str = f"{hours}:{mins:02d}"
-    else:
-        time_str = "0:00"
-    
-    runs.append({
-        "name": activity["name"],
-        "date": activity["date"],
-        "distance": f"{distance} miles",
-        "time": f"{time_str} h:mm",
-        "average_pace": avg_pace
-    })
-
-# Convert pace "m:ss min/mile" or "mm min/mile" to minutes
-def pace_to_minutes(pace_str):
-    if pace_str == "N/A":
-        return None
-    pace_str = pace_str.replace(" min/mile", "")
-    if ":" in pace_str:
-        m, s = pace_str.split(":")
-        return int(m) + int(s)/60
-    else:
-        return float(pace_str)
+# Monte Carlo prediction intervals
+MC_DRAWS = 10000
+MC_PERCENTILES = (10, 50, 90)   # 80% interval plus the median
+MC_RECENT_DAYS = 180            # days before the latest run (weight >= 0.6 window below)
+MC_HARD_PERCENTILE = 25        # efforts used for the model residuals
+MC_SEED = 42
+RIEGEL_EXPONENT = 1.06
+
+# Load runs
+runs = load_activities(INPUT_FILE).runs()
+run_miles, run_minutes, run_pace = runs.listed()  # miles, minutes, min/mile
 
 # Get fastest pace from all runs
-fastest_pace_min = min(
-    [pace_to_minutes(run["average_pace"]) for run in runs if pace_to_minutes(run["average_pace"])],
-    default=None
-)
+fastest_pace_min = float(np.nanmin(run_pace)) if np.isfinite(run_pace).any() else None
 
 # Get longest run distance and time
-longest_run = max(runs, key=lambda x: float(x["distance"].split()[0]), default=None)
-if longest_run:
-    longest_distance = float(longest_run["distance"].split()[0])
-    longest_time_hm = longest_run["time"].split()[0]  # "h:mm"
-    h, m = map(int, longest_time_hm.split(":"))
-    longest_time_hours = h + m/60
+if len(runs):
+    longest = int(np.nanargmax(run_miles))
+    longest_distance = float(run_miles[longest])
+    longest_time_hours = float(run_minutes[longest] // 60 + run_minutes[longest] % 60 / 60)
 else:
     longest_distance = 0
     longest_time_hours = 0
@@ -130,67 +79,37 @@ def cameron(time_hours, distance_miles, target_miles):
 # Helper: Find best time at or near a target distance
 def find_best_time_near_distance(runs, target_miles, tolerance=0.25):
     """Find the fastest run within tolerance of target distance (default 25%)"""
-    candidates = []
-    for run in runs:
-        dist = float(run["distance"].split()[0])
-        if abs(dist - target_miles) / target_miles <= tolerance:
-            pace = pace_to_minutes(run["average_pace"])
-            if pace:
-                time_str = run["time"].split()[0]
-                h, m = map(int, time_str.split(":"))
-                total_minutes = h * 60 + m
-                candidates.append((total_minutes, dist, pace))
-    
-    if not candidates:
+    miles, minutes, pace = runs.listed()
+    near = (np.abs(miles - target_miles) / target_miles <= tolerance) & np.isfinite(pace)
+    if not near.any():
         return None, None, None
-    
+
     # Return the fastest total time (total_minutes, distance, pace)
-    return min(candidates, key=lambda x: x[0])
+    i = np.flatnonzero(near)[np.argmin(minutes[near])]
+    return float(minutes[i]), float(miles[i]), float(pace[i])
 
 # Improved Beckstrand formula
 def beckstrand_formula(runs, target_miles):
-    now = datetime.datetime.now()
-    
     # Find current PR at this distance
     pr_time, pr_dist, pr_pace = find_best_time_near_distance(runs, target_miles)
-    
-    # Collect weighted recent runs
-    recent_runs = []
-    for run in runs:
-        pace_str = run.get("average_pace", "N/A")
-        if pace_str == "N/A":
-            continue
-        
-        pace = pace_str.replace(" min/mile","")
-        if ":" in pace:
-            m, s = pace.split(":")
-            pace_min = int(m) + int(s)/60
-        else:
-            pace_min = float(pace)
-
-        dist = float(run["distance"].split()[0])
-        date = datetime.datetime.strptime(run["date"], "%Y-%m-%dT%H:%M:%SZ")
-        days_ago = (now - date).days
-        
-        # Weight by recency
-        if days_ago <= 90:        # 0-3 months
-            weight = 1.0
-        elif days_ago <= 180:     # 3-6 months
-            weight = 0.6
-        elif days_ago <= 365:     # 6-12 months
-            weight = 0.3
-        else:
-            weight = 0.1
 
-        recent_runs.append({
-            'pace': pace_min,
-            'distance': dist,
-            'weight': weight,
-            'days_ago': days_ago
-        })
+    # Collect weighted recent runs
+    miles, _, pace = runs.listed()
+    days_ago = runs.days_ago()
+    weights = np.select(
+        [days_ago <= 90, days_ago <= 180, days_ago <= 365],  # 0-3, 3-6, 6-12 months
+        [1.0, 0.6, 0.3],
+        default=0.1
+    )
+    valid = np.isfinite(pace)
+    recent_runs = [
+        {'pace': p, 'distance': dist, 'weight': weight, 'days_ago': days}
+        for p, dist, weight, days in zip(pace[valid].tolist(), miles[valid].tolist(),
+                                         weights[valid].tolist(), days_ago[valid].tolist())
+    ]
 
     if not recent_runs:
-        return "N/A", "0%", "N/A"
+        return None, 0
 
     # Find best pace in recent runs (weighted by distance similarity)
     best_recent_pace = None
@@ -287,36 +206,112 @@ def beckstrand_formula(runs, target_miles):
     
     confidence = min(100, confidence)
 
-    # Calculate time variability based on distance
-    if target_miles <= 5:
-        # Short races: tight range (3-5 seconds per mile)
-        seconds_per_mile_variance = 4
-    elif target_miles <= 15:
-        # Medium races: moderate range (5-8 seconds per mile)
-        seconds_per_mile_variance = 6
-    else:
-        # Long races: wider range (8-12 seconds per mile)
-        seconds_per_mile_variance = 10
-    
-    total_variance_seconds = seconds_per_mile_variance * target_miles
-    range_str = f"+/-{int(total_variance_seconds)}s"
+    return predicted_time_min, confidence
+
+
+def format_minutes(total_minutes):
+    hours = int(total_minutes // 60)
+    minutes = int(total_minutes % 60)
+    seconds = int((total_minutes - int(total_minutes)) * 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+def recent_efforts(runs, days=MC_RECENT_DAYS):
+    """
+    (minutes, miles) arrays for runs in the `days` days up to the latest
+    run, so the window doesn't empty out when the data is a while old
+    """
+    if len(runs) == 0:
+        return np.array([]), np.array([])
+    miles, minutes, pace = runs.listed()
+    recent = (runs.days_ago(now=runs["start"].max()) <= days) & np.isfinite(pace) & (miles > 0)
+    return minutes[recent], miles[recent]
+
+
+def monte_carlo_intervals(runs, race_miles, predicted_minutes, draws=MC_DRAWS, seed=MC_SEED):
+    """
+    Heuristic uncertainty bands (minutes) around each predicted race
+    time, all races at once. Returns an array of shape
+    (races, len(MC_PERCENTILES)).
 
-    # Convert predicted time to h:mm:ss
-    hours = int(predicted_time_min // 60)
-    minutes = int(predicted_time_min % 60)
-    seconds = int((predicted_time_min - int(predicted_time_min)) * 60)
-    time_str = f"{hours}:{minutes:02d}:{seconds:02d}"
+    The spread is taken from a Riegel model of the recent efforts, not
+    from the Beckstrand formula itself, so the bands show how uncertain
+    a prediction is rather than a calibrated interval for it.
+
+    Each draw combines two sources of uncertainty:
+    1. Bootstrap of recent efforts - resample the recent runs with
+       replacement and take the best Riegel-equivalent time at each
+       race distance, i.e. how much the estimate depends on which
+       runs happened to be done
+    2. Model residuals - how far each hard recent run (fastest
+       quarter by Riegel-equivalent time) landed from the Riegel
+       prediction made from the best of the other hard runs
+       (centered, so only the spread is used)
+    The combined spread is centred on zero (in log time), so the
+    median of every band is the point prediction.
+    """
+    race_miles = np.asarray(race_miles, dtype=float)
+    predicted_minutes = np.asarray(predicted_minutes, dtype=float)
+    times, miles = recent_efforts(runs)
+    n = len(times)
+    if n < 2:
+        return np.full((len(race_miles), len(MC_PERCENTILES)), np.nan)
+
+    rng = np.random.default_rng(seed)
+    log_times, log_miles = np.log(times), np.log(miles)
+
+    # Riegel-equivalent log time of every effort at every race distance: (efforts, races)
+    equivalent = log_times[:, None] + RIEGEL_EXPONENT * (np.log(race_miles)[None, :] - log_miles[:, None])
+
+    # 1. Bootstrap: best equivalent among each draw's resampled efforts -> (draws, races)
+    sample = rng.integers(0, n, size=(draws, n))
+    best = np.empty((draws, len(race_miles)))
+    for r in range(len(race_miles)):
+        best[:, r] = equivalent[sample, r].min(axis=1)
+    best -= np.median(best, axis=0)
+
+    # 2. Residuals: each hard effort against the prediction from the best other hard
+    #    effort (easy runs would only measure how easy they were)
+    effort_level = log_times - RIEGEL_EXPONENT * log_miles
+    hard = effort_level <= np.percentile(effort_level, MC_HARD_PERCENTILE)
+    if hard.sum() < 2:
+        hard = effort_level <= np.sort(effort_level)[1]
+    hard_times, hard_miles = log_times[hard], log_miles[hard]
+    cross = hard_times[None, :] + RIEGEL_EXPONENT * (hard_miles[:, None] - hard_miles[None, :])
+    np.fill_diagonal(cross, np.inf)
+    residuals = hard_times - cross.min(axis=1)
+    residuals -= np.median(residuals)
+    noise = rng.choice(residuals, size=(draws, len(race_miles)))
+
+    offset = best + noise
+    offset -= np.median(offset, axis=0)
+    simulated = predicted_minutes[None, :] * np.exp(offset)
+    return np.percentile(simulated, MC_PERCENTILES, axis=0).T
 
-    return time_str, f"{confidence}%", range_str
 
 # Generate predictions
+beckstrand = {race: beckstrand_formula(runs, miles) for race, miles in RACES.items()}
+
+start = time.perf_counter()
+predicted = np.array([np.nan if beckstrand[race][0] is None else beckstrand[race][0] for race in RACES])
+intervals = monte_carlo_intervals(runs, list(RACES.values()), predicted)
+mc_seconds = time.perf_counter() - start
+
 predictions = {}
-for race, miles in RACES.items():
+for i, (race, miles) in enumerate(RACES.items()):
+    predicted_time_min, confidence = beckstrand[race]
+    low, _, high = intervals[i]
+    if predicted_time_min is None:
+        beckstrand_result = ("N/A", "0%", "N/A")
+    else:
+        range_str = "N/A" if np.isnan(low) else f"{format_minutes(low)} - {format_minutes(high)}"
+        beckstrand_result = (format_minutes(predicted_time_min), f"{confidence}%", range_str)
+
     predictions[race] = {
         "Riegel": riegel(longest_time_hours, longest_distance, miles),
         "Jack Daniels": jack_daniels(fastest_pace_min, miles),
         "Cameron": cameron(longest_time_hours, longest_distance, miles),
-        "Beckstrand": beckstrand_formula(runs, miles)
+        "Beckstrand": beckstrand_result
     }
 
 # Save predictions
@@ -324,4 +319,5 @@ with open(OUTPUT_FILE, "w") as f:
     json.dump(predictions, f, indent=2)
 
 print(f"Race predictions saved to {OUTPUT_FILE}")
-print(f"Processed {len(runs)} runs from {INPUT_FILE}")
\ No newline at end of file
+print(f"Processed {len(runs)} runs from {INPUT_FILE}")
+print(f"Monte Carlo intervals ({MC_DRAWS} draws x {len(RACES)} races) in {mc_seconds * 1000:.0f} ms")
@@ -1,7 +1,12 @@
 import json
-import datetime
+import math
+import time
+import sys
 
-INPUT_FILE = "strava_raw_data.json"
+from activities import load_activities, month_label, FEET_PER_METER
+
+# The strava.db snapshot by default, or a JSON export (e.g. strava_raw_data.json)
+INPUT_FILE = sys.argv[1] if len(sys.argv) > 1 else None
 OUTPUT_FILE = "strava_running_clean.json"
 
 def time_hours_to_hm(hours):
@@ -21,38 +26,22 @@ def pace_minutes_per_mile(time_hours, distance_miles):
 def round_str(value, unit):
     return f"{round(value, 2)} {unit}"
 
-def month_name(date_str):
-    date = datetime.datetime.strptime(date_str, "%Y-%m-%dT%H:%M:%SZ")
-    return date.strftime("%B %Y")  # e.g., "January 2024"
-
 # Load raw data
-with open(INPUT_FILE, "r") as f:
-    activities = json.load(f)
+runs = load_activities(INPUT_FILE).runs()
 
 running_data = []
 
-for act in activities:
-    if act.get("type") != "Run":
-        continue  # Skip non-running activities
-
-    distance_miles = act.get('distance', 0) * 0.000621371
-    time_hours = act.get('moving_time', 0) / 3600
-    elevation_ft = act.get('total_elevation_gain', 0) * 3.28084
-    avg_hr = act.get('average_heartrate', 'N/A')
-    max_hr = act.get('max_heartrate', 'N/A')
-    start_date = act.get('start_date', None)
-    month_key = month_name(start_date) if start_date else "Unknown"
-
+for run, miles, hours, month in zip(runs, runs.miles, runs.hours, runs.utc_month):
     cleaned = {
-        "name": act.get("name", "Unnamed Run"),
-        "date": start_date,
-        "month": month_key,
-        "distance": round_str(distance_miles, "miles"),
-        "time": time_hours_to_hm(time_hours),
-        "average_pace": pace_minutes_per_mile(time_hours, distance_miles),
-        "total_elevation": round_str(elevation_ft, "ft"),
-        "average_hr": round_str(avg_hr, "bpm") if avg_hr != 'N/A' else "N/A",
-        "max_hr": round_str(max_hr, "bpm") if max_hr != 'N/A' else "N/A"
+        "name": run.name,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(run.start)),
+        "month": month_label(month),
+        "distance": round_str(miles, "miles"),
+        "time": time_hours_to_hm(hours),
+        "average_pace": pace_minutes_per_mile(hours, miles),
+        "total_elevation": round_str(run.elevation_gain * FEET_PER_METER, "ft"),
+        "average_hr": round_str(run.average_heartrate, "bpm") if not math.isnan(run.average_heartrate) else "N/A",
+        "max_hr": round_str(run.max_heartrate, "bpm") if not math.isnan(run.max_heartrate) else "N/A"
     }
 
     running_data.append(cleaned)
@@ -1,8 +1,10 @@
 import json
-from collections import defaultdict
-import datetime
+import sys
 
-INPUT_FILE = "strava_raw_data.json"
+from activities import load_activities, summarize, month_label
+
+# The strava.db snapshot by default, or a JSON export (e.g. strava_raw_data.json)
+INPUT_FILE = sys.argv[1] if len(sys.argv) > 1 else None
 OUTPUT_FILE = "strava_analysis2.json"
 
 # Helper functions
@@ -23,63 +25,27 @@ def pace_minutes_per_mile(time_hours, distance_miles):
     s = int(total_seconds % 60)
     return f"{m}:{s:02d} min/mile"
 
-def month_name(date_str):
-    date = datetime.datetime.strptime(date_str, "%Y-%m-%dT%H:%M:%SZ")
-    return date.strftime("%B %Y")  # e.g., "January 2024"
-
 # Load raw data
-with open(INPUT_FILE, "r") as f:
-    activities = json.load(f)
-
-# Organize by activity type and month
-activity_summary = defaultdict(lambda: {
-    "total_distance": 0, "total_time": 0, "total_elevation": 0,
-    "total_hr": 0, "count_hr": 0, "count": 0
-})
-monthly_summary = defaultdict(lambda: defaultdict(lambda: {
-    "total_distance": 0, "total_time": 0, "total_elevation": 0,
-    "total_hr": 0, "count_hr": 0, "count": 0
-}))
-
-for act in activities:
-    type_ = act.get('type', 'Unknown')
-    distance_miles = act.get('distance', 0) * 0.000621371
-    time_hours = act.get('moving_time', 0) / 3600
-    elevation_ft = act.get('total_elevation_gain', 0) * 3.28084
-    avg_hr = act.get('average_heartrate', 'N/A')
+activities = load_activities(INPUT_FILE)
+types = activities["type"]
+months = activities.utc_month
 
-    date_str = act.get('start_date', None)
-    month_key = month_name(date_str) if date_str else "Unknown"
-
-    # Totals per activity type
-    activity_summary[type_]["total_distance"] += distance_miles
-    activity_summary[type_]["total_time"] += time_hours
-    activity_summary[type_]["total_elevation"] += elevation_ft
-    activity_summary[type_]["count"] += 1
-    if avg_hr != 'N/A':
-        activity_summary[type_]["total_hr"] += avg_hr
-        activity_summary[type_]["count_hr"] += 1
-
-    # Monthly totals
-    monthly_summary[type_][month_key]["total_distance"] += distance_miles
-    monthly_summary[type_][month_key]["total_time"] += time_hours
-    monthly_summary[type_][month_key]["total_elevation"] += elevation_ft
-    monthly_summary[type_][month_key]["count"] += 1
-    if avg_hr != 'N/A':
-        monthly_summary[type_][month_key]["total_hr"] += avg_hr
-        monthly_summary[type_][month_key]["count_hr"] += 1
+# Totals per activity type, and per type per month
+activity_summary = summarize(activities, types)
+monthly_summary = {
+    type_: summarize(activities[types == type_], months[types == type_])
+    for type_ in activity_summary
+}
 
 # Convert to readable format with pace
 def convert_readable(summary, is_monthly=False):
     result = {}
     for act_type, data in summary.items():
         if is_monthly:
-            # sort months chronologically
-            sorted_months = sorted(data.keys(), key=lambda x: datetime.datetime.strptime(x, "%B %Y"))
             month_data = {}
-            for month in sorted_months:
-                d = data[month]
-                month_data[month] = {
+            # sort months chronologically (YYYYMM keys)
+            for month, d in sorted(data.items()):
+                month_data[month_label(month)] = {
                     "total_distance": round_str(d["total_distance"], "miles"),
                     "total_time": time_hours_to_hm(d["total_time"]),
                     "average_pace": pace_minutes_per_mile(d["total_time"], d["total_distance"]),
@@ -0,0 +1,507 @@
+import sqlite3
+import base64
+import gzip
+import json
+import os
+import queue
+import re
+import sys
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from backend.cache import CachedResponse, ResponseCache, cache_key, current_data_version
+from backend.events import EventBroker, format_sse, KEEPALIVE_SECONDS
+from backend.webhook import Webhook
+from backend.streams import (
+    downsampled_streams, pack_float32, to_json, CHART_FIELDS, DEFAULT_FIELDS, DEFAULT_POINTS, MAX_POINTS
+)
+from processing.units import METERS_PER_MILE
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# ---------------------------------------------------------
+# JSON API over strava.db for the frontend (read-only apart
+# from the Strava webhook).
+#
+#   GET /activities          newest first, filtered by
+#                            ?sport=Run&after=YYYY-MM-DD&before=YYYY-MM-DD
+#                            &min_distance=M&max_distance=M&limit=N
+#                            paged with ?cursor=<next_cursor>
+#   GET /activities/{id}     one activity + its processed metrics
+#   GET /summary             totals per sport and per month
+#   GET /activities/{id}/streams?points=N&fields=heartrate,pace
+#                            chart-ready streams downsampled to
+#                            N points (backend/streams.py) as packed
+#                            float32 columns, or ?format=json
+#   GET /events              ingestion progress as Server-Sent
+#                            Events (backend/events.py)
+#   GET/POST /webhook        Strava webhook subscription validation
+#                            and events (backend/webhook.py; the
+#                            only endpoint that writes)
+#
+# Pages use keyset pagination on (start_date, id): the cursor
+# is the last row's key, so every page is an index range scan
+# no matter how deep into the history it is (no OFFSET).
+#
+# Requests share a pool of read-only SQLite connections.
+# Responses carry an ETag (If-None-Match -> 304) and are
+# compressed with br (if the brotli package is installed) or
+# gzip when the client accepts it.
+#
+# Finished responses (and their compressed copies) are kept in
+# a response cache (backend/cache.py) that is dropped whenever
+# ingestion bumps the data_version counter, so repeat dashboard
+# loads cost one counter lookup instead of the real queries.
+#
+# Run from the pro/ folder:
+#   python -m backend.app [--port PORT] [--cache-dir DIR] [--no-cache]
+# (set STRAVA_ACCESS_TOKEN to let the webhook fetch new activities)
+# ---------------------------------------------------------
+
+
+DB_PATH = "strava.db"
+POOL_SIZE = 8
+DEFAULT_PORT = 8000
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MIN_COMPRESS_BYTES = 1024
+
+ACTIVITY_COLUMNS = (
+    "id", "name", "sport_type", "start_date", "start_date_local", "distance",
+    "moving_time", "elapsed_time", "total_elevation_gain", "average_speed",
+    "max_speed", "average_heartrate", "max_heartrate", "workout_type"
+)
+
+
+class Response:
+    """Non-JSON response body returned by an endpoint."""
+
+    def __init__(self, content_type, body, headers=None):
+        self.content_type = content_type
+        self.body = body
+        self.headers = headers or {}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# ------------------------------
+# Connection pool
+# ------------------------------
+
+class ConnectionPool:
+    """Fixed-size pool of read-only connections shared by the request threads."""
+
+    def __init__(self, db_path=DB_PATH, size=POOL_SIZE):
+        self.connections = queue.Queue()
+        for _ in range(size):
+            conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+            conn.execute("PRAGMA query_only = ON")
+            self.connections.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.connections.get()
+        try:
+            yield conn
+        finally:
+            self.connections.put(conn)
+
+    def close(self):
+        while not self.connections.empty():
+            self.connections.get().close()
+
+
+# ------------------------------
+# Endpoints
+# ------------------------------
+
+def rows_to_dicts(cursor):
+    names = [d[0] for d in cursor.description]
+    return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+
+def encode_cursor(start_date, activity_id):
+    return base64.urlsafe_b64encode(f"{start_date}|{activity_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(value):
+    try:
+        padded = value + "=" * (-len(value) % 4)
+        start_date, activity_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return start_date, int(activity_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPError(400, "Invalid cursor")
+
+
+def param(params, name, convert=str, default=None):
+    """One query parameter converted, or default; bad values are a 400."""
+    if name not in params:
+        return default
+    try:
+        return convert(params[name][-1])
+    except ValueError:
+        raise HTTPError(400, f"Invalid value for {name}")
+
+
+def list_activities(conn, params):
+    limit = min(max(param(params, "limit", int, DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+
+    where, args = [], []
+    sport = param(params, "sport")
+    if sport:
+        where.append("sport_type = ?")
+        args.append(sport)
+    after = param(params, "after")
+    if after:
+        where.append("start_date >= ?")
+        args.append(after)
+    before = param(params, "before")
+    if before:
+        where.append("start_date < ?")
+        args.append(before)
+    min_distance = param(params, "min_distance", float)
+    if min_distance is not None:
+        where.append("distance >= ?")
+        args.append(min_distance)
+    max_distance = param(params, "max_distance", float)
+    if max_distance is not None:
+        where.append("distance <= ?")
+        args.append(max_distance)
+    if "cursor" in params:
+        where.append("(start_date, id) < (?, ?)")
+        args.extend(decode_cursor(param(params, "cursor")))
+
+    cursor = conn.execute(f"""
+        SELECT {", ".join(ACTIVITY_COLUMNS)}
+        FROM activities
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY start_date DESC, id DESC
+        LIMIT ?
+    """, args + [limit + 1])
+    activities = rows_to_dicts(cursor)
+
+    next_cursor = None
+    if len(activities) > limit:
+        activities = activities[:limit]
+        last = activities[-1]
+        next_cursor = encode_cursor(last["start_date"], last["id"])
+    return {"activities": activities, "next_cursor": next_cursor}
+
+
+def get_activity(conn, activity_id):
+    cursor = conn.execute(f"""
+        SELECT {", ".join("a." + c for c in ACTIVITY_COLUMNS)},
+               m.gap_speed, m.avg_power, m.normalized_power, m.hr_drift, m.efficiency,
+               l.trimp_banister, l.trimp_edwards,
+               r.label AS run_type,
+               i.rep_count, i.avg_rep_pace, i.avg_recovery_pace,
+               q.quality AS stream_quality,
+               g.length AS route_length,
+               g.min_lat, g.min_lng, g.max_lat, g.max_lng
+        FROM activities a
+        LEFT JOIN metrics m ON m.activity_id = a.id
+        LEFT JOIN activity_load l ON l.activity_id = a.id
+        LEFT JOIN run_features r ON r.activity_id = a.id
+        LEFT JOIN interval_summary i ON i.activity_id = a.id
+        LEFT JOIN stream_quality q ON q.activity_id = a.id
+        LEFT JOIN routes g ON g.activity_id = a.id
+        WHERE a.id = ?
+    """, (activity_id,))
+    rows = rows_to_dicts(cursor)
+    if not rows:
+        raise HTTPError(404, f"Activity {activity_id} not found")
+
+    activity = rows[0]
+    cursor = conn.execute("""
+        SELECT split_index, distance, moving_time, pace
+        FROM splits
+        WHERE activity_id = ? AND split_length = ?
+        ORDER BY split_index
+    """, (activity_id, METERS_PER_MILE))
+    activity["splits"] = rows_to_dicts(cursor)
+    return activity
+
+
+def get_summary(conn, params):
+    totals = rows_to_dicts(conn.execute("""
+        SELECT sport_type, COUNT(*) AS count, SUM(distance) AS distance,
+               SUM(moving_time) AS moving_time, SUM(total_elevation_gain) AS elevation_gain,
+               MIN(start_date) AS first, MAX(start_date) AS last
+        FROM activities
+        GROUP BY sport_type
+        ORDER BY count DESC
+    """))
+    monthly = rows_to_dicts(conn.execute("""
+        SELECT substr(COALESCE(start_date_local, start_date), 1, 7) AS month, sport_type,
+               COUNT(*) AS count, SUM(distance) AS distance, SUM(moving_time) AS moving_time
+        FROM activities
+        GROUP BY month, sport_type
+        ORDER BY month, sport_type
+    """))
+    load = rows_to_dicts(conn.execute("""
+        SELECT date, ctl, atl, tsb FROM training_load ORDER BY date DESC LIMIT 1
+    """))
+    return {"totals": totals, "monthly": monthly, "training_load": load[0] if load else None}
+
+
+def get_streams(conn, params, activity_id):
+    points = min(max(param(params, "points", int, DEFAULT_POINTS), 2), MAX_POINTS)
+    fields = tuple(f for f in param(params, "fields", default=",".join(DEFAULT_FIELDS)).split(",") if f)
+    unknown = [f for f in fields if f not in CHART_FIELDS]
+    if unknown or not fields:
+        raise HTTPError(400, f"Unknown stream fields: {', '.join(unknown)} (expected {', '.join(CHART_FIELDS)})")
+
+    result = downsampled_streams(conn, activity_id, points, fields)
+    if result is None:
+        raise HTTPError(404, f"No streams for activity {activity_id}")
+
+    if param(params, "format", default="binary") == "json":
+        return {"fields": ("time",) + fields, "points": len(result["time"]), "data": to_json(result, fields)}
+
+    # Columns time, then fields, each `points` little-endian float32 values (NaN = missing)
+    return Response("application/octet-stream", pack_float32(result, fields), {
+        "X-Stream-Fields": ",".join(("time",) + fields),
+        "X-Stream-Points": str(len(result["time"]))
+    })
+
+
+# (method, path pattern, handler(conn, params, *groups))
+ROUTES = [
+    ("GET", re.compile(r"/activities"), list_activities),
+    ("GET", re.compile(r"/activities/(\d+)"), lambda conn, params, activity_id: get_activity(conn, int(activity_id))),
+    ("GET", re.compile(r"/activities/(\d+)/streams"),
+     lambda conn, params, activity_id: get_streams(conn, params, int(activity_id))),
+    ("GET", re.compile(r"/summary"), get_summary),
+]
+
+
+# ------------------------------
+# HTTP
+# ------------------------------
+
+def accepted_encoding(header):
+    """Best supported content coding the client accepts ("br", "gzip" or None)."""
+    accepted = {part.split(";")[0].strip() for part in (header or "").split(",")
+                if not part.strip().endswith(";q=0")}
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+def etag_matches(header, tag):
+    """If-None-Match against the entity tag (any content coding of the same body matches)."""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    base = tag.strip('"').split("-")[0]
+    return any(t.strip().removeprefix("W/").strip('"').split("-")[0] == base for t in header.split(","))
+
+
+class Handler(BaseHTTPRequestHandler):
+    pool = None
+    cache = None
+    broker = None
+    webhook = None
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self.send_cors_headers()
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def dispatch(self, method):
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        path = url.path.rstrip("/") or "/"
+
+        if method == "GET" and path == "/events":
+            self.stream_events(params)
+            return
+
+        try:
+            if path == "/webhook":
+                self.handle_webhook(method, params)
+                return
+            for route_method, pattern, handler in ROUTES:
+                match = pattern.fullmatch(path)
+                if match and route_method == method:
+                    key = cache_key(path, params)
+                    with self.pool.connection() as conn:
+                        version = current_data_version(conn)
+                        entry = self.cache.get(version, key) if self.cache else None
+                        if entry is None:
+                            entry = to_response(handler(conn, params, *match.groups()))
+                            if self.cache:
+                                self.cache.put(version, key, entry)
+                    self.send_entry(200, entry, key)
+                    return
+            raise HTTPError(404, f"No route for {method} {path}")
+        except HTTPError as e:
+            error = CachedResponse("application/json", json_bytes({"error": e.message}))
+            self.send_entry(e.status, error, None, conditional=False)
+
+    def send_cors_headers(self):
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Allow-Headers", "If-None-Match, Content-Type, Last-Event-ID")
+        self.send_header("Access-Control-Expose-Headers", "ETag, X-Stream-Fields, X-Stream-Points")
+
+    def handle_webhook(self, method, params):
+        """Subscription validation (GET) or one event (POST); never cached."""
+        if method == "GET":
+            challenge = self.webhook.validate({k: v[-1] for k, v in params.items()})
+            if challenge is None:
+                raise HTTPError(403, "Verify token mismatch")
+            payload = {"hub.challenge": challenge}
+        elif method == "POST":
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                self.webhook.receive(json.loads(self.rfile.read(length)))
+            except (ValueError, UnicodeDecodeError) as e:
+                raise HTTPError(400, str(e))
+            payload = {"ok": True}
+        else:
+            raise HTTPError(405, f"{method} not allowed on /webhook")
+        self.send_entry(200, CachedResponse("application/json", json_bytes(payload)), None, conditional=False)
+
+    def stream_events(self, params):
+        """
+        Hold the connection open and write each ingestion event as it
+        arrives (never cached or compressed). Replays what the client
+        missed when it reconnects with Last-Event-ID (or ?last_event_id=).
+        """
+        last_event_id = self.headers.get("Last-Event-ID") or (params.get("last_event_id") or [None])[-1]
+        try:
+            last_event_id = int(last_event_id) if last_event_id is not None else None
+        except ValueError:
+            last_event_id = None
+
+        client, missed = self.broker.subscribe(last_event_id)
+        self.close_connection = True
+        try:
+            self.send_response(200)
+            self.send_cors_headers()
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.wfile.write(b"retry: 3000\n\n")
+            for event in missed:
+                self.wfile.write(format_sse(event))
+            self.wfile.flush()
+
+            while True:
+                try:
+                    event = client.get(timeout=KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    # Comment line: keeps proxies from timing the stream out
+                    self.wfile.write(b": keepalive\n\n")
+                else:
+                    if event is None:
+                        break
+                    self.wfile.write(format_sse(event))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.broker.unsubscribe(client)
+
+    def send_entry(self, status, entry, key, conditional=True):
+        """Send a response: 304 if the client's ETag matches, compressed if it accepts that."""
+        headers = dict(entry.headers, **{"Content-Type": entry.content_type, "Vary": "Accept-Encoding"})
+
+        if conditional:
+            if etag_matches(self.headers.get("If-None-Match"), entry.etag):
+                self.send_response(304)
+                self.send_cors_headers()
+                self.send_header("ETag", f'"{entry.etag}"')
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            headers["Cache-Control"] = "no-cache"
+
+        body = entry.body
+        encoding = accepted_encoding(self.headers.get("Accept-Encoding")) if len(body) >= MIN_COMPRESS_BYTES else None
+        if encoding:
+            body = entry.encoded.get(encoding)
+            if body is None:
+                body = compress(entry.body, encoding)
+                if self.cache and key is not None:
+                    self.cache.add_encoding(key, entry, encoding, body)
+            headers["Content-Encoding"] = encoding
+        if conditional:
+            # Strong ETags differ per content coding
+            headers["ETag"] = f'"{entry.etag}-{encoding}"' if encoding else f'"{entry.etag}"'
+
+        self.send_response(status)
+        self.send_cors_headers()
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def to_response(payload):
+    """Endpoint result (JSON-able value or Response) -> CachedResponse."""
+    if isinstance(payload, Response):
+        return CachedResponse(payload.content_type, payload.body, payload.headers)
+    return CachedResponse("application/json", json_bytes(payload))
+
+
+def json_bytes(payload):
+    return json.dumps(payload, separators=(",", ":")).encode()
+
+
+def run(port=DEFAULT_PORT, db_path=DB_PATH, cache=True, cache_dir=None):
+    Handler.pool = ConnectionPool(db_path)
+    Handler.cache = ResponseCache(disk_dir=cache_dir) if cache else None
+    Handler.broker = EventBroker(db_path)
+    Handler.webhook = Webhook(db_path, os.environ.get("STRAVA_ACCESS_TOKEN"))
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    print(f"Serving strava.db at http://localhost:{port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    Handler.broker.close()
+    Handler.webhook.close()
+    Handler.pool.close()
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[sys.argv.index("--port") + 1]) if "--port" in sys.argv else DEFAULT_PORT
+    cache_dir = sys.argv[sys.argv.index("--cache-dir") + 1] if "--cache-dir" in sys.argv else None
+    run(port, cache="--no-cache" not in sys.argv, cache_dir=cache_dir)
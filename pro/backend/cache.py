@@ -0,0 +1,152 @@
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+# ---------------------------------------------------------
+# Response cache for backend/app.py.
+#
+# Finished GET responses are kept in an in-process LRU bounded
+# by total body size, keyed by path + sorted query parameters.
+# Every entry belongs to one data version: the counter in the
+# "data_version" table that the insert / processing scripts
+# bump when they commit (database.bump_data_version). When the
+# counter moves, the whole cache is dropped at once, so there is
+# no TTL and nothing is ever served stale.
+#
+# Optionally the cache is also written to disk (one pickle per
+# response under a per-version folder), so a restarted server
+# starts warm as long as the data hasn't changed.
+# ---------------------------------------------------------
+
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+def current_data_version(conn):
+    """The data_version counter (0 before anything was ingested)."""
+    row = conn.execute("SELECT version FROM data_version WHERE id = 1").fetchone()
+    return row[0] if row else 0
+
+
+def cache_key(path, params):
+    return path + "?" + "&".join(f"{k}={v}" for k, values in sorted(params.items()) for v in values)
+
+
+class CachedResponse:
+    """A response body plus whatever is derived from it lazily (ETag, compressed copies)."""
+    __slots__ = ("content_type", "body", "headers", "etag", "encoded")
+
+    def __init__(self, content_type, body, headers=None):
+        self.content_type = content_type
+        self.body = body
+        self.headers = headers or {}
+        self.etag = hashlib.sha1(body).hexdigest()[:20]
+        self.encoded = {}
+
+    @property
+    def size(self):
+        return len(self.body) + sum(len(b) for b in self.encoded.values())
+
+
+class ResponseCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_version = None
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def _check_version(self, version):
+        """Drop everything built from older data (call with the lock held)."""
+        if version != self.version:
+            self.entries.clear()
+            self.bytes = 0
+            self.version = version
+
+    def _disk_path(self, version, key):
+        name = hashlib.sha1(key.encode()).hexdigest()
+        return os.path.join(self.disk_dir, f"v{version}", f"{name}.pickle")
+
+    def get(self, version, key):
+        with self.lock:
+            self._check_version(version)
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        if self.disk_dir:
+            path = self._disk_path(version, key)
+            if os.path.exists(path):
+                try:
+                    with open(path, "rb") as f:
+                        entry = pickle.load(f)
+                except (OSError, pickle.UnpicklingError, EOFError):
+                    entry = None
+                if entry is not None:
+                    self._store(version, key, entry)
+                    with self.lock:
+                        self.hits += 1
+                    return entry
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, version, key, entry):
+        self._store(version, key, entry)
+        if self.disk_dir:
+            self._write_disk(version, key, entry)
+
+    def _store(self, version, key, entry):
+        with self.lock:
+            self._check_version(version)
+            if entry.size > self.max_bytes:
+                return
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old.size
+            self.entries[key] = entry
+            self.bytes += entry.size
+            while self.bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= evicted.size
+
+    def add_encoding(self, key, entry, encoding, body):
+        """Remember a compressed copy of an entry's body."""
+        with self.lock:
+            if encoding not in entry.encoded:
+                entry.encoded[encoding] = body
+                if self.entries.get(key) is entry:
+                    self.bytes += len(body)
+
+    def _write_disk(self, version, key, entry):
+        path = self._disk_path(version, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if version != self.disk_version:
+            self._remove_old_versions(version)
+            self.disk_version = version
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(entry, f)
+        os.replace(tmp, path)
+
+    def _remove_old_versions(self, version):
+        for name in os.listdir(self.disk_dir):
+            folder = os.path.join(self.disk_dir, name)
+            if name.startswith("v") and name != f"v{version}" and os.path.isdir(folder):
+                for filename in os.listdir(folder):
+                    os.remove(os.path.join(folder, filename))
+                os.rmdir(folder)
+
+    def stats(self):
+        with self.lock:
+            return {"version": self.version, "entries": len(self.entries), "bytes": self.bytes,
+                    "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,117 @@
+import sqlite3
+import json
+import queue
+import threading
+
+# ---------------------------------------------------------
+# Fans ingestion progress events out to browsers.
+#
+# The ingestion / insert scripts append rows to the
+# "ingestion_events" table (database/events.py). One broker
+# thread per server polls that table for ids past the last one
+# it saw and pushes each new event into the queue of every
+# connected client, so the table is read once no matter how
+# many dashboards are open. backend/app.py streams the queues
+# as Server-Sent Events at GET /events.
+#
+# A reconnecting client sends Last-Event-ID (EventSource does
+# this itself) and is first replayed the events it missed.
+# ---------------------------------------------------------
+
+
+POLL_SECONDS = 0.5
+KEEPALIVE_SECONDS = 15
+CLIENT_QUEUE_SIZE = 1000
+REPLAY_LIMIT = 500
+
+EVENT_COLUMNS = "id, created, source, kind, activity_id, data"
+
+
+def event_dict(row):
+    event_id, created, source, kind, activity_id, data = row
+    event = {"id": event_id, "created": created, "source": source, "kind": kind, "activity_id": activity_id}
+    event.update(json.loads(data) if data else {})
+    return event
+
+
+def format_sse(event):
+    """One event in text/event-stream framing."""
+    return f"id: {event['id']}\nevent: {event['kind']}\ndata: {json.dumps(event, separators=(',', ':'))}\n\n".encode()
+
+
+def events_after(conn, last_id, limit=REPLAY_LIMIT):
+    cursor = conn.execute(f"""
+        SELECT {EVENT_COLUMNS} FROM ingestion_events
+        WHERE id > ?
+        ORDER BY id
+        LIMIT ?
+    """, (last_id, limit))
+    return [event_dict(row) for row in cursor.fetchall()]
+
+
+def latest_event_id(conn):
+    return conn.execute("SELECT COALESCE(MAX(id), 0) FROM ingestion_events").fetchone()[0]
+
+
+class EventBroker:
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        self.last_id = latest_event_id(self.conn)
+        self.clients = set()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._poll, daemon=True)
+        self.thread.start()
+
+    def subscribe(self, last_event_id=None):
+        """
+        A queue of new events for one client (None = disconnect), plus
+        the events after last_event_id it missed (none for a fresh client).
+        """
+        client = queue.Queue(CLIENT_QUEUE_SIZE)
+        with self.lock:
+            self.clients.add(client)
+            missed = events_after(self.conn, last_event_id) if last_event_id is not None else []
+            # Events the poller publishes next are newer than the replay
+            missed = [e for e in missed if e["id"] <= self.last_id]
+        return client, missed
+
+    def unsubscribe(self, client):
+        with self.lock:
+            self.clients.discard(client)
+
+    def _poll(self):
+        while not self.stopped.wait(POLL_SECONDS):
+            with self.lock:
+                if not self.clients:
+                    self.last_id = latest_event_id(self.conn)
+                    continue
+                events = events_after(self.conn, self.last_id)
+                if not events:
+                    continue
+                self.last_id = events[-1]["id"]
+                for client in list(self.clients):
+                    try:
+                        for event in events:
+                            client.put_nowait(event)
+                    except queue.Full:
+                        self._drop(client)
+
+    def _drop(self, client):
+        """
+        Disconnect a client that stopped reading (call with the lock
+        held): its queue is replaced by a None that ends its stream,
+        and it catches up via Last-Event-ID when it reconnects.
+        """
+        self.clients.discard(client)
+        while True:
+            try:
+                client.get_nowait()
+            except queue.Empty:
+                break
+        client.put_nowait(None)
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+        self.conn.close()
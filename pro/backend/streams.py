@@ -0,0 +1,118 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from processing.streams import load_streams, STREAM_COLUMNS
+
+# ---------------------------------------------------------
+# Downsampled streams for charts (backend/app.py serves them at
+# /activities/{id}/streams?points=N&fields=a,b,...).
+#
+# Min/max bucketing: the samples are split into equal buckets
+# and each field keeps its lowest and highest sample in every
+# bucket, so peaks and dips survive (plain decimation drops
+# them). The kept samples of all fields are merged into one
+# shared time axis of at most N points. All fields are bucketed
+# in one NumPy pass.
+#
+# Results are cached in memory per (activity, N, fields) and
+# keyed on a fingerprint of the activity's stream rows, so
+# re-inserted streams are never served stale.
+# ---------------------------------------------------------
+
+
+CHART_FIELDS = tuple(c for c in STREAM_COLUMNS if c != "time")
+DEFAULT_FIELDS = ("heartrate", "pace", "elevation", "cadence", "distance")
+DEFAULT_POINTS = 1000
+MAX_POINTS = 20000
+
+CACHE_BYTES = 64 * 1024 * 1024
+
+_cache = OrderedDict()
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+
+
+def minmax_indices(values, points):
+    """
+    Sample indices to keep so each column of values (n, f) keeps
+    its min and max per bucket, at most `points` indices in total.
+    """
+    n, f = values.shape
+    if n <= points:
+        return np.arange(n)
+
+    # Each bucket keeps up to 2 samples per column, plus both ends
+    buckets = (points - 2) // (2 * f)
+    if buckets < 1:
+        # Too few points for a min and max of every column - spread them evenly
+        return np.unique(np.linspace(0, n - 1, points).round().astype(int))
+
+    edges = np.linspace(0, n, buckets + 1).astype(int)
+    width = int(np.diff(edges).max())
+
+    # (buckets, width) sample indices; the shorter buckets are padded past their end
+    idx = edges[:-1, None] + np.arange(width)
+    inside = idx < edges[1:, None]
+    idx = np.minimum(idx, n - 1)
+
+    window = values[idx]                                    # (buckets, width, f)
+    low = np.where(inside[..., None] & ~np.isnan(window), window, np.inf)
+    high = np.where(inside[..., None] & ~np.isnan(window), window, -np.inf)
+    rows = np.arange(buckets)[:, None]
+    keep = np.concatenate([
+        idx[rows, low.argmin(axis=1)].ravel(),
+        idx[rows, high.argmax(axis=1)].ravel(),
+        [0, n - 1]
+    ])
+    return np.unique(keep)
+
+
+def stream_fingerprint(cursor, activity_id):
+    cursor.execute("SELECT COUNT(*), MAX(id) FROM streams WHERE activity_id = ?", (activity_id,))
+    return cursor.fetchone()
+
+
+def downsampled_streams(conn, activity_id, points=DEFAULT_POINTS, fields=DEFAULT_FIELDS):
+    """
+    {"time": ..., field: ...} float32 arrays of at most `points`
+    samples, or None if the activity has no streams.
+    """
+    global _cache_bytes
+
+    cursor = conn.cursor()
+    key = (activity_id, points, tuple(fields), stream_fingerprint(cursor, activity_id))
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    streams = load_streams(cursor, activity_id, ("time",) + tuple(fields))
+    if streams is None:
+        return None
+
+    keep = minmax_indices(np.column_stack([streams[f] for f in fields]), points)
+    result = {name: values[keep].astype(np.float32) for name, values in streams.items()}
+
+    size = sum(v.nbytes for v in result.values())
+    with _cache_lock:
+        _cache[key] = result
+        _cache_bytes += size
+        while _cache_bytes > CACHE_BYTES and len(_cache) > 1:
+            _, evicted = _cache.popitem(last=False)
+            _cache_bytes -= sum(v.nbytes for v in evicted.values())
+    return result
+
+
+def pack_float32(result, fields):
+    """Columns back to back as little-endian float32: time, then each field."""
+    return b"".join(result[name].astype("<f4").tobytes() for name in ("time",) + tuple(fields))
+
+
+def to_json(result, fields):
+    """JSON-ready columns (NaN -> None)."""
+    return {
+        name: [None if np.isnan(v) else v for v in result[name].tolist()]
+        for name in ("time",) + tuple(fields)
+    }
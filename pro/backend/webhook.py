@@ -0,0 +1,413 @@
+import sqlite3
+import json
+import os
+import subprocess
+import sys
+import threading
+import urllib.request
+
+from database.database import bump_data_version
+from database.events import emit_event
+from database.snapshot import write_snapshot
+from ingestion.get_activity_streams import get_streams, FILTER_SPORT
+from ingestion.get_detailed_activity import get_detailed_activity
+from processing.training_load import update_daily_load
+
+# ---------------------------------------------------------
+# Strava webhook receiver (push instead of polling
+# /athlete/activities). backend/app.py serves it at /webhook:
+#
+#   GET  /webhook?hub.mode=subscribe&hub.verify_token=T&hub.challenge=C
+#        subscription validation -> {"hub.challenge": C}
+#   POST /webhook
+#        {"object_type": "activity", "aspect_type": "create" | "update" | "delete",
+#         "object_id": ..., "owner_id": ..., "event_time": ..., "updates": {...}}
+#
+# Strava wants a 200 within two seconds, so a POST only does
+# quick database work:
+# - every event is logged to "webhook_events"
+# - create: the activity id goes into "fetch_queue"
+# - update: title / type changes are written to "activities"
+#   and to the raw JSON (activities_raw.json and the detailed
+#   file), so re-running the insert scripts keeps them
+# - delete: the activity's rows (every table with an
+#   activity_id), raw files and activities_raw.json entry are
+#   removed and the affected segment leaderboards / PR flags
+#   are rebuilt; the daily training load is recomputed from
+#   the activity's date, and processing/heatmap.py rebuilds
+#   its tiles on its next run
+#
+# A worker thread drains fetch_queue with the ingestion
+# functions (get_detailed_activity, get_streams), saves the raw
+# JSON next to the polled files and loads it with the existing
+# insert scripts. The worker only runs with an access token
+# (STRAVA_ACCESS_TOKEN); without one, events are still applied
+# and queued, which is enough to test the flow offline:
+#
+#   python -m backend.app --port 8000
+#   python -m backend.webhook --replay events.json [--url http://localhost:8000/webhook]
+#
+# events.json holds recorded events (a list, or one per line);
+# --record FILE writes the logged events in that format.
+# ---------------------------------------------------------
+
+
+VERIFY_TOKEN = os.environ.get("STRAVA_VERIFY_TOKEN", "strava-pro")
+DEFAULT_URL = "http://localhost:8000/webhook"
+
+RAW_ACTIVITIES = "data_raw/activities_raw.json"
+DETAILED_DIR = "data_raw/detailed_activities"
+STREAMS_DIR = "data_raw/activity_streams"
+
+MAX_ATTEMPTS = 5
+POLL_SECONDS = 5
+RETRY_SECONDS = 60
+RATE_LIMIT_SLEEP = 15 * 60
+LEADERBOARD_SIZE = 10      # same as database/insert_segments.py
+
+# Webhook "updates" key -> activities column
+UPDATE_COLUMNS = {"title": "name", "type": "sport_type"}
+# Webhook "updates" key -> detailed activity JSON keys
+UPDATE_KEYS = {"title": ("name",), "type": ("type", "sport_type")}
+
+RATE_LIMITED = "Rate Limit Exceeded"
+
+
+# ------------------------------
+# Database changes
+# ------------------------------
+
+def activity_tables(cursor):
+    """Tables keyed by activity (an activity_id column), except the event log."""
+    tables = [row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    return [
+        t for t in tables
+        if t != "ingestion_events" and any(c[1] == "activity_id" for c in cursor.execute(f"PRAGMA table_info({t})"))
+    ]
+
+
+def rebuild_segment(cursor, segment_id):
+    """Recompute PR flags and the leaderboard of a segment after efforts were removed."""
+    cursor.execute("""
+        UPDATE segment_efforts AS e
+        SET is_pr = NOT EXISTS (
+            SELECT 1 FROM segment_efforts p
+            WHERE p.segment_id = e.segment_id AND p.start_date < e.start_date
+              AND p.elapsed_time <= e.elapsed_time
+        )
+        WHERE segment_id = ?
+    """, (segment_id,))
+    cursor.execute("DELETE FROM segment_leaderboard WHERE segment_id = ?", (segment_id,))
+    cursor.execute("""
+        INSERT INTO segment_leaderboard (segment_id, rank, effort_id, activity_id, elapsed_time, start_date)
+        SELECT segment_id, ROW_NUMBER() OVER (ORDER BY elapsed_time, start_date), id, activity_id,
+               elapsed_time, start_date
+        FROM segment_efforts
+        WHERE segment_id = ?
+        ORDER BY elapsed_time, start_date
+        LIMIT ?
+    """, (segment_id, LEADERBOARD_SIZE))
+
+
+def set_update_keys(activity, updates):
+    """Write webhook title / type updates into a raw activity dict."""
+    for key, value in updates.items():
+        for json_key in UPDATE_KEYS.get(key, ()):
+            activity[json_key] = value
+
+
+def edit_raw_activities(activity_id, updates=None):
+    """
+    Patch the activity's entry in the polled activities_raw.json (or drop
+    it when updates is None). That file is the insert scripts' default
+    source, so re-running them neither undoes an update nor brings a
+    deleted activity back.
+    """
+    if not os.path.exists(RAW_ACTIVITIES):
+        return
+    with open(RAW_ACTIVITIES, "r") as f:
+        activities = json.load(f)
+
+    found = False
+    kept = []
+    for a in activities:
+        if a.get("id") == activity_id:
+            found = True
+            if updates is None:
+                continue
+            set_update_keys(a, updates)
+        kept.append(a)
+    if not found:
+        return
+
+    # Write a copy and swap it in, so an interrupted write can't lose the file
+    with open(RAW_ACTIVITIES + ".tmp", "w") as f:
+        json.dump(kept, f, indent=2)
+    os.replace(RAW_ACTIVITIES + ".tmp", RAW_ACTIVITIES)
+
+
+def delete_activity(cursor, activity_id):
+    """
+    Remove an activity everywhere. Returns the date its training load
+    was counted on (the daily series from there on is dropped and must
+    be recomputed), or None.
+    """
+    cursor.execute("SELECT DISTINCT segment_id FROM segment_efforts WHERE activity_id = ?", (activity_id,))
+    segment_ids = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT date FROM activity_load WHERE activity_id = ?", (activity_id,))
+    row = cursor.fetchone()
+    load_date = row[0] if row else None
+
+    for table in activity_tables(cursor):
+        cursor.execute(f"DELETE FROM {table} WHERE activity_id = ?", (activity_id,))
+    cursor.execute("DELETE FROM route_start_index WHERE id = ?", (activity_id,))
+    cursor.execute("DELETE FROM route_bbox_index WHERE id = ?", (activity_id,))
+    cursor.execute("DELETE FROM activities WHERE id = ?", (activity_id,))
+
+    for segment_id in segment_ids:
+        rebuild_segment(cursor, segment_id)
+    if load_date:
+        cursor.execute("DELETE FROM training_load WHERE date >= ?", (load_date,))
+
+    for path in (os.path.join(DETAILED_DIR, f"detailed_{activity_id}.json"),
+                 os.path.join(STREAMS_DIR, f"streams_{activity_id}.json")):
+        if os.path.exists(path):
+            os.remove(path)
+    edit_raw_activities(activity_id)
+    return load_date
+
+
+def update_activity(cursor, activity_id, updates):
+    """Apply title / type changes; {column: value} of what was changed."""
+    changes = {UPDATE_COLUMNS[k]: v for k, v in updates.items() if k in UPDATE_COLUMNS}
+    if changes:
+        cursor.execute(f"""
+            UPDATE activities SET {", ".join(f"{c} = ?" for c in changes)} WHERE id = ?
+        """, list(changes.values()) + [activity_id])
+
+        # Keep the raw files in step so a re-insert from either doesn't undo the change
+        path = os.path.join(DETAILED_DIR, f"detailed_{activity_id}.json")
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                detailed = json.load(f)
+            set_update_keys(detailed, updates)
+            with open(path, "w") as f:
+                json.dump(detailed, f, indent=2)
+        edit_raw_activities(activity_id, updates)
+    return changes
+
+
+# ------------------------------
+# Receiver
+# ------------------------------
+
+class Webhook:
+    def __init__(self, db_path, access_token=None, verify_token=VERIFY_TOKEN):
+        self.db_path = db_path
+        self.access_token = access_token
+        self.verify_token = verify_token
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+        if access_token:
+            self.thread = threading.Thread(target=self._work, daemon=True)
+            self.thread.start()
+
+    def validate(self, params):
+        """The hub.challenge to echo back, or None if the request isn't ours."""
+        if params.get("hub.mode") == "subscribe" and params.get("hub.verify_token") == self.verify_token:
+            return params.get("hub.challenge")
+        return None
+
+    def receive(self, event):
+        """Log and apply one event; raises ValueError if it isn't a webhook event."""
+        try:
+            object_type = event["object_type"]
+            aspect_type = event["aspect_type"]
+            object_id = int(event["object_id"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Not a webhook event")
+        updates = event.get("updates") or {}
+
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                INSERT INTO webhook_events (received, object_type, aspect_type, object_id, owner_id, event_time, updates)
+                VALUES (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'), ?, ?, ?, ?, ?, ?)
+            """, (object_type, aspect_type, object_id, event.get("owner_id"), event.get("event_time"),
+                  json.dumps(updates)))
+
+            kind, data, load_date = aspect_type, {}, None
+            if object_type == "activity" and aspect_type == "create":
+                cursor.execute("""
+                    INSERT OR IGNORE INTO fetch_queue (activity_id, queued)
+                    VALUES (?, strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+                """, (object_id,))
+                kind = "queued"
+            elif object_type == "activity" and aspect_type == "update":
+                data = update_activity(cursor, object_id, updates)
+                kind = "updated"
+            elif object_type == "activity" and aspect_type == "delete":
+                load_date = delete_activity(cursor, object_id)
+                kind = "deleted"
+            elif object_type == "athlete" and str(updates.get("authorized")).lower() == "false":
+                kind = "deauthorized"
+
+            # Extend the series again from the last day kept before the deleted activity
+            if load_date:
+                update_daily_load(self.conn)
+
+            bump_data_version(cursor)
+            self.conn.commit()
+
+            # The version moved, so keep the analytics snapshot current
+            if kind in ("updated", "deleted"):
+                write_snapshot(self.db_path)
+
+        emit_event(kind, "webhook", object_id if object_type == "activity" else None, db_path=self.db_path, **data)
+        self.wake.set()
+
+    # ------------------------------
+    # Fetch worker
+    # ------------------------------
+
+    def _next_queued(self):
+        with self.lock:
+            row = self.conn.execute("""
+                SELECT activity_id FROM fetch_queue
+                WHERE attempts < ?
+                ORDER BY queued
+                LIMIT 1
+            """, (MAX_ATTEMPTS,)).fetchone()
+        return row[0] if row else None
+
+    def _still_queued(self, activity_id):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM fetch_queue WHERE activity_id = ?",
+                                     (activity_id,)).fetchone() is not None
+
+    def fetch(self, activity_id):
+        """Download and insert one activity; None on success, else the error."""
+        detailed = get_detailed_activity(self.access_token, activity_id)
+        if detailed is None:
+            return "detailed activity not available"
+        if detailed.get("message") == RATE_LIMITED:
+            return RATE_LIMITED
+
+        streams = None
+        sport_type = detailed.get("sport_type")
+        if not FILTER_SPORT or sport_type is None or sport_type.lower() == FILTER_SPORT.lower():
+            streams = get_streams(self.access_token, activity_id)
+            if isinstance(streams, dict) and streams.get("message") == RATE_LIMITED:
+                return RATE_LIMITED
+
+        # Deleted while it was being downloaded
+        if not self._still_queued(activity_id):
+            return None
+
+        detailed_path = os.path.join(DETAILED_DIR, f"detailed_{activity_id}.json")
+        os.makedirs(DETAILED_DIR, exist_ok=True)
+        with open(detailed_path, "w") as f:
+            json.dump(detailed, f, indent=2)
+        subprocess.run([sys.executable, "database/insert_activities.py", detailed_path],
+                       check=True, capture_output=True)
+
+        if streams:
+            os.makedirs(STREAMS_DIR, exist_ok=True)
+            with open(os.path.join(STREAMS_DIR, f"streams_{activity_id}.json"), "w") as f:
+                json.dump(streams, f, indent=2)
+            subprocess.run([sys.executable, "database/insert_streams.py", "--activity", str(activity_id)],
+                           check=True, capture_output=True)
+        return None
+
+    def _work(self):
+        while not self.stopped.is_set():
+            activity_id = self._next_queued()
+            if activity_id is None:
+                self.wake.wait(POLL_SECONDS)
+                self.wake.clear()
+                continue
+
+            try:
+                error = self.fetch(activity_id)
+            except (OSError, ValueError, subprocess.CalledProcessError) as e:
+                error = str(e)
+
+            if error == RATE_LIMITED:
+                emit_event("throttled", "webhook", activity_id, db_path=self.db_path, sleep_seconds=RATE_LIMIT_SLEEP)
+                self.stopped.wait(RATE_LIMIT_SLEEP)
+                continue
+
+            with self.lock:
+                if error:
+                    self.conn.execute("""
+                        UPDATE fetch_queue SET attempts = attempts + 1, last_error = ? WHERE activity_id = ?
+                    """, (error, activity_id))
+                else:
+                    self.conn.execute("DELETE FROM fetch_queue WHERE activity_id = ?", (activity_id,))
+                self.conn.commit()
+            emit_event("failed" if error else "inserted", "webhook", activity_id, db_path=self.db_path,
+                       **({"error": error} if error else {}))
+            if error:
+                self.stopped.wait(RETRY_SECONDS)
+
+    def close(self):
+        self.stopped.set()
+        self.wake.set()
+        if self.thread:
+            self.thread.join()
+        self.conn.close()
+
+
+# ------------------------------
+# Offline testing
+# ------------------------------
+
+def load_recorded(path):
+    """Events from a JSON list or a file with one JSON event per line."""
+    with open(path, "r") as f:
+        text = f.read().strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def replay(path, url=DEFAULT_URL):
+    """POST recorded events to a running server, in order."""
+    events = load_recorded(path)
+    for event in events:
+        request = urllib.request.Request(url, data=json.dumps(event).encode(), method="POST",
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request) as response:
+            print(f"{event.get('aspect_type')} {event.get('object_type')} {event.get('object_id')}: {response.status}")
+    print(f"Replayed {len(events)} events to {url}")
+
+
+def record(path, db_path="strava.db"):
+    """Write every logged event to a file that --replay accepts."""
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("""
+        SELECT object_type, aspect_type, object_id, owner_id, event_time, updates
+        FROM webhook_events ORDER BY id
+    """).fetchall()
+    conn.close()
+
+    with open(path, "w") as f:
+        for object_type, aspect_type, object_id, owner_id, event_time, updates in rows:
+            f.write(json.dumps({
+                "object_type": object_type, "aspect_type": aspect_type, "object_id": object_id,
+                "owner_id": owner_id, "event_time": event_time, "updates": json.loads(updates or "{}")
+            }) + "\n")
+    print(f"Wrote {len(rows)} events to {path}")
+
+
+if __name__ == "__main__":
+    url = sys.argv[sys.argv.index("--url") + 1] if "--url" in sys.argv else DEFAULT_URL
+    if "--replay" in sys.argv:
+        replay(sys.argv[sys.argv.index("--replay") + 1], url)
+    elif "--record" in sys.argv:
+        record(sys.argv[sys.argv.index("--record") + 1])
+    else:
+        print("Usage: python -m backend.webhook --replay FILE [--url URL] | --record FILE")
@@ -1,5 +1,24 @@
 import sqlite3
 
+# Adds columns introduced after a table was first created
+# (CREATE TABLE IF NOT EXISTS leaves existing tables untouched)
+def add_missing_columns(cursor, table, columns):
+    cursor.execute(f"PRAGMA table_info({table})")
+    existing = {row[1] for row in cursor.fetchall()}
+
+    for name, col_type in columns:
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {col_type}")
+
+# Marks the data as changed for readers that cache results (backend response
+# cache). Call from any script that writes activities / streams / derived
+# data, before its commit.
+def bump_data_version(cursor):
+    cursor.execute("""
+        INSERT INTO data_version (id, version, updated) VALUES (1, 1, datetime('now'))
+        ON CONFLICT(id) DO UPDATE SET version = version + 1, updated = excluded.updated
+    """)
+
 # This function creates the SQLite database and required tables
 def init_db():
     # Connect to SQLite (creates file if it doesn't exist)
@@ -17,12 +36,23 @@ def init_db():
             total_elevation_gain REAL,
             sport_type TEXT,
             start_date TEXT,
+            start_date_local TEXT,
             average_speed REAL,
             max_speed REAL,
             average_heartrate REAL,
-            max_heartrate REAL
+            max_heartrate REAL,
+            workout_type INTEGER
         );
     """)
+    add_missing_columns(cursor, "activities", [("workout_type", "INTEGER"), ("start_date_local", "TEXT")])
+
+    # Newest-first activity pages (backend keyset pagination on start_date, id)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_activities_start ON activities(start_date, id);
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_activities_sport_start ON activities(sport_type, start_date, id);
+    """)
 
     # Table for split data (mile splits, etc.)
     cursor.execute("""
@@ -33,9 +63,14 @@ def init_db():
             distance REAL,
             moving_time INTEGER,
             pace REAL,
+            split_length REAL,
             FOREIGN KEY(activity_id) REFERENCES activities(id)
         );
     """)
+    add_missing_columns(cursor, "splits", [("split_length", "REAL")])
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_splits_activity ON splits(activity_id, split_length);
+    """)
 
     # Table for per-second stream data
     cursor.execute("""
@@ -49,9 +84,12 @@ def init_db():
             lat REAL,
             lng REAL,
             elevation REAL,
+            grade REAL,
+            distance REAL,
             FOREIGN KEY(activity_id) REFERENCES activities(id)
         );
     """)
+    add_missing_columns(cursor, "streams", [("grade", "REAL"), ("distance", "REAL")])
 
     # Table for computed metrics later
     cursor.execute("""
@@ -62,9 +100,376 @@ def init_db():
             efficiency REAL,
             variability REAL,
             fatigue_score REAL,
+            gap_speed REAL,
+            avg_power REAL,
+            normalized_power REAL,
+            derived_version TEXT,       -- streams derived_streams was built from
+            FOREIGN KEY(activity_id) REFERENCES activities(id)
+        );
+    """)
+    add_missing_columns(cursor, "metrics", [
+        ("gap_speed", "REAL"),
+        ("avg_power", "REAL"),
+        ("normalized_power", "REAL"),
+        ("derived_version", "TEXT")
+    ])
+
+    # Stream lookups are always by activity
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_streams_activity ON streams(activity_id);
+    """)
+
+    # Per-second derived streams (grade-adjusted speed, running power)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS derived_streams (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            activity_id INTEGER,
+            time INTEGER,
+            gap_speed REAL,
+            power REAL,
+            FOREIGN KEY(activity_id) REFERENCES activities(id)
+        );
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_derived_streams_activity ON derived_streams(activity_id);
+    """)
+
+    # Per-activity stream quality from the cleaning stage
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stream_quality (
+            activity_id INTEGER PRIMARY KEY,
+            samples INTEGER,
+            gps_flagged INTEGER,
+            hr_flagged INTEGER,
+            cadence_flagged INTEGER,
+            gaps_filled INTEGER,
+            quality REAL,
+            stream_version TEXT,        -- streams it cleaned (processing.streams.stream_versions)
+            FOREIGN KEY(activity_id) REFERENCES activities(id)
+        );
+    """)
+    add_missing_columns(cursor, "stream_quality", [("stream_version", "TEXT")])
+
+    # Detected work reps (one row per rep) and a per-activity summary
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS intervals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            activity_id INTEGER,
+            rep_index INTEGER,
+            start_time INTEGER,
+            duration REAL,
+            distance REAL,
+            pace REAL,
+            recovery_duration REAL,
+            FOREIGN KEY(activity_id) REFERENCES activities(id)
+        );
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_intervals_activity ON intervals(activity_id);
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS interval_summary (
+            activity_id INTEGER PRIMARY KEY,
+            rep_count INTEGER,
+            avg_rep_distance REAL,
+            avg_rep_duration REAL,
+            avg_rep_pace REAL,
+            avg_recovery_pace REAL,
+            stream_version TEXT,        -- streams the intervals were detected from
+            FOREIGN KEY(activity_id) REFERENCES activities(id)
+        );
+    """)
+    add_missing_columns(cursor, "interval_summary", [("stream_version", "TEXT")])
+
+    # Per-activity training impulse (TRIMP)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS activity_load (
+            activity_id INTEGER PRIMARY KEY,
+            date TEXT,
+            trimp_banister REAL,
+            trimp_edwards REAL,
+            source TEXT,
+            hr_settings TEXT,           -- HR max / rest it was computed with
+            stream_version TEXT,        -- streams it was computed from (NULL without streams)
+            FOREIGN KEY(activity_id) REFERENCES activities(id)
+        );
+    """)
+    add_missing_columns(cursor, "activity_load", [("hr_settings", "TEXT"), ("stream_version", "TEXT")])
+
+    # Daily fitness (CTL) / fatigue (ATL) / form (TSB) series
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS training_load (
+            date TEXT PRIMARY KEY,
+            trimp REAL,
+            ctl REAL,
+            atl REAL,
+            tsb REAL
+        );
+    """)
+
+    # Fine-grained seconds-in-bin histograms (packed float32), used to
+    # rebuild zone totals without re-reading streams
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS zone_histograms (
+            activity_id INTEGER PRIMARY KEY,
+            hr_seconds BLOB,
+            pace_seconds BLOB,
+            stream_version TEXT,        -- streams (and pause gap) the histograms were built from
+            FOREIGN KEY(activity_id) REFERENCES activities(id)
+        );
+    """)
+    add_missing_columns(cursor, "zone_histograms", [("stream_version", "TEXT")])
+
+    # Seconds in each HR / pace zone per activity
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS activity_zones (
+            activity_id INTEGER PRIMARY KEY,
+            boundaries TEXT,
+            hr_z1 REAL, hr_z2 REAL, hr_z3 REAL, hr_z4 REAL, hr_z5 REAL,
+            pace_z1 REAL, pace_z2 REAL, pace_z3 REAL, pace_z4 REAL, pace_z5 REAL,
+            FOREIGN KEY(activity_id) REFERENCES activities(id)
+        );
+    """)
+
+    # Per-run classifier features and the label assigned from them
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS run_features (
+            activity_id INTEGER PRIMARY KEY,
+            date TEXT,
+            distance REAL,
+            pace REAL,
+            relative_pace REAL,
+            relative_distance REAL,
+            pace_cv REAL,
+            hr_easy_fraction REAL,
+            hr_hard_fraction REAL,
+            rep_count INTEGER,
+            workout_type INTEGER,
+            label TEXT,
+            source_version TEXT,        -- splits / zones / intervals it was computed from
+            FOREIGN KEY(activity_id) REFERENCES activities(id)
+        );
+    """)
+    add_missing_columns(cursor, "run_features", [("source_version", "TEXT")])
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_run_features_label ON run_features(label);
+    """)
+
+    # One row of model features per activity, with lineage
+    # (see processing/feature_store.py for where each column comes from)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS feature_store (
+            activity_id INTEGER PRIMARY KEY,
+            source_version TEXT,
+            code_version TEXT,
+            date TEXT,
+            sport_type TEXT,
+            distance REAL,
+            moving_time REAL,
+            elapsed_time REAL,
+            elevation_gain REAL,
+            average_speed REAL,
+            max_speed REAL,
+            average_heartrate REAL,
+            max_heartrate REAL,
+            workout_type INTEGER,
+            gap_speed REAL,
+            avg_power REAL,
+            normalized_power REAL,
+            trimp_banister REAL,
+            trimp_edwards REAL,
+            hr_z1 REAL, hr_z2 REAL, hr_z3 REAL, hr_z4 REAL, hr_z5 REAL,
+            pace_z1 REAL, pace_z2 REAL, pace_z3 REAL, pace_z4 REAL, pace_z5 REAL,
+            rep_count INTEGER,
+            avg_rep_pace REAL,
+            avg_recovery_pace REAL,
+            run_type TEXT,
+            relative_pace REAL,
+            pace_cv REAL,
+            stream_quality REAL,
+            ctl REAL,
+            atl REAL,
+            tsb REAL,
+            pace REAL,
+            gap_pace REAL,
+            elevation_per_km REAL,
+            meters_per_beat REAL,
+            pause_fraction REAL,
+            FOREIGN KEY(activity_id) REFERENCES activities(id)
+        );
+    """)
+
+    # Decoded GPS track per activity: packed float32 (lat, lng) pairs
+    # plus bounding box, start / end point and length in meters
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS routes (
+            activity_id INTEGER PRIMARY KEY,
+            source TEXT,
+            points INTEGER,
+            coords BLOB,
+            summary_coords BLOB,
+            min_lat REAL,
+            min_lng REAL,
+            max_lat REAL,
+            max_lng REAL,
+            start_lat REAL,
+            start_lng REAL,
+            end_lat REAL,
+            end_lng REAL,
+            length REAL,
+            FOREIGN KEY(activity_id) REFERENCES activities(id)
+        );
+    """)
+
+    # R*Tree spatial indexes over routes (id = activity id):
+    # start points as zero-size boxes, and whole-route bounding boxes
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS route_start_index USING rtree(
+            id, min_lat, max_lat, min_lng, max_lng
+        );
+    """)
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS route_bbox_index USING rtree(
+            id, min_lat, max_lat, min_lng, max_lng
+        );
+    """)
+
+    # Repeated-route clusters (see processing/route_matching.py):
+    # cluster per run, and the MinHash LSH band buckets used to find matches
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS route_clusters (
+            activity_id INTEGER PRIMARY KEY,
+            cluster_id INTEGER,
+            matched_activity_id INTEGER,
+            frechet_distance REAL,
+            FOREIGN KEY(activity_id) REFERENCES activities(id)
+        );
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_route_clusters_cluster ON route_clusters(cluster_id);
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS route_lsh (
+            band INTEGER,
+            bucket INTEGER,
+            activity_id INTEGER,
+            FOREIGN KEY(activity_id) REFERENCES activities(id)
+        );
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_route_lsh_activity ON route_lsh(activity_id);
+    """)
+
+    # Strava segments and our efforts on them (see database/insert_segments.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS segments (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            activity_type TEXT,
+            distance REAL,
+            average_grade REAL,
+            maximum_grade REAL,
+            elevation_high REAL,
+            elevation_low REAL,
+            start_lat REAL,
+            start_lng REAL,
+            end_lat REAL,
+            end_lng REAL,
+            climb_category INTEGER,
+            city TEXT,
+            state TEXT,
+            country TEXT
+        );
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS segment_efforts (
+            id INTEGER PRIMARY KEY,
+            segment_id INTEGER,
+            activity_id INTEGER,
+            elapsed_time INTEGER,
+            moving_time INTEGER,
+            start_date TEXT,
+            start_date_local TEXT,
+            distance REAL,
+            start_index INTEGER,
+            end_index INTEGER,
+            pr_rank INTEGER,
+            is_pr INTEGER,
+            FOREIGN KEY(segment_id) REFERENCES segments(id),
             FOREIGN KEY(activity_id) REFERENCES activities(id)
         );
     """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_segment_efforts_segment ON segment_efforts(segment_id, start_date);
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_segment_efforts_activity ON segment_efforts(activity_id);
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_segment_efforts_pr ON segment_efforts(is_pr, start_date_local);
+    """)
+
+    # Fastest efforts per segment, kept up to date as efforts are inserted
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS segment_leaderboard (
+            segment_id INTEGER,
+            rank INTEGER,
+            effort_id INTEGER,
+            activity_id INTEGER,
+            elapsed_time INTEGER,
+            start_date TEXT,
+            PRIMARY KEY (segment_id, rank),
+            FOREIGN KEY(segment_id) REFERENCES segments(id)
+        );
+    """)
+
+    # Single-row counter bumped by bump_data_version() whenever ingestion
+    # or processing changes the data
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER,
+            updated TEXT
+        );
+    """)
+
+    # Ingestion progress events, streamed to the frontend by the backend
+    # (see database/events.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ingestion_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created TEXT,
+            source TEXT,
+            kind TEXT,
+            activity_id INTEGER,
+            data TEXT
+        );
+    """)
+
+    # Every Strava webhook event received (see backend/webhook.py), so a
+    # session can be replayed offline
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS webhook_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            received TEXT,
+            object_type TEXT,
+            aspect_type TEXT,
+            object_id INTEGER,
+            owner_id INTEGER,
+            event_time INTEGER,
+            updates TEXT
+        );
+    """)
+
+    # Activities waiting for their detailed JSON + streams to be fetched
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS fetch_queue (
+            activity_id INTEGER PRIMARY KEY,
+            queued TEXT,
+            attempts INTEGER DEFAULT 0,
+            last_error TEXT
+        );
+    """)
 
     # Save changes and close connection
     conn.commit()
@@ -0,0 +1,73 @@
+import sqlite3
+import json
+import time
+
+# ---------------------------------------------------------
+# Structured ingestion progress events.
+#
+# Ingestion and insert scripts append events to the
+# "ingestion_events" table instead of only printing, and the
+# backend streams new rows to browsers over Server-Sent Events
+# (backend/events.py):
+#
+#   queued     - a batch of work was found   {total}
+#   fetched    - one item downloaded          {done, total, per_minute, eta_seconds}
+#   failed     - one item could not be fetched (same fields)
+#   inserted   - rows written to strava.db    {done, total, per_minute, eta_seconds, ...}
+#   throttled  - rate limited, sleeping       {sleep_seconds}
+#   done       - the batch finished           {done, total, seconds}
+#
+# Each event is committed on its own so a reader sees it at
+# once. Only the newest KEEP_EVENTS rows are kept.
+# ---------------------------------------------------------
+
+
+KEEP_EVENTS = 10000
+
+
+def emit_event(kind, source, activity_id=None, db_path="strava.db", **data):
+    """Append one event (data must be JSON-serializable)."""
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("""
+        INSERT INTO ingestion_events (created, source, kind, activity_id, data)
+        VALUES (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'), ?, ?, ?, ?)
+    """, (source, kind, activity_id, json.dumps(data)))
+    conn.execute("DELETE FROM ingestion_events WHERE id <= (SELECT MAX(id) FROM ingestion_events) - ?",
+                 (KEEP_EVENTS,))
+    conn.commit()
+    conn.close()
+
+
+class Progress:
+    """
+    Progress of one batch (e.g. all pending stream downloads):
+    counts items and attaches done / total / throughput / ETA to
+    every event it emits.
+    """
+
+    def __init__(self, source, total, db_path="strava.db"):
+        self.source = source
+        self.total = total
+        self.db_path = db_path
+        self.done = 0
+        self.started = time.monotonic()
+        self.emit("queued", total=total)
+
+    def emit(self, kind, activity_id=None, **data):
+        emit_event(kind, self.source, activity_id, db_path=self.db_path, **data)
+
+    def advance(self, kind, activity_id=None, count=1, **data):
+        """Count `count` more items done and emit a progress event."""
+        self.done += count
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        per_minute = self.done / elapsed * 60
+        remaining = max(self.total - self.done, 0)
+        self.emit(kind, activity_id, done=self.done, total=self.total, per_minute=round(per_minute, 1),
+                  eta_seconds=round(remaining / per_minute * 60) if per_minute else None, **data)
+
+    def throttled(self, sleep_seconds):
+        self.emit("throttled", sleep_seconds=sleep_seconds)
+
+    def finish(self):
+        self.emit("done", done=self.done, total=self.total,
+                  seconds=round(time.monotonic() - self.started, 1))
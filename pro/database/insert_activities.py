@@ -1,8 +1,16 @@
 import sqlite3
 import json
 import os
+import sys
 
-# Inserts all activities from the raw JSON file into the SQLite database
+from database import bump_data_version
+from events import emit_event
+from snapshot import write_snapshot
+
+# Inserts all activities from the raw JSON file into the SQLite database.
+# The file may also hold a single activity, e.g. one detailed activity
+# fetched by the webhook (backend/webhook.py):
+#   python database/insert_activities.py data_raw/detailed_activities/detailed_{id}.json
 def insert_activities(json_path="data_raw/activities_raw.json"):
     # Connect to SQLite database
     conn = sqlite3.connect("strava.db")
@@ -16,17 +24,22 @@ def insert_activities(json_path="data_raw/activities_raw.json"):
     # Load activities from file
     with open(json_path, "r") as f:
         activities = json.load(f)
+    if isinstance(activities, dict):
+        activities = [activities]
 
     print(f"Inserting {len(activities)} activities...")
 
+    existing = {row[0] for row in cursor.execute("SELECT id FROM activities")}
+
     for a in activities:
         cursor.execute("""
             INSERT OR REPLACE INTO activities (
                 id, name, distance, moving_time, elapsed_time, 
                 total_elevation_gain, sport_type, start_date,
-                average_speed, max_speed, average_heartrate, max_heartrate
+                average_speed, max_speed, average_heartrate, max_heartrate,
+                workout_type, start_date_local
             )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, (
             a.get("id"),
             a.get("name"),
@@ -39,14 +52,26 @@ def insert_activities(json_path="data_raw/activities_raw.json"):
             a.get("average_speed"),
             a.get("max_speed"),
             a.get("average_heartrate"),
-            a.get("max_heartrate")
+            a.get("max_heartrate"),
+            a.get("workout_type"),
+            a.get("start_date_local")
         ))
 
+    bump_data_version(cursor)
     conn.commit()
     conn.close()
 
     print("Activities inserted successfully!")
 
+    # New ids let the frontend add just those rows
+    new_ids = [a.get("id") for a in activities if a.get("id") not in existing]
+    emit_event("inserted", "activities", done=len(activities), total=len(activities), new_ids=new_ids)
+
+    write_snapshot()
+
 
 if __name__ == "__main__":
-    insert_activities()
+    if len(sys.argv) > 1:
+        insert_activities(sys.argv[1])
+    else:
+        insert_activities()
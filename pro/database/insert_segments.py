@@ -0,0 +1,247 @@
+import sqlite3
+import json
+import os
+import sys
+
+from database import bump_data_version
+
+# ---------------------------------------------------------
+# Inserts segments and segment efforts from the detailed
+# activity JSON files into SQLite
+#
+# Each detailed activity has a "segment_efforts" list:
+# [
+#   {"id": ..., "elapsed_time": ..., "moving_time": ...,
+#    "start_date": ..., "start_date_local": ..., "distance": ...,
+#    "start_index": ..., "end_index": ..., "pr_rank": ...,
+#    "activity": {"id": ...},
+#    "segment": {"id": ..., "name": ..., "distance": ...,
+#                "average_grade": ..., "start_latlng": [...], ...}},
+#   ...
+# ]
+#
+# The script:
+# - Upserts every segment into "segments"
+# - Inserts efforts not seen before into "segment_efforts",
+#   oldest first, all in one transaction
+# - Flags each effort that was the fastest on its segment at
+#   the time (is_pr), and keeps the top LEADERBOARD_SIZE
+#   efforts per segment in "segment_leaderboard"
+#
+# The leaderboard is updated per inserted effort (no GROUP BY
+# over all efforts), so "did I PR anything today" and a
+# segment's best times are indexed lookups.
+#
+# Run from the pro/ folder:
+#   python database/insert_segments.py
+#   python database/insert_segments.py --prs YYYY-MM-DD
+# ---------------------------------------------------------
+
+
+LEADERBOARD_SIZE = 10
+
+
+def load_efforts(detailed_dir):
+    """(segments by id, efforts oldest first) from every detailed activity file."""
+    segments, efforts = {}, []
+
+    for filename in os.listdir(detailed_dir):
+        if not filename.startswith("detailed_"):
+            continue
+        with open(os.path.join(detailed_dir, filename), "r") as f:
+            try:
+                activity = json.load(f)
+            except json.JSONDecodeError:
+                print(f"Skipping {filename} (JSON decode error)")
+                continue
+
+        for effort in activity.get("segment_efforts") or []:
+            segment = effort.get("segment") or {}
+            if segment.get("id") is None:
+                continue
+            segments[segment["id"]] = segment
+            efforts.append(effort)
+
+    efforts.sort(key=lambda e: (e.get("start_date") or "", e["id"]))
+    return segments, efforts
+
+
+def segment_row(segment):
+    start = segment.get("start_latlng") or [None, None]
+    end = segment.get("end_latlng") or [None, None]
+    return (
+        segment["id"],
+        segment.get("name"),
+        segment.get("activity_type"),
+        segment.get("distance"),
+        segment.get("average_grade"),
+        segment.get("maximum_grade"),
+        segment.get("elevation_high"),
+        segment.get("elevation_low"),
+        start[0], start[1], end[0], end[1],
+        segment.get("climb_category"),
+        segment.get("city"),
+        segment.get("state"),
+        segment.get("country")
+    )
+
+
+def get_leaderboard(cursor, segment_id):
+    """[(elapsed_time, start_date, effort_id, activity_id)] fastest first."""
+    cursor.execute("""
+        SELECT elapsed_time, start_date, effort_id, activity_id
+        FROM segment_leaderboard
+        WHERE segment_id = ?
+        ORDER BY rank
+    """, (segment_id,))
+    return cursor.fetchall()
+
+
+def was_pr(cursor, leaderboard, segment_id, elapsed_time, start_date):
+    """
+    Whether an effort beat every earlier effort on its segment.
+    Efforts normally arrive in date order, so the leaderboard answers
+    it; an effort older than the whole leaderboard falls back to an
+    indexed lookup of the best earlier time.
+    """
+    earlier = [entry[0] for entry in leaderboard if entry[1] < start_date]
+    if earlier or len(leaderboard) < LEADERBOARD_SIZE:
+        return not earlier or elapsed_time < min(earlier)
+
+    cursor.execute("""
+        SELECT MIN(elapsed_time) FROM segment_efforts
+        WHERE segment_id = ? AND start_date < ?
+    """, (segment_id, start_date))
+    best = cursor.fetchone()[0]
+    return best is None or elapsed_time < best
+
+
+def insert_segments(detailed_dir="data_raw/detailed_activities"):
+    conn = sqlite3.connect("strava.db")
+    cursor = conn.cursor()
+
+    if not os.path.isdir(detailed_dir):
+        print(f"Error: directory {detailed_dir} not found.")
+        return
+
+    segments, efforts = load_efforts(detailed_dir)
+
+    cursor.executemany(f"""
+        INSERT OR REPLACE INTO segments (
+            id, name, activity_type, distance, average_grade, maximum_grade,
+            elevation_high, elevation_low, start_lat, start_lng, end_lat, end_lng,
+            climb_category, city, state, country
+        ) VALUES ({", ".join("?" * 16)})
+    """, [segment_row(s) for s in segments.values()])
+
+    existing = {row[0] for row in cursor.execute("SELECT id FROM segment_efforts")}
+    new_efforts = [e for e in efforts if e["id"] not in existing]
+    print(f"Inserting {len(new_efforts)} new efforts on {len(segments)} segments...")
+
+    leaderboards = {}
+    prs = 0
+    for effort in new_efforts:
+        segment_id = effort["segment"]["id"]
+        activity_id = (effort.get("activity") or {}).get("id")
+        elapsed_time = effort.get("elapsed_time")
+        start_date = effort.get("start_date") or ""
+        if elapsed_time is None:
+            continue
+
+        if segment_id not in leaderboards:
+            leaderboards[segment_id] = get_leaderboard(cursor, segment_id)
+        leaderboard = leaderboards[segment_id]
+
+        is_pr = was_pr(cursor, leaderboard, segment_id, elapsed_time, start_date)
+        if is_pr:
+            prs += 1
+            # An effort that arrives late can take the PR from later, slower ones
+            cursor.execute("""
+                UPDATE segment_efforts SET is_pr = 0
+                WHERE segment_id = ? AND start_date > ? AND elapsed_time >= ? AND is_pr = 1
+            """, (segment_id, start_date, elapsed_time))
+
+        cursor.execute("""
+            INSERT INTO segment_efforts (
+                id, segment_id, activity_id, elapsed_time, moving_time,
+                start_date, start_date_local, distance, start_index, end_index,
+                pr_rank, is_pr
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            effort["id"],
+            segment_id,
+            activity_id,
+            elapsed_time,
+            effort.get("moving_time"),
+            start_date,
+            effort.get("start_date_local"),
+            effort.get("distance"),
+            effort.get("start_index"),
+            effort.get("end_index"),
+            effort.get("pr_rank"),
+            int(is_pr)
+        ))
+
+        # Insert into the top N (ties keep the earlier effort ahead)
+        entry = (elapsed_time, start_date, effort["id"], activity_id)
+        if len(leaderboard) < LEADERBOARD_SIZE or entry < leaderboard[-1]:
+            leaderboard.append(entry)
+            leaderboard.sort()
+            del leaderboard[LEADERBOARD_SIZE:]
+
+    # Rewrite only the leaderboards that were touched
+    for segment_id, leaderboard in leaderboards.items():
+        cursor.execute("DELETE FROM segment_leaderboard WHERE segment_id = ?", (segment_id,))
+        cursor.executemany("""
+            INSERT INTO segment_leaderboard (segment_id, rank, effort_id, activity_id, elapsed_time, start_date)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [
+            (segment_id, rank, effort_id, activity_id, elapsed_time, start_date)
+            for rank, (elapsed_time, start_date, effort_id, activity_id) in enumerate(leaderboard, 1)
+        ])
+
+    bump_data_version(cursor)
+    conn.commit()
+    conn.close()
+
+    print(f"Segment efforts inserted successfully! ({prs} PRs)")
+
+
+def prs_on(cursor, date):
+    """[(segment name, elapsed_time, activity_id)] for PRs set on a local date (YYYY-MM-DD)."""
+    cursor.execute("""
+        SELECT s.name, e.elapsed_time, e.activity_id
+        FROM segment_efforts e
+        JOIN segments s ON s.id = e.segment_id
+        WHERE e.is_pr = 1 AND e.start_date_local >= ? AND e.start_date_local < ?
+        ORDER BY e.start_date_local
+    """, (date, date + "~"))
+    return cursor.fetchall()
+
+
+def segment_history(cursor, segment_id):
+    """[(start_date, elapsed_time, is_pr, activity_id)] of every effort on a segment, oldest first."""
+    cursor.execute("""
+        SELECT start_date, elapsed_time, is_pr, activity_id
+        FROM segment_efforts
+        WHERE segment_id = ?
+        ORDER BY start_date
+    """, (segment_id,))
+    return cursor.fetchall()
+
+
+def print_prs(date):
+    conn = sqlite3.connect("strava.db")
+    prs = prs_on(conn.cursor(), date)
+    conn.close()
+
+    print(f"{len(prs)} segment PRs on {date}")
+    for name, elapsed_time, activity_id in prs:
+        print(f"  {elapsed_time // 60}:{elapsed_time % 60:02d}  {name}  (activity {activity_id})")
+
+
+if __name__ == "__main__":
+    if "--prs" in sys.argv:
+        print_prs(sys.argv[sys.argv.index("--prs") + 1])
+    else:
+        insert_segments()
@@ -1,6 +1,11 @@
 import sqlite3
 import json
 import os
+import sys
+
+from database import bump_data_version
+from events import Progress
+from snapshot import write_snapshot
 
 # ---------------------------------------------------------
 # Inserts per-second stream data from JSON files into SQLite
@@ -21,10 +26,15 @@ import os
 # - Loads each file
 # - Expands each stream into per-point rows
 # - Inserts into "streams" table
+# - With --activity ID (used by the webhook, backend/webhook.py)
+#   only that activity's file is loaded, replacing any rows
+#   it already has
+# - Commits per file and emits an "inserted" progress event
+#   (database/events.py) so the frontend can update as it goes
 # ---------------------------------------------------------
 
 
-def insert_streams():
+def insert_streams(activity_ids=None):
     conn = sqlite3.connect("strava.db")
     cursor = conn.cursor()
 
@@ -34,9 +44,14 @@ def insert_streams():
         print(f"Error: directory {streams_dir} not found.")
         return
 
-    files = [f for f in os.listdir(streams_dir) if f.startswith("streams_")]
+    if activity_ids is None:
+        files = [f for f in os.listdir(streams_dir) if f.startswith("streams_")]
+    else:
+        files = [f"streams_{i}.json" for i in activity_ids
+                 if os.path.exists(os.path.join(streams_dir, f"streams_{i}.json"))]
 
     print(f"Found {len(files)} stream files to process.\n")
+    progress = Progress("streams", len(files))
 
     for filename in files:
         # Extract activity ID from filename: streams_12345.json
@@ -77,6 +92,9 @@ def insert_streams():
 
         print(f"Inserting streams for activity {activity_id} ({n} points)...")
 
+        if activity_ids is not None:
+            cursor.execute("DELETE FROM streams WHERE activity_id = ?", (activity_id,))
+
         # Insert row-by-row
         for i in range(n):
             # Each stream may be missing some values
@@ -106,8 +124,9 @@ def insert_streams():
                     lat,
                     lng,
                     elevation,
-                    grade
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    grade,
+                    distance
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (
                 activity_id,
                 time_val,
@@ -117,14 +136,23 @@ def insert_streams():
                 lat_val,
                 lng_val,
                 alt_val,
-                grade_val
+                grade_val,
+                dist_val
             ))
 
+        bump_data_version(cursor)
         conn.commit()
+        progress.advance("inserted", int(activity_id), points=n)
 
     conn.close()
+    progress.finish()
     print("\nStream data inserted successfully!")
 
+    write_snapshot()
+
 
 if __name__ == "__main__":
-    insert_streams()
+    if "--activity" in sys.argv:
+        insert_streams([int(sys.argv[sys.argv.index("--activity") + 1])])
+    else:
+        insert_streams()
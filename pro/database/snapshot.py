@@ -0,0 +1,148 @@
+import sqlite3
+import json
+import os
+import time
+
+import numpy as np
+
+# ---------------------------------------------------------
+# Binary snapshot of the analytics working set.
+#
+# The activities table plus per-activity aggregates from the
+# feature store are written as NumPy arrays that analysis
+# scripts memory-map at startup instead of querying strava.db:
+#
+#   data_processed/snapshot/activities.npy  - structured array
+#   data_processed/snapshot/names.npy       - activity names
+#   data_processed/snapshot/header.json     - version, row count and
+#                                             the data_version it was
+#                                             built from
+#
+# Field names match old/activities.py, whose load_activities()
+# uses the snapshot while strava.db's data_version counter
+# (database.bump_data_version) still matches the header, and
+# falls back to the database otherwise. Writes that don't bump
+# the counter (progress events, the webhook log) leave the
+# snapshot current.
+#
+# Rewritten by the ingestion scripts and the feature store after
+# they change the DB, and by the webhook after an update / delete.
+# Run from the pro/ folder:  python database/snapshot.py
+# ---------------------------------------------------------
+
+
+SNAPSHOT_DIR = "data_processed/snapshot"
+SNAPSHOT_VERSION = 2
+
+SNAPSHOT_DTYPE = np.dtype([
+    # Activity fields (same layout as old/activities.py)
+    ("id", "i8"),
+    ("type", "U16"),
+    ("start", "i8"),
+    ("local_date", "i4"),
+    ("month", "i4"),
+    ("distance", "f8"),
+    ("moving_time", "f8"),
+    ("elapsed_time", "f8"),
+    ("elevation_gain", "f8"),
+    ("average_speed", "f8"),
+    ("max_speed", "f8"),
+    ("average_heartrate", "f8"),
+    ("max_heartrate", "f8"),
+    # Per-activity aggregates (NaN / "" until the processing stages have run)
+    ("run_type", "U8"),
+    ("trimp", "f8"),
+    ("gap_speed", "f8"),
+    ("normalized_power", "f8"),
+    ("rep_count", "f8"),
+    ("stream_quality", "f8"),
+    ("ctl", "f8"),
+    ("atl", "f8"),
+    ("tsb", "f8"),
+])
+
+AGGREGATE_COLUMNS = ("run_type", "trimp_banister", "gap_speed", "normalized_power",
+                     "rep_count", "stream_quality", "ctl", "atl", "tsb")
+
+
+def table_exists(cursor, name):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+    return cursor.fetchone() is not None
+
+
+def column_exists(cursor, table, column):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return column in {row[1] for row in cursor.fetchall()}
+
+
+def write_snapshot(db_path="strava.db", snapshot_dir=SNAPSHOT_DIR):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    # One read transaction, so the rows are exactly the data version recorded
+    cursor.execute("BEGIN")
+    if table_exists(cursor, "data_version"):
+        cursor.execute("SELECT version FROM data_version WHERE id = 1")
+        row = cursor.fetchone()
+        data_version = row[0] if row else 0
+    else:
+        data_version = 0
+
+    local_date = "COALESCE(a.start_date_local, a.start_date)" if column_exists(cursor, "activities", "start_date_local") \
+        else "a.start_date"
+    if table_exists(cursor, "feature_store"):
+        aggregates = ", ".join(f"f.{c}" for c in AGGREGATE_COLUMNS)
+        join = "LEFT JOIN feature_store f ON f.activity_id = a.id"
+    else:
+        aggregates = ", ".join("NULL" for _ in AGGREGATE_COLUMNS)
+        join = ""
+
+    cursor.execute(f"""
+        SELECT a.id, a.sport_type,
+               CAST(strftime('%s', a.start_date) AS INTEGER),
+               CAST(strftime('%Y%m%d', {local_date}) AS INTEGER),
+               a.distance, a.moving_time, a.elapsed_time, a.total_elevation_gain,
+               a.average_speed, a.max_speed, a.average_heartrate, a.max_heartrate,
+               {aggregates},
+               a.name
+        FROM activities a
+        {join}
+        ORDER BY a.start_date
+    """)
+    rows = cursor.fetchall()
+    conn.close()
+
+    data = np.zeros(len(rows), dtype=SNAPSHOT_DTYPE)
+    if rows:
+        columns = list(zip(*rows))
+        data["id"] = columns[0]
+        data["type"] = [t or "Unknown" for t in columns[1]]
+        data["start"] = columns[2]
+        data["local_date"] = columns[3]
+        data["month"] = data["local_date"] // 100
+        numeric = [f for f in SNAPSHOT_DTYPE.names[5:] if f != "run_type"]
+        for field, values in zip(numeric, columns[4:12] + columns[13:21]):
+            data[field] = np.array(values, dtype=float)  # NULL -> NaN
+        data["run_type"] = [t or "" for t in columns[12]]
+    names = np.array([row[-1] or "" for row in rows], dtype=str)
+
+    # Write to temporary files and rename, so a reader never maps a half-written snapshot
+    os.makedirs(snapshot_dir, exist_ok=True)
+    for filename, array in (("activities.npy", data), ("names.npy", names)):
+        path = os.path.join(snapshot_dir, filename)
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, array)
+        os.replace(path + ".tmp", path)
+
+    header = {"version": SNAPSHOT_VERSION, "rows": len(rows), "data_version": data_version,
+              "created": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    header_path = os.path.join(snapshot_dir, "header.json")
+    with open(header_path + ".tmp", "w") as f:
+        json.dump(header, f, indent=2)
+    os.replace(header_path + ".tmp", header_path)
+
+    print(f"Snapshot of {len(rows)} activities written to {snapshot_dir}/")
+
+
+if __name__ == "__main__":
+    write_snapshot()
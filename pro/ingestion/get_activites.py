@@ -2,6 +2,11 @@ import requests
 import json
 import os
 
+from database.events import emit_event
+
+# Run from the pro/ folder: python -m ingestion.get_activites
+# (page progress goes to the ingestion_events table for the backend's /events stream)
+
 # Pulls ALL Strava activities by looping through pages until no results come back
 def get_all_activities(access_token):
     url = "https://www.strava.com/api/v3/athlete/activities"
@@ -31,6 +36,7 @@ def get_all_activities(access_token):
 
         print(f"Fetched page {page} with {len(activities)} activities")
         all_activities.extend(activities)
+        emit_event("fetched", "activities", page=page, count=len(activities), done=len(all_activities))
 
         page += 1  # move to the next page
 
@@ -44,6 +50,7 @@ def get_all_activities(access_token):
         json.dump(all_activities, f, indent=2)
 
     print(f"Saved {len(all_activities)} total activities to {file_path}")
+    emit_event("done", "activities", done=len(all_activities), total=len(all_activities))
     return all_activities
 
 
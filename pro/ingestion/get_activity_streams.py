@@ -4,6 +4,8 @@ import sqlite3
 import os
 import time
 
+from database.events import Progress
+
 # ----------------------------
 # Fetch per-second Strava streams
 # ----------------------------
@@ -15,6 +17,11 @@ import time
 # - Honors rate-limit responses (429) by sleeping 15 minutes.
 # - Retries network/SSL errors with exponential backoff.
 # - Keeps code simple and well-commented.
+# - Writes progress (queued / fetched / throttled / done) to the
+#   ingestion_events table for the backend's /events stream.
+#
+# Run from the pro/ folder:
+#   python -m ingestion.get_activity_streams
 # ----------------------------
 
 
@@ -102,17 +109,22 @@ def pull_all_streams(access_token):
     rows = load_activity_ids_and_sports()
     print(f"Found {len(rows)} activities in the database.")
 
+    pending = []
     for activity_id, sport_type in rows:
         # If filtering by sport, skip non-matching activities
         if FILTER_SPORT and sport_type is not None and sport_type.lower() != FILTER_SPORT.lower():
             continue
 
-        file_path = os.path.join(output_dir, f"streams_{activity_id}.json")
-
         # Skip if already downloaded
-        if os.path.exists(file_path):
-            print(f"Skipping streams for {activity_id} (already downloaded)")
+        if os.path.exists(os.path.join(output_dir, f"streams_{activity_id}.json")):
             continue
+        pending.append((activity_id, sport_type))
+
+    print(f"{len(pending)} activities need streams.")
+    progress = Progress("activity_streams", len(pending))
+
+    for activity_id, sport_type in pending:
+        file_path = os.path.join(output_dir, f"streams_{activity_id}.json")
 
         print(f"Fetching streams for activity {activity_id} (sport: {sport_type}) ...")
 
@@ -121,21 +133,25 @@ def pull_all_streams(access_token):
         if data is None:
             # None indicates either streams not available, 404, or persistent error
             # we continue to next activity
+            progress.advance("failed", activity_id)
             continue
 
         # Handle rate limit
         if isinstance(data, dict) and data.get("message") == "Rate Limit Exceeded":
             print("\n🚫 Rate limit reached. Sleeping for 15 minutes...\n")
+            progress.throttled(15 * 60)
             time.sleep(15 * 60)
             continue  # resume with same—script will move to next id after wake
 
         # Save streams JSON
         with open(file_path, "w") as f:
             json.dump(data, f, indent=2)
+        progress.advance("fetched", activity_id)
 
         # Friendly delay so we don't hammer the API
         time.sleep(0.3)
 
+    progress.finish()
     print("\nFinished pulling streams for activities.")
 
 
@@ -4,10 +4,18 @@ import sqlite3
 import os
 import time
 
+from database.events import Progress
+
 # ---------------------------------------------------------
 # Pulls *detailed* Strava activity data for every activity
 # stored in the SQLite database. Each activity is saved as
 # a separate JSON file in data_raw/detailed_activities/.
+#
+# Progress (queued / fetched / throttled / done) is written to
+# the ingestion_events table for the backend's /events stream.
+#
+# Run from the pro/ folder:
+#   python -m ingestion.get_detailed_activity
 # ---------------------------------------------------------
 
 
@@ -51,13 +59,14 @@ def pull_all_detailed(access_token):
     activity_ids = load_activity_ids()
     print(f"Found {len(activity_ids)} activities in the database.\n")
 
-    for activity_id in activity_ids:
-        file_path = os.path.join(output_dir, f"detailed_{activity_id}.json")
+    # Skip activities whose detailed file already exists
+    pending = [i for i in activity_ids
+               if not os.path.exists(os.path.join(output_dir, f"detailed_{i}.json"))]
+    print(f"{len(activity_ids) - len(pending)} already downloaded, {len(pending)} to fetch.")
+    progress = Progress("detailed_activities", len(pending))
 
-        # Skip if this detailed file already exists
-        if os.path.exists(file_path):
-            print(f"Skipping {activity_id} (already downloaded)")
-            continue
+    for activity_id in pending:
+        file_path = os.path.join(output_dir, f"detailed_{activity_id}.json")
 
         print(f"Fetching detailed data for activity {activity_id}...")
 
@@ -65,21 +74,25 @@ def pull_all_detailed(access_token):
 
         # If API returned None, skip
         if data is None:
+            progress.advance("failed", activity_id)
             continue
 
         # Detect Strava rate limit error
         if isinstance(data, dict) and data.get("message") == "Rate Limit Exceeded":
             print("\n🚫 Rate Limit Reached — Sleeping for 15 minutes...\n")
+            progress.throttled(15 * 60)
             time.sleep(15 * 60)
             continue  # after sleep, move to next activity
 
         # Save the detailed JSON file
         with open(file_path, "w") as f:
             json.dump(data, f, indent=2)
+        progress.advance("fetched", activity_id)
 
         # Friendly delay to avoid hitting limits too quickly
         time.sleep(0.3)
 
+    progress.finish()
     print("\nAll detailed activity data downloaded successfully!")
 
 
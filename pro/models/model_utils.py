@@ -0,0 +1,103 @@
+import json
+import os
+
+import numpy as np
+
+# ---------------------------------------------------------
+# Shared helpers for the models/ scripts:
+# time-ordered cross-validation folds, closed-form ridge
+# regression, error metrics and small JSON model artifacts.
+# ---------------------------------------------------------
+
+
+def time_ordered_folds(groups, n_folds=5, min_train=None):
+    """
+    Expanding-window folds over samples already sorted by time.
+    groups (e.g. each sample's day) is sorted too, and block edges
+    are moved back to the start of a group, so samples from the
+    same day / activity never land on both sides of a boundary.
+    Each fold trains on everything before its test block, so no
+    fold ever trains on the future. Returns [(train_idx, test_idx), ...].
+    """
+    groups = np.asarray(groups)
+    n = len(groups)
+    if n == 0:
+        return []
+
+    ideal = np.arange(1, n_folds + 1) * n // (n_folds + 1)
+    edges = np.unique(np.r_[0, np.searchsorted(groups, groups[ideal], side="left"), n])
+    blocks = [np.arange(a, b) for a, b in zip(edges[:-1], edges[1:])]
+    min_train = min_train or len(blocks[0])
+
+    folds = []
+    for i in range(1, len(blocks)):
+        train = np.concatenate(blocks[:i])
+        if len(train) >= min_train and len(blocks[i]):
+            folds.append((train, blocks[i]))
+    return folds
+
+
+def standardize(X, mean=None, scale=None):
+    """Column-standardized X; NaN features become the column mean (0)."""
+    if mean is None:
+        mean = np.nanmean(X, axis=0)
+        mean = np.where(np.isnan(mean), 0.0, mean)
+        scale = np.nanstd(X, axis=0)
+        scale = np.where(np.isnan(scale) | (scale == 0), 1.0, scale)
+    Z = (X - mean) / scale
+    return np.where(np.isnan(Z), 0.0, Z), mean, scale
+
+
+def ridge_fit(X, y, alpha):
+    """
+    Ridge regression on standardized features (intercept not penalized).
+    Returns a dict of arrays usable by ridge_predict and save_artifact.
+    """
+    Z, mean, scale = standardize(X)
+    intercept = y.mean()
+    coef = np.linalg.solve(Z.T @ Z + alpha * np.eye(Z.shape[1]), Z.T @ (y - intercept))
+    return {"alpha": alpha, "mean": mean, "scale": scale, "coef": coef, "intercept": intercept}
+
+
+def ridge_predict(model, X):
+    Z, _, _ = standardize(X, np.asarray(model["mean"]), np.asarray(model["scale"]))
+    return Z @ np.asarray(model["coef"]) + model["intercept"]
+
+
+def power_law_exponent(distance_ratio, time_ratio):
+    """Least-squares k in time_ratio = distance_ratio ** k (fit in log space, no intercept)."""
+    x = np.log(distance_ratio)
+    y = np.log(time_ratio)
+    return float((x @ y) / (x @ x))
+
+
+def geometric_mean(values):
+    return float(np.exp(np.mean(np.log(values))))
+
+
+def mean_absolute_percentage_error(actual, predicted):
+    return float(np.mean(np.abs(predicted - actual) / actual) * 100)
+
+
+def to_json(value):
+    """NumPy arrays / scalars -> plain JSON types."""
+    if isinstance(value, dict):
+        return {k: to_json(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def save_artifact(model, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(to_json(model), f, indent=2)
+
+
+def load_artifact(path):
+    with open(path, "r") as f:
+        return json.load(f)
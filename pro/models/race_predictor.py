@@ -0,0 +1,333 @@
+import sqlite3
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+import numpy as np
+
+from models.model_utils import (
+    time_ordered_folds, ridge_fit, ridge_predict, power_law_exponent,
+    geometric_mean, mean_absolute_percentage_error, save_artifact, load_artifact
+)
+from processing.units import METERS_PER_MILE
+
+# ---------------------------------------------------------
+# Fits the race predictor from Strava best efforts.
+#
+# Samples: every best effort (400m ... Marathon) in the
+# detailed activity JSON, paired with the nearest-distance best
+# effort from the REFERENCE_DAYS before it and the training
+# state that day from the feature store.
+#
+# Fitted from the samples:
+# - Riegel exponent (hand-tuned 1.06) from best-effort pairs
+# - Cameron exponent (hand-tuned 1.077) from the longest recent
+#   run, which is how the old scripts apply it
+# - Beckstrand multipliers (hand-tuned 0.95 / 0.99 / 0.98) as the
+#   typical ratio of actual pace to each rule's base pace
+# - A ridge regression on log time that corrects the Riegel
+#   estimate with training load, volume and recency
+#
+# Ridge strength is chosen by time-ordered cross-validation
+# (train on the past, test on the next block); every
+# (alpha, fold) pair runs in a process pool. The final model is a
+# small JSON artifact; predict_time() is plain NumPy.
+#
+# Run after the feature store (from the pro/ folder):
+#   python -m models.race_predictor
+#   python -m models.race_predictor --benchmark
+# ---------------------------------------------------------
+
+
+EFFORTS_DIR = "data_raw/detailed_activities"
+MODEL_FILE = "data_processed/race_predictor_model.json"
+
+# Hand-tuned values from old/race_predictions*.py, used as the
+# baseline and as fallbacks when there is nothing to fit
+RIEGEL_EXPONENT = 1.06
+CAMERON_EXPONENT = 1.077
+BECKSTRAND_MULTIPLIERS = {"mile": 0.95, "short": 0.99, "long": 0.98}
+BECKSTRAND_LONG_EXPONENT = 1.05
+
+REFERENCE_DAYS = 90
+VOLUME_DAYS = 42
+MIN_LOG_RATIO = 0.1     # references within ~10% of the target distance say nothing about the exponent
+
+N_FOLDS = 5
+ALPHA_GRID = [0.01, 0.1, 1, 3, 10, 30, 100, 300, 1000]
+
+
+FEATURE_NAMES = [
+    "log_distance_ratio", "log_distance", "days_since_reference",
+    "ctl", "atl", "tsb", "volume_km", "longest_km"
+]
+
+
+def load_best_efforts(directory=EFFORTS_DIR):
+    """(activity_ids, days, distances, times) of every best effort, oldest first."""
+    rows = []
+    for path in glob.glob(os.path.join(directory, "detailed_*.json")):
+        with open(path, "r") as f:
+            activity = json.load(f)
+        for effort in activity.get("best_efforts") or []:
+            if effort.get("elapsed_time") and effort.get("distance"):
+                rows.append((
+                    activity["id"],
+                    date.fromisoformat(effort["start_date"][:10]).toordinal(),
+                    float(effort["distance"]),
+                    float(effort["elapsed_time"])
+                ))
+
+    rows.sort(key=lambda r: (r[1], r[0], r[2]))
+    data = np.array(rows, dtype=float).reshape(-1, 4)
+    return data[:, 0].astype(np.int64), data[:, 1].astype(np.int64), data[:, 2], data[:, 3]
+
+
+def load_runs(cursor):
+    """Run history from the feature store, oldest first."""
+    cursor.execute("""
+        SELECT activity_id, date, distance, moving_time, ctl, atl, tsb
+        FROM feature_store
+        WHERE sport_type = 'Run' AND distance > 0 AND moving_time > 0
+        ORDER BY date
+    """)
+    rows = cursor.fetchall()
+    return {
+        "activity_id": np.array([r[0] for r in rows], dtype=np.int64),
+        "day": np.array([date.fromisoformat(r[1]).toordinal() for r in rows], dtype=np.int64),
+        "distance": np.array([r[2] for r in rows], dtype=float),
+        "time": np.array([r[3] for r in rows], dtype=float),
+        "load": np.array([r[4:7] for r in rows], dtype=float).reshape(-1, 3)  # NULL -> NaN
+    }
+
+
+def build_samples(efforts, runs):
+    """
+    One sample per best effort that has a usable reference effort.
+    Returns a dict of aligned arrays, sorted by day.
+    """
+    activity_ids, days, distances, times = efforts
+    run_pace = runs["time"] / runs["distance"]
+    load_by_activity = dict(zip(runs["activity_id"].tolist(), runs["load"]))
+
+    # Effort windows: earlier days only, so a reference is never from the same run
+    effort_lo = np.searchsorted(days, days - REFERENCE_DAYS, side="left")
+    effort_hi = np.searchsorted(days, days, side="left")
+    run_lo = np.searchsorted(runs["day"], days - REFERENCE_DAYS, side="left")
+    vol_lo = np.searchsorted(runs["day"], days - VOLUME_DAYS, side="left")
+    run_hi = np.searchsorted(runs["day"], days, side="left")
+
+    samples = []
+    for i in range(len(days)):
+        a, b = effort_lo[i], effort_hi[i]
+        if b == a:
+            continue
+        log_ratio = np.log(distances[i] / distances[a:b])
+        usable = np.abs(log_ratio) >= MIN_LOG_RATIO
+        if not usable.any():
+            continue
+        j = a + np.flatnonzero(usable)[np.argmin(np.abs(log_ratio[usable]))]
+
+        # Recent runs: volume, longest run, and the Beckstrand base paces
+        ra, va, rb = run_lo[i], vol_lo[i], run_hi[i]
+        recent_d = runs["distance"][ra:rb]
+        recent_p = run_pace[ra:rb]
+        if len(recent_d) == 0:
+            continue
+        longest = ra + int(np.argmax(recent_d))
+        similar = np.minimum(recent_d, distances[i]) / np.maximum(recent_d, distances[i]) >= 0.7
+        closest = np.argsort(np.abs(recent_d - distances[i]))[:5]
+
+        samples.append((
+            days[i], distances[i], times[i], distances[j], times[j], days[i] - days[j],
+            *load_by_activity.get(int(activity_ids[i]), (np.nan,) * 3),
+            runs["distance"][va:rb].sum() / 1000,
+            recent_d.max() / 1000,
+            runs["distance"][longest], runs["time"][longest],
+            recent_p.min(),
+            recent_p[similar].min() if similar.any() else np.nan,
+            recent_p[closest].min(), recent_d[closest[0]]
+        ))
+
+    names = [
+        "day", "distance", "time", "ref_distance", "ref_time", "days_since_reference",
+        "ctl", "atl", "tsb", "volume_km", "longest_km",
+        "long_distance", "long_time",
+        "fastest_pace", "similar_pace", "closest_pace", "closest_distance"
+    ]
+    data = np.array(samples, dtype=float).reshape(-1, len(names))
+    return {name: data[:, k] for k, name in enumerate(names)}
+
+
+def subset(samples, idx):
+    return {name: values[idx] for name, values in samples.items()}
+
+
+def feature_matrix(samples):
+    return np.column_stack([
+        np.log(samples["distance"] / samples["ref_distance"]),
+        np.log(samples["distance"]),
+        samples["days_since_reference"],
+        samples["ctl"], samples["atl"], samples["tsb"],
+        samples["volume_km"], samples["longest_km"]
+    ])
+
+
+def riegel_log_time(samples, exponent=RIEGEL_EXPONENT):
+    return np.log(samples["ref_time"]) + exponent * np.log(samples["distance"] / samples["ref_distance"])
+
+
+def fit_coefficients(samples):
+    """Riegel / Cameron exponents and Beckstrand multipliers fitted to samples."""
+    riegel = power_law_exponent(samples["distance"] / samples["ref_distance"],
+                                samples["time"] / samples["ref_time"])
+
+    # Cameron as used in the scripts: scale from the longest recent run
+    longer_than_target = np.abs(np.log(samples["distance"] / samples["long_distance"])) >= MIN_LOG_RATIO
+    cameron = (power_law_exponent(samples["distance"][longer_than_target] / samples["long_distance"][longer_than_target],
+                                  samples["time"][longer_than_target] / samples["long_time"][longer_than_target])
+               if longer_than_target.any() else CAMERON_EXPONENT)
+
+    # Beckstrand: actual pace over each rule's base pace
+    miles = samples["distance"] / METERS_PER_MILE
+    pace = samples["time"] / samples["distance"]
+    rules = {
+        "mile": (miles <= 1.5, samples["fastest_pace"]),
+        "short": ((miles > 1.5) & (miles <= 5), samples["similar_pace"]),
+        "long": (miles > 5, samples["closest_pace"]
+                 * (samples["distance"] / samples["closest_distance"]) ** BECKSTRAND_LONG_EXPONENT)
+    }
+    multipliers = {}
+    for name, (mask, base) in rules.items():
+        mask = mask & np.isfinite(base)
+        multipliers[name] = geometric_mean(pace[mask] / base[mask]) if mask.any() else BECKSTRAND_MULTIPLIERS[name]
+
+    return {"riegel_exponent": riegel, "cameron_exponent": cameron, "beckstrand_multipliers": multipliers}
+
+
+def evaluate_fold(task):
+    """Train on one fold's past, score on its test block (runs in a worker process)."""
+    samples, alpha, fold, train_idx, test_idx = task
+    start = time.perf_counter()
+
+    train, test = subset(samples, train_idx), subset(samples, test_idx)
+    exponent = fit_coefficients(train)["riegel_exponent"]
+
+    ridge = ridge_fit(feature_matrix(train), np.log(train["time"]) - riegel_log_time(train, exponent), alpha)
+    predicted = np.exp(riegel_log_time(test, exponent) + ridge_predict(ridge, feature_matrix(test)))
+
+    return {
+        "alpha": alpha,
+        "fold": fold,
+        "train_size": len(train_idx),
+        "test_size": len(test_idx),
+        "riegel_default_mape": mean_absolute_percentage_error(test["time"], np.exp(riegel_log_time(test))),
+        "riegel_fitted_mape": mean_absolute_percentage_error(test["time"], np.exp(riegel_log_time(test, exponent))),
+        "ridge_mape": mean_absolute_percentage_error(test["time"], predicted),
+        "seconds": time.perf_counter() - start
+    }
+
+
+def cross_validate(samples, alphas=ALPHA_GRID, n_folds=N_FOLDS, workers=None):
+    """Every (alpha, fold) pair evaluated in a process pool."""
+    folds = time_ordered_folds(samples["day"], n_folds)
+    tasks = [(samples, alpha, k, train, test) for alpha in alphas for k, (train, test) in enumerate(folds)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(evaluate_fold, tasks))
+
+
+def train_model(cursor):
+    """Fit everything and return (model artifact dict, cross-validation results)."""
+    samples = build_samples(load_best_efforts(), load_runs(cursor))
+    if len(samples["day"]) < 2 * (N_FOLDS + 1):
+        raise ValueError(f"Only {len(samples['day'])} best-effort samples - not enough to train")
+
+    results = cross_validate(samples)
+    cv_error = {alpha: np.mean([r["ridge_mape"] for r in results if r["alpha"] == alpha]) for alpha in ALPHA_GRID}
+    best_alpha = min(cv_error, key=cv_error.get)
+
+    coefficients = fit_coefficients(samples)
+    ridge = ridge_fit(feature_matrix(samples),
+                      np.log(samples["time"]) - riegel_log_time(samples, coefficients["riegel_exponent"]),
+                      best_alpha)
+
+    model = dict(coefficients,
+                 ridge=dict(ridge, features=FEATURE_NAMES),
+                 cv_mape={str(a): e for a, e in cv_error.items()},
+                 n_samples=len(samples["day"]),
+                 trained_at=datetime.now().isoformat(timespec="seconds"))
+    return model, results
+
+
+_loaded = {}
+
+
+def load_model(path=MODEL_FILE):
+    """Model artifact (cached after the first load)."""
+    if path not in _loaded:
+        _loaded[path] = load_artifact(path)
+    return _loaded[path]
+
+
+def predict_time(model, reference_distance, reference_time, target_distance,
+                 days_since_reference=0, ctl=np.nan, atl=np.nan, tsb=np.nan,
+                 volume_km=np.nan, longest_km=np.nan):
+    """
+    Predicted target time (seconds) from a recent effort.
+    Distances in meters; the arguments broadcast, so a whole race
+    ladder is one call with target_distance as an array.
+    """
+    target_distance = np.asarray(target_distance, dtype=float)
+    samples = {
+        name: np.broadcast_to(np.asarray(value, dtype=float), target_distance.shape).ravel()
+        for name, value in {
+            "distance": target_distance, "ref_distance": reference_distance, "ref_time": reference_time,
+            "days_since_reference": days_since_reference, "ctl": ctl, "atl": atl, "tsb": tsb,
+            "volume_km": volume_km, "longest_km": longest_km
+        }.items()
+    }
+    log_time = riegel_log_time(samples, model["riegel_exponent"]) + ridge_predict(model["ridge"], feature_matrix(samples))
+    return np.exp(log_time).reshape(target_distance.shape)
+
+
+def print_benchmark(results, train_seconds):
+    best = min({r["alpha"] for r in results},
+               key=lambda a: np.mean([r["ridge_mape"] for r in results if r["alpha"] == a]))
+
+    print(f"\nTraining wall time: {train_seconds:.2f} s "
+          f"({len(results)} fold fits, {sum(r['seconds'] for r in results):.2f} s of worker time)")
+    print(f"Best ridge alpha: {best}\n")
+    print(f"{'Fold':<6}{'Train':>7}{'Test':>6}{'Riegel 1.06':>13}{'Riegel fit':>12}{'Ridge':>9}")
+    for r in sorted((r for r in results if r["alpha"] == best), key=lambda r: r["fold"]):
+        print(f"{r['fold'] + 1:<6}{r['train_size']:>7}{r['test_size']:>6}"
+              f"{r['riegel_default_mape']:>12.2f}%{r['riegel_fitted_mape']:>11.2f}%{r['ridge_mape']:>8.2f}%")
+
+
+def main(benchmark=False):
+    conn = sqlite3.connect("strava.db")
+    cursor = conn.cursor()
+
+    start = time.perf_counter()
+    model, results = train_model(cursor)
+    train_seconds = time.perf_counter() - start
+    conn.close()
+
+    save_artifact(model, MODEL_FILE)
+
+    print(f"Trained on {model['n_samples']} best-effort samples")
+    print(f"Riegel exponent:   {model['riegel_exponent']:.3f} (was {RIEGEL_EXPONENT})")
+    print(f"Cameron exponent:  {model['cameron_exponent']:.3f} (was {CAMERON_EXPONENT})")
+    for name, value in model["beckstrand_multipliers"].items():
+        print(f"Beckstrand {name + ':':<7} {value:.3f} (was {BECKSTRAND_MULTIPLIERS[name]})")
+    print(f"Model saved to {MODEL_FILE}")
+
+    if benchmark:
+        print_benchmark(results, train_seconds)
+
+
+if __name__ == "__main__":
+    main(benchmark="--benchmark" in sys.argv)
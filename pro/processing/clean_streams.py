@@ -0,0 +1,219 @@
+import sqlite3
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from database.database import bump_data_version
+from processing.geometry import haversine
+from processing.streams import iter_streams, stream_versions
+
+# ---------------------------------------------------------
+# Cleans raw stream data before any metrics are computed.
+#
+# - GPS: points whose implied speed from the previous AND to the
+#   next point is impossible (> MAX_GPS_SPEED) are jumps
+# - HR / cadence: samples far from a rolling median (in units of
+#   the rolling MAD), out of physiological range, or zero dropouts
+# - Flagged samples and short runs of missing values are repaired
+#   by time-based interpolation; longer gaps are left missing
+#
+# Repaired values are written back to the "streams" table and a
+# per-activity quality score goes into "stream_quality", so
+# analyses can skip bad files with good_activity_ids(). The
+# quality row records which copy of the streams was cleaned
+# (processing.streams.stream_versions), so streams replaced by
+# insert_streams.py are cleaned again, and the later stages
+# redo activities whose streams were cleaned after they ran.
+#
+# Pipeline order (run from the pro/ folder):
+#   python database/insert_streams.py
+#   python -m processing.clean_streams
+#   python -m processing.derived_streams / zones / training_load ...
+# ---------------------------------------------------------
+
+
+MAX_GPS_SPEED = 15.0        # m/s - faster than any runner
+HR_RANGE = (30, 230)        # bpm
+CADENCE_RANGE = (1, 130)    # Strava running cadence is steps per minute per leg
+
+ROLLING_WINDOW = 15         # samples for rolling median / MAD
+MAD_THRESHOLD = 4.0         # robust z-score above which a sample is a spike
+HR_MIN_MAD = 2.0            # floors so flat segments don't flag normal jitter
+CADENCE_MIN_MAD = 3.0
+
+MAX_GAP_SAMPLES = 10        # longest run of missing samples to interpolate
+
+# Activities below this quality score are excluded by good_activity_ids()
+MIN_QUALITY = 0.9
+
+def gps_jumps(t, lat, lng):
+    """Flag points whose speed in from the previous point and out to the next is impossible."""
+    flagged = np.zeros(len(t), dtype=bool)
+    if len(t) < 3:
+        return flagged
+
+    dt = np.maximum(np.diff(t), 1)
+    speed = haversine(lat[:-1], lng[:-1], lat[1:], lng[1:]) / dt
+    too_fast = speed > MAX_GPS_SPEED  # NaN compares False
+
+    # Interior points: both neighbours' legs are impossible
+    flagged[1:-1] = too_fast[:-1] & too_fast[1:]
+    # End points only have one leg
+    flagged[0] = too_fast[0] and not too_fast[1]
+    flagged[-1] = too_fast[-1] and not too_fast[-2]
+    return flagged
+
+
+def rolling_outliers(values, valid_range, min_mad, window=ROLLING_WINDOW):
+    """Flag values outside valid_range or far from the rolling median (MAD scaled)."""
+    out_of_range = (values < valid_range[0]) | (values > valid_range[1])
+    if len(values) < window:
+        return out_of_range
+
+    # Out of range / missing samples don't vote: bridge them from their
+    # neighbours so the windows hold no NaN and np.median can partition
+    usable = ~out_of_range & ~np.isnan(values)
+    if usable.sum() < 2:
+        return out_of_range
+
+    positions = np.arange(len(values))
+    bridged = np.interp(positions, positions[usable], values[usable])
+
+    # Centered rolling median / MAD
+    windows = sliding_window_view(np.pad(bridged, window // 2, mode="edge"), window)
+    median = np.median(windows, axis=1)
+    mad = np.median(np.abs(windows - median[:, None]), axis=1)
+    with np.errstate(invalid="ignore"):
+        z = np.abs(values - median) / np.maximum(1.4826 * mad, min_mad)
+
+    return out_of_range | (z > MAD_THRESHOLD)
+
+
+def short_gaps(missing, max_gap=MAX_GAP_SAMPLES):
+    """Mask of missing samples that belong to a run of at most max_gap."""
+    edges = np.diff(np.r_[0, missing.astype(np.int8), 0])
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    lengths = ends - starts
+
+    run_length = np.zeros(len(missing) + 1, dtype=int)
+    run_length[starts] += lengths
+    run_length[ends] -= lengths
+    return missing & (np.cumsum(run_length)[:-1] <= max_gap)
+
+
+def repair(t, values, flagged):
+    """
+    Drop flagged samples, then interpolate every short run of missing
+    samples from its neighbours in time. Returns (repaired, filled_mask).
+    """
+    values = np.where(flagged, np.nan, values)
+    missing = np.isnan(values)
+    fill = short_gaps(missing)
+
+    known = ~missing
+    if known.sum() < 2:
+        return values, np.zeros(len(values), dtype=bool)
+
+    repaired = values.copy()
+    repaired[fill] = np.interp(t[fill], t[known], values[known])
+    return repaired, fill & missing
+
+
+def clean_activity(streams):
+    """
+    Clean one activity's streams.
+    Returns (cleaned streams, quality row values).
+    """
+    t = streams["time"]
+    cleaned = dict(streams)
+
+    gps_flags = gps_jumps(t, streams["lat"], streams["lng"])
+    cleaned["lat"], gps_filled = repair(t, streams["lat"], gps_flags)
+    cleaned["lng"], _ = repair(t, streams["lng"], gps_flags)
+
+    hr = np.where(streams["heartrate"] == 0, np.nan, streams["heartrate"])  # dropouts
+    hr_flags = rolling_outliers(hr, HR_RANGE, HR_MIN_MAD) | (streams["heartrate"] == 0)
+    cleaned["heartrate"], hr_filled = repair(t, hr, hr_flags)
+
+    cad = streams["cadence"]
+    cad_flags = rolling_outliers(cad, CADENCE_RANGE, CADENCE_MIN_MAD)
+    # Standing still reads as cadence 0, which is real, so zeros are never flagged
+    cad_flags &= ~(cad == 0)
+    cleaned["cadence"], cad_filled = repair(t, cad, cad_flags)
+
+    n = len(t)
+    flagged = gps_flags | hr_flags | cad_flags
+    quality = 1 - flagged.sum() / n if n else 0.0
+
+    stats = (
+        n,
+        int(gps_flags.sum()),
+        int(hr_flags.sum()),
+        int(cad_flags.sum()),
+        int((gps_filled | hr_filled | cad_filled).sum()),
+        float(quality)
+    )
+    return cleaned, stats
+
+
+def changed(before, after):
+    """Positions where a value was repaired (NaN-aware)."""
+    return ~((before == after) | (np.isnan(before) & np.isnan(after)))
+
+
+def clean_all_streams():
+    conn = sqlite3.connect("strava.db")
+    cursor = conn.cursor()
+
+    # Streams not cleaned yet, or replaced (e.g. by insert_streams.py --activity) since
+    versions = stream_versions(cursor)
+    pending = [a for a, version in versions.items() if not version.endswith(":c")]
+
+    print(f"Cleaning streams for {len(pending)} activities...")
+
+    columns = ("id", "time", "heartrate", "cadence", "lat", "lng")
+    repaired_rows = 0
+    for activity_id, streams in iter_streams(cursor, pending, columns):
+        cleaned, stats = clean_activity(streams)
+
+        rows_changed = np.zeros(len(streams["id"]), dtype=bool)
+        for name in ("heartrate", "cadence", "lat", "lng"):
+            rows_changed |= changed(streams[name], cleaned[name])
+
+        # Write back only the rows that changed (NaN -> NULL)
+        updates = [
+            tuple(None if np.isnan(cleaned[name][i]) else float(cleaned[name][i])
+                  for name in ("heartrate", "cadence", "lat", "lng")) + (int(streams["id"][i]),)
+            for i in np.flatnonzero(rows_changed)
+        ]
+        cursor.executemany("""
+            UPDATE streams SET heartrate = ?, cadence = ?, lat = ?, lng = ?
+            WHERE id = ?
+        """, updates)
+        repaired_rows += len(updates)
+
+        cursor.execute("""
+            INSERT OR REPLACE INTO stream_quality (
+                activity_id, samples, gps_flagged, hr_flagged,
+                cadence_flagged, gaps_filled, quality, stream_version
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (activity_id,) + stats + (versions[activity_id],))
+
+        conn.commit()
+
+    if pending:
+        bump_data_version(cursor)
+        conn.commit()
+    conn.close()
+    print(f"Repaired {repaired_rows} stream rows. Stream cleaning complete!")
+
+
+def good_activity_ids(cursor, min_quality=MIN_QUALITY):
+    """IDs of cleaned activities whose quality score is at least min_quality."""
+    cursor.execute("SELECT activity_id FROM stream_quality WHERE quality >= ?", (min_quality,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+if __name__ == "__main__":
+    clean_all_streams()
@@ -0,0 +1,24 @@
+# ---------------------------------------------------------
+# Helpers for the per-activity "metrics" table.
+#
+# Several processing stages each fill in their own columns of
+# the same metrics row, so writes update the activity's row in
+# place and only insert when the activity has no row yet.
+# ---------------------------------------------------------
+
+
+def save_metrics(cursor, activity_id, **values):
+    """Set the given metrics columns for one activity (creating its row if needed)."""
+    columns = list(values)
+    params = [values[c] for c in columns]
+
+    cursor.execute(f"""
+        UPDATE metrics SET {", ".join(f"{c} = ?" for c in columns)}
+        WHERE activity_id = ?
+    """, params + [activity_id])
+
+    if cursor.rowcount == 0:
+        cursor.execute(f"""
+            INSERT INTO metrics (activity_id, {", ".join(columns)})
+            VALUES (?, {", ".join("?" * len(columns))})
+        """, [activity_id] + params)
@@ -0,0 +1,215 @@
+import sqlite3
+import json
+import os
+import sys
+
+import numpy as np
+
+from database.database import bump_data_version
+from processing.units import METERS_PER_MILE
+
+# ---------------------------------------------------------
+# Computes splits (mile, km, 400m or any custom length) from
+# the time/distance streams already stored in strava.db.
+#
+# No API calls: activities are processed in batches, and every
+# split boundary in a batch is located with one np.searchsorted
+# over the concatenated distance streams. Times at the exact
+# boundary distance are linearly interpolated between the two
+# surrounding samples.
+#
+# Rows go into the "splits" table with numeric seconds:
+#   distance     - meters covered by the split (short for the last one)
+#   moving_time  - seconds, excluding auto-pause / stopped time
+#   pace         - seconds per split_length (e.g. s/mile for mile splits)
+#   split_length - the split length in meters
+#
+# Run from the pro/ folder:
+#   python -m processing.create_split_data            (mile + km)
+#   python -m processing.create_split_data 400m 1609.34
+#   python -m processing.create_split_data --export   (also write the
+#       legacy strava_running_splits.json format from the mile splits)
+# ---------------------------------------------------------
+
+
+SPLIT_LENGTHS = {
+    "mile": METERS_PER_MILE,
+    "km": 1000.0,
+    "400m": 400.0
+}
+
+BATCH_SIZE = 200
+
+# A sample only adds moving time if it covers at least this speed
+MIN_SPEED = 0.5  # m/s
+
+# Ignore trailing partial splits shorter than this
+MIN_PARTIAL = 10.0  # meters
+
+# Separates activities when their distance streams are concatenated
+ACTIVITY_OFFSET = 1e7  # meters
+
+
+def compute_splits(activity_ids, t, d, split_length):
+    """
+    Splits for a batch of activities.
+
+    activity_ids, t, d are the concatenated streams sorted by
+    (activity_id, time). Returns a list of
+    (activity_id, split_index, distance, moving_time, pace) tuples.
+    """
+    starts = np.flatnonzero(np.r_[True, activity_ids[1:] != activity_ids[:-1]])
+    ends = np.r_[starts[1:], len(activity_ids)] - 1
+    group = np.cumsum(np.r_[True, activity_ids[1:] != activity_ids[:-1]]) - 1
+
+    # One increasing key across the batch: distance (never decreasing) + activity offset
+    key = np.maximum.accumulate(d + group * ACTIVITY_OFFSET)
+    totals = key[ends] - group[ends] * ACTIVITY_OFFSET
+
+    # Moving clock: only samples covered at MIN_SPEED or faster add time
+    dt = np.diff(t, prepend=t[0])
+    dd = np.diff(key, prepend=key[0])
+    dt[starts] = 0
+    dd[starts] = 0
+    step = np.where(dd >= MIN_SPEED * dt, dt, 0)
+    clock = np.cumsum(step)
+    clock -= clock[starts][group]
+
+    # Boundaries for every activity: full splits plus a trailing partial
+    n_full = np.floor(totals / split_length).astype(int)
+    has_partial = (totals - n_full * split_length) >= MIN_PARTIAL
+    # An activity needs two samples to interpolate between (a lone sample
+    # would be clipped onto the previous activity's last one)
+    counts = np.where(ends > starts, n_full + has_partial, 0)
+    split_group = np.repeat(np.arange(len(starts)), counts)
+    split_index = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    boundary = np.minimum((split_index + 1) * split_length, totals[split_group])
+
+    # Locate each boundary and interpolate the moving clock there
+    boundary_key = boundary + split_group * ACTIVITY_OFFSET
+    pos = np.searchsorted(key, boundary_key, side="left")
+    pos = np.clip(pos, starts[split_group] + 1, ends[split_group])
+    d0, d1 = key[pos - 1], key[pos]
+    frac = np.where(d1 > d0, (boundary_key - d0) / np.where(d1 > d0, d1 - d0, 1), 1.0)
+    clock_at = clock[pos - 1] + np.clip(frac, 0, 1) * (clock[pos] - clock[pos - 1])
+
+    # Differences between consecutive boundaries within each activity
+    first = split_index == 0
+    prev_clock = np.where(first, 0.0, np.r_[0.0, clock_at[:-1]])
+    prev_boundary = np.where(first, 0.0, np.r_[0.0, boundary[:-1]])
+    split_time = clock_at - prev_clock
+    split_distance = boundary - prev_boundary
+    pace = split_time / split_distance * split_length
+
+    ids = activity_ids[starts][split_group]
+    return list(zip(ids.tolist(), (split_index + 1).tolist(), split_distance.tolist(),
+                    split_time.tolist(), pace.tolist()))
+
+
+def load_batch(cursor, batch):
+    """Concatenated (activity_id, time, distance) streams for a batch of activities."""
+    cursor.execute(f"""
+        SELECT activity_id, time, distance
+        FROM streams
+        WHERE activity_id IN ({", ".join("?" * len(batch))})
+          AND time IS NOT NULL AND distance IS NOT NULL
+        ORDER BY activity_id, time
+    """, batch)
+    rows = np.array(cursor.fetchall(), dtype=float).reshape(-1, 3)
+    return rows[:, 0].astype(np.int64), rows[:, 1], rows[:, 2]
+
+
+def create_split_data(split_lengths=(SPLIT_LENGTHS["mile"], SPLIT_LENGTHS["km"])):
+    conn = sqlite3.connect("strava.db")
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT DISTINCT activity_id FROM streams WHERE distance IS NOT NULL")
+    activity_ids = [row[0] for row in cursor.fetchall()]
+
+    print(f"Computing splits for {len(activity_ids)} activities "
+          f"(split lengths: {', '.join(f'{l:g} m' for l in split_lengths)})...")
+
+    total = 0
+    for start in range(0, len(activity_ids), BATCH_SIZE):
+        batch = activity_ids[start:start + BATCH_SIZE]
+        ids, t, d = load_batch(cursor, batch)
+        if len(ids) == 0:
+            continue
+
+        for split_length in split_lengths:
+            rows = compute_splits(ids, t, d, split_length)
+
+            # Regenerate: replace any earlier splits of this length
+            cursor.execute(f"""
+                DELETE FROM splits
+                WHERE split_length = ? AND activity_id IN ({", ".join("?" * len(batch))})
+            """, [split_length] + batch)
+
+            cursor.executemany("""
+                INSERT INTO splits (activity_id, split_index, distance, moving_time, pace, split_length)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [row + (split_length,) for row in rows])
+            total += len(rows)
+
+        conn.commit()
+
+    if activity_ids:
+        bump_data_version(cursor)
+        conn.commit()
+    conn.close()
+    print(f"Stored {total} splits successfully!")
+
+
+def export_mile_splits(output_file="data_processed/strava_running_splits.json"):
+    """
+    Write mile splits in the format old/mile_splits.py produced
+    ({id: {name, date, distance_miles, mile_splits: ["m:ss", ...]}}),
+    so the older analysis scripts can run without re-fetching streams.
+    """
+    conn = sqlite3.connect("strava.db")
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        SELECT a.id, a.name, a.start_date, a.distance, s.moving_time
+        FROM activities a
+        JOIN splits s ON s.activity_id = a.id
+        WHERE a.sport_type = 'Run' AND s.split_length = ? AND s.distance >= ?
+        ORDER BY a.id, s.split_index
+    """, (SPLIT_LENGTHS["mile"], SPLIT_LENGTHS["mile"] - 1))
+
+    results = {}
+    for activity_id, name, start_date, distance, seconds in cursor.fetchall():
+        run = results.setdefault(str(activity_id), {
+            "name": name,
+            "date": start_date,
+            "distance_miles": round(distance / SPLIT_LENGTHS["mile"], 2),
+            "mile_splits": []
+        })
+        run["mile_splits"].append(f"{int(seconds // 60)}:{int(seconds % 60):02d}")
+
+    conn.close()
+
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    with open(output_file, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print(f"Saved mile splits for {len(results)} runs to {output_file}")
+
+
+def parse_split_length(arg):
+    """'mile', 'km', '400m' or a number of meters."""
+    if arg in SPLIT_LENGTHS:
+        return SPLIT_LENGTHS[arg]
+    return float(arg.rstrip("m"))
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--export"]
+
+    if args:
+        create_split_data([parse_split_length(arg) for arg in args])
+    else:
+        create_split_data()
+
+    if "--export" in sys.argv:
+        export_mile_splits()
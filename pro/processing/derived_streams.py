@@ -0,0 +1,129 @@
+import sqlite3
+
+import numpy as np
+
+from database.database import bump_data_version
+from processing.streams import iter_streams, sample_durations, stream_versions, PAUSE_GAP
+from processing.resample import resample_time
+from processing.compute_metrics import save_metrics
+
+# ---------------------------------------------------------
+# Derived streams: grade-adjusted speed and running power
+#
+# For every sample, using velocity_smooth ("pace") and
+# grade_smooth ("grade") from the streams table:
+#
+# - Cost of running on a grade follows Minetti et al. (2002):
+#     C(i) = 155.4i^5 - 30.4i^4 - 43.3i^3 + 46.3i^2 + 19.5i + 3.6  J/kg/m
+# - Grade-adjusted speed = speed * C(i) / C(0), i.e. the flat
+#   speed with the same metabolic cost
+# - Running power = mass * flat-equivalent speed * POWER_PER_SPEED
+#
+# Per-sample values go in "derived_streams" (same row layout as
+# "streams"); activity-level GAP, average power and normalized
+# power go in "metrics", with the stream version and pause gap
+# they were derived from (processing.streams), so activities
+# whose streams were replaced or cleaned since are derived again.
+#
+# Run from the pro/ folder:  python -m processing.derived_streams
+# ---------------------------------------------------------
+
+
+RUNNER_MASS_KG = 70
+
+# Watts per kg per m/s of flat running (typical footpod power models)
+POWER_PER_SPEED = 1.04
+
+# Minetti's fit is only valid for grades between -45% and +45%
+MAX_GRADE = 0.45
+
+# Normalized power uses a 30 second rolling average
+NP_WINDOW_SECONDS = 30
+
+MIN_SPEED = 0.5  # m/s - slower than this counts as stopped
+
+MINETTI_COEFFS = [155.4, -30.4, -43.3, 46.3, 19.5, 3.6]
+FLAT_COST = MINETTI_COEFFS[-1]
+
+
+def cost_of_running(grade):
+    """Minetti energy cost (J/kg/m) for grade given as a fraction."""
+    return np.polyval(MINETTI_COEFFS, np.clip(grade, -MAX_GRADE, MAX_GRADE))
+
+
+def derive_streams(streams, mass=RUNNER_MASS_KG):
+    """(gap_speed, power) arrays for one activity's streams."""
+    speed = np.nan_to_num(streams["pace"])
+    grade = np.nan_to_num(streams["grade"]) / 100  # grade_smooth is a percentage
+
+    gap_speed = speed * cost_of_running(grade) / FLAT_COST
+    power = mass * gap_speed * POWER_PER_SPEED
+    return gap_speed, power
+
+
+def normalized_power(t, power, window=NP_WINDOW_SECONDS):
+    """
+    Normalized power: 4th-power mean of the rolling 30 s average, computed
+    on the 1 Hz grid so irregular sampling doesn't skew the window.
+    Paused seconds count as zero power, as on a power meter.
+    """
+    per_second = np.nan_to_num(resample_time({"time": t, "power": power})["power"])
+    if len(per_second) < window:
+        return float(np.mean(power))
+
+    csum = np.concatenate(([0.0], np.cumsum(per_second)))
+    rolling = (csum[window:] - csum[:-window]) / window
+    return float(np.mean(rolling ** 4) ** 0.25)
+
+
+def activity_aggregates(t, speed, gap_speed, power):
+    """Moving-time weighted GAP and power plus normalized power."""
+    moving = speed >= MIN_SPEED
+    if not np.any(moving):
+        return None, None, None
+
+    # Gaps longer than the pause gap are capped, as everywhere else
+    weights = np.where(moving, sample_durations(t), 0)
+    if weights.sum() == 0:
+        weights = moving.astype(float)
+
+    gap = float(np.average(gap_speed, weights=weights))
+    avg_power = float(np.average(power, weights=weights))
+    return gap, avg_power, normalized_power(t, power)
+
+
+def update_derived_streams():
+    conn = sqlite3.connect("strava.db")
+    cursor = conn.cursor()
+
+    versions = {a: f"{version}/{PAUSE_GAP}" for a, version in stream_versions(cursor).items()}
+    done = dict(cursor.execute("SELECT activity_id, derived_version FROM metrics"))
+    pending = [a for a, version in versions.items() if done.get(a) != version]
+
+    print(f"Deriving GAP and power streams for {len(pending)} activities...")
+
+    for activity_id, streams in iter_streams(cursor, pending, ("time", "pace", "grade")):
+        t = streams["time"]
+        gap_speed, power = derive_streams(streams)
+
+        cursor.execute("DELETE FROM derived_streams WHERE activity_id = ?", (activity_id,))
+        cursor.executemany("""
+            INSERT INTO derived_streams (activity_id, time, gap_speed, power)
+            VALUES (?, ?, ?, ?)
+        """, zip([activity_id] * len(t), t.astype(int).tolist(), gap_speed.tolist(), power.tolist()))
+
+        gap, avg_power, np_power = activity_aggregates(t, streams["pace"], gap_speed, power)
+        save_metrics(cursor, activity_id, gap_speed=gap, avg_power=avg_power, normalized_power=np_power,
+                     derived_version=versions[activity_id])
+
+        conn.commit()
+
+    if pending:
+        bump_data_version(cursor)
+        conn.commit()
+    conn.close()
+    print("Derived streams computed successfully!")
+
+
+if __name__ == "__main__":
+    update_derived_streams()
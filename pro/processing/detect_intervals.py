@@ -0,0 +1,208 @@
+import sqlite3
+import sys
+
+import numpy as np
+
+from database.database import bump_data_version
+from processing.units import METERS_PER_MILE
+from processing.streams import stream_versions
+from processing.resample import get_resampled
+
+# ---------------------------------------------------------
+# Detects interval workout structure (work reps / recoveries)
+# from the 1 Hz resampled speed stream.
+#
+# Per activity, all in linear time, over moving seconds only
+# (auto-pauses are cut out and the seconds either side joined,
+# so a stop never looks like a recovery):
+# 1. Smooth speed with a SMOOTH_SECONDS rolling mean
+# 2. Split moving speeds into two classes with Otsu's threshold
+#    on a speed histogram; if the classes aren't far enough apart
+#    the run is steady and has no reps
+# 3. Label each second work / recovery with hysteresis around the
+#    threshold, so noise near it doesn't flip the state
+# 4. Run-length encode the labels and absorb segments too short to
+#    be a rep or a recovery into their neighbours
+# 5. Work segments are the reps
+#
+# Results go into "intervals" (one row per rep) and
+# "interval_summary" (one row per activity, rep_count = 0 for
+# steady runs) so new activities are picked up incrementally.
+# The summary records the stream version it was detected from
+# (processing.streams.stream_versions), so activities whose
+# streams are replaced or cleaned later are detected again.
+#
+# Run from the pro/ folder:  python -m processing.detect_intervals
+# (--rebuild re-detects every activity, e.g. after this logic changes)
+# ---------------------------------------------------------
+
+
+SMOOTH_SECONDS = 10
+HYSTERESIS = 0.05           # +/- 5% around the threshold
+MIN_SPEED_RATIO = 1.2       # work must be 20% faster than recovery
+MIN_REP_SECONDS = 30
+MIN_RECOVERY_SECONDS = 15
+MIN_REPS = 2
+MIN_MOVING_SPEED = 1.0      # m/s
+
+
+
+def otsu_threshold(values, bins=64):
+    """Threshold that maximizes between-class variance of values."""
+    counts, edges = np.histogram(values, bins=bins)
+    centers = (edges[:-1] + edges[1:]) / 2
+
+    weight_low = np.cumsum(counts)
+    weight_high = weight_low[-1] - weight_low
+    sum_low = np.cumsum(counts * centers)
+    mean_low = sum_low / np.maximum(weight_low, 1)
+    mean_high = (sum_low[-1] - sum_low) / np.maximum(weight_high, 1)
+
+    between = weight_low * weight_high * (mean_low - mean_high) ** 2
+    best = int(np.argmax(between))
+    return edges[best + 1], mean_low[best], mean_high[best]
+
+
+def run_lengths(labels):
+    """(starts, lengths, values) of consecutive runs in a label array."""
+    change = np.flatnonzero(np.diff(labels)) + 1
+    starts = np.r_[0, change]
+    lengths = np.diff(np.r_[starts, len(labels)])
+    return starts, lengths, labels[starts]
+
+
+def absorb_short(labels, value, min_length):
+    """Relabel runs of `value` shorter than min_length as the other state."""
+    starts, lengths, values = run_lengths(labels)
+    short = (values == value) & (lengths < min_length)
+    run_id = np.repeat(np.arange(len(starts)), lengths)
+    return np.where(short[run_id], 1 - value, labels)
+
+
+def hysteresis_labels(speed, low, high):
+    """1 above high, 0 below low, otherwise keep the previous state."""
+    state = np.where(speed >= high, 1, np.where(speed <= low, 0, -1))
+    known = np.where(state >= 0, np.arange(len(state)), 0)
+    last_known = np.maximum.accumulate(known)
+    labels = state[last_known]
+    labels[labels < 0] = 0  # undecided before the first crossing
+    return labels
+
+
+def detect_reps(resampled):
+    """
+    Reps found in one activity's 1 Hz resampled streams.
+
+    Returns (reps, recovery_pace) where reps is a list of
+    (start_time, duration, distance, pace, recovery_duration) and
+    recovery_pace is the average pace (s/mile) between reps.
+    """
+    # Paused seconds (and seconds without speed) are cut out, so a stop is
+    # stitched over rather than smoothed into a slow "recovery"
+    moving = np.flatnonzero(resampled["moving"] & ~np.isnan(resampled["pace"]))
+    speed = resampled["pace"][moving]
+    if len(speed) < 2 * MIN_REP_SECONDS:
+        return [], None
+
+    # 1. Smooth
+    csum = np.r_[0.0, np.cumsum(speed)]
+    half = SMOOTH_SECONDS // 2
+    lo = np.clip(np.arange(len(speed)) - half, 0, len(speed))
+    hi = np.clip(np.arange(len(speed)) + half + 1, 0, len(speed))
+    smooth = (csum[hi] - csum[lo]) / (hi - lo)
+
+    # 2. Two speed classes
+    running = smooth[smooth >= MIN_MOVING_SPEED]
+    if len(running) < 2 * MIN_REP_SECONDS or running.max() < running.min() * MIN_SPEED_RATIO:
+        return [], None
+    threshold, slow_mean, fast_mean = otsu_threshold(running)
+    if fast_mean < slow_mean * MIN_SPEED_RATIO:
+        return [], None
+
+    # 3-4. Work / recovery labels, cleaned of blips
+    labels = hysteresis_labels(smooth, threshold * (1 - HYSTERESIS), threshold * (1 + HYSTERESIS))
+    labels = absorb_short(labels, 0, MIN_RECOVERY_SECONDS)
+    labels = absorb_short(labels, 1, MIN_REP_SECONDS)
+
+    # 5. Work runs are reps; runs alternate, so the run after a rep is its recovery
+    starts, lengths, values = run_lengths(labels)
+    work = np.flatnonzero(values == 1)
+    if len(work) < MIN_REPS:
+        return [], None
+
+    t = resampled["time"][moving]
+    d = np.fmax.accumulate(np.nan_to_num(resampled["distance"]))[moving]
+
+    def span(runs):
+        """Moving seconds and distance of runs (pauses inside them don't count)."""
+        first = starts[runs]
+        last = first + lengths[runs] - 1
+        return lengths[runs].astype(float), d[last] - d[first]
+
+    durations, distances = span(work)
+    paces = durations / np.maximum(distances, 1) * METERS_PER_MILE
+
+    # Recoveries between reps (the cooldown after the last rep isn't one)
+    between = work[:-1] + 1
+    recovery_durations, recovery_distances = span(between)
+    recovery_pace = float(recovery_durations.sum() / max(recovery_distances.sum(), 1) * METERS_PER_MILE)
+
+    reps = list(zip(t[starts[work]].astype(int).tolist(), durations.tolist(), distances.tolist(),
+                    paces.tolist(), np.r_[recovery_durations, 0].tolist()))
+    return reps, recovery_pace
+
+
+def detect_all_intervals(rebuild=False):
+    conn = sqlite3.connect("strava.db")
+    cursor = conn.cursor()
+
+    if rebuild:
+        cursor.execute("DELETE FROM intervals")
+        cursor.execute("DELETE FROM interval_summary")
+
+    versions = stream_versions(cursor)
+    done = dict(cursor.execute("SELECT activity_id, stream_version FROM interval_summary"))
+    pending = [a for a, version in versions.items() if done.get(a) != version]
+
+    print(f"Detecting intervals for {len(pending)} activities...")
+
+    workouts = 0
+    for activity_id in pending:
+        resampled = get_resampled(cursor, activity_id, "time")
+        reps, rec_pace = detect_reps(resampled) if resampled is not None else ([], None)
+
+        cursor.execute("DELETE FROM intervals WHERE activity_id = ?", (activity_id,))
+        cursor.executemany("""
+            INSERT INTO intervals (activity_id, rep_index, start_time, duration, distance, pace, recovery_duration)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [(activity_id, i + 1) + rep for i, rep in enumerate(reps)])
+
+        if reps:
+            workouts += 1
+            summary = (
+                len(reps),
+                float(np.mean([r[2] for r in reps])),
+                float(np.mean([r[1] for r in reps])),
+                float(np.mean([r[3] for r in reps])),
+                rec_pace
+            )
+        else:
+            summary = (0, None, None, None, None)
+
+        cursor.execute("""
+            INSERT OR REPLACE INTO interval_summary (
+                activity_id, rep_count, avg_rep_distance, avg_rep_duration, avg_rep_pace, avg_recovery_pace,
+                stream_version
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (activity_id,) + summary + (versions[activity_id],))
+        conn.commit()
+
+    if pending or rebuild:
+        bump_data_version(cursor)
+        conn.commit()
+    conn.close()
+    print(f"Found interval structure in {workouts} of {len(pending)} activities.")
+
+
+if __name__ == "__main__":
+    detect_all_intervals(rebuild="--rebuild" in sys.argv)
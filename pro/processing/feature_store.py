@@ -0,0 +1,256 @@
+import sqlite3
+import csv
+import hashlib
+import os
+import sys
+
+import numpy as np
+
+from database.database import bump_data_version
+from database.snapshot import write_snapshot
+from processing.units import METERS_PER_MILE
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# ---------------------------------------------------------
+# Feature store: one row per activity of numeric features
+# collected from every processing stage (metrics, training
+# load, zones, intervals, run classifier, stream quality) plus
+# a few derived ratios, kept in the "feature_store" table.
+#
+# Every row records its lineage:
+#   source_version - hash of the source values it was built from
+#   code_version   - FEATURE_VERSION when it was built
+# A refresh reads the joined source values (one query, no
+# streams), and only rows whose hash or version changed are
+# recomputed and written, so after a sync just the new or
+# re-processed activities are touched.
+#
+# Exports stream the table in batches, so the dataset never has
+# to fit in memory:
+#   data_processed/training_dataset.csv
+#   data_processed/training_dataset.parquet  (if pyarrow is installed)
+#
+# Also rewrites the analytics snapshot (database/snapshot.py).
+#
+# Run last in the pipeline (from the pro/ folder):
+#   python -m processing.feature_store            (refresh + export)
+#   python -m processing.feature_store --no-export
+# ---------------------------------------------------------
+
+
+# Bump when feature definitions change to rebuild every row
+FEATURE_VERSION = 1
+
+OUTPUT_DIR = "data_processed"
+DATASET_NAME = "training_dataset"
+EXPORT_BATCH_SIZE = 1000
+
+
+# Source values, one row per activity (column name -> SQL expression)
+SOURCE_COLUMNS = {
+    "date": "substr(a.start_date, 1, 10)",
+    "sport_type": "a.sport_type",
+    "distance": "a.distance",
+    "moving_time": "a.moving_time",
+    "elapsed_time": "a.elapsed_time",
+    "elevation_gain": "a.total_elevation_gain",
+    "average_speed": "a.average_speed",
+    "max_speed": "a.max_speed",
+    "average_heartrate": "a.average_heartrate",
+    "max_heartrate": "a.max_heartrate",
+    "workout_type": "a.workout_type",
+    "gap_speed": "m.gap_speed",
+    "avg_power": "m.avg_power",
+    "normalized_power": "m.normalized_power",
+    "trimp_banister": "l.trimp_banister",
+    "trimp_edwards": "l.trimp_edwards",
+    "hr_z1": "z.hr_z1", "hr_z2": "z.hr_z2", "hr_z3": "z.hr_z3", "hr_z4": "z.hr_z4", "hr_z5": "z.hr_z5",
+    "pace_z1": "z.pace_z1", "pace_z2": "z.pace_z2", "pace_z3": "z.pace_z3", "pace_z4": "z.pace_z4",
+    "pace_z5": "z.pace_z5",
+    "rep_count": "i.rep_count",
+    "avg_rep_pace": "i.avg_rep_pace",
+    "avg_recovery_pace": "i.avg_recovery_pace",
+    "run_type": "r.label",
+    "relative_pace": "r.relative_pace",
+    "pace_cv": "r.pace_cv",
+    "stream_quality": "q.quality",
+    "ctl": "t.ctl",
+    "atl": "t.atl",
+    "tsb": "t.tsb"
+}
+
+# Computed here from the source values
+DERIVED_COLUMNS = ("pace", "gap_pace", "elevation_per_km", "meters_per_beat", "pause_fraction")
+
+FEATURE_COLUMNS = tuple(SOURCE_COLUMNS) + DERIVED_COLUMNS
+
+# Everything else is numeric
+TEXT_COLUMNS = ("source_version", "code_version", "date", "sport_type", "run_type")
+
+SOURCE_QUERY = f"""
+    SELECT a.id, {", ".join(SOURCE_COLUMNS.values())}
+    FROM activities a
+    LEFT JOIN metrics m ON m.activity_id = a.id
+    LEFT JOIN activity_load l ON l.activity_id = a.id
+    LEFT JOIN activity_zones z ON z.activity_id = a.id
+    LEFT JOIN interval_summary i ON i.activity_id = a.id
+    LEFT JOIN run_features r ON r.activity_id = a.id
+    LEFT JOIN stream_quality q ON q.activity_id = a.id
+    LEFT JOIN training_load t ON t.date = l.date
+    ORDER BY a.start_date
+"""
+
+
+def source_version(values):
+    """Hash of one activity's source values."""
+    return hashlib.sha1(repr(values).encode()).hexdigest()[:12]
+
+
+def column(rows, name):
+    """One source column of a batch of rows as a float array (NULL -> NaN)."""
+    i = 1 + list(SOURCE_COLUMNS).index(name)
+    return np.array([row[i] for row in rows], dtype=float)
+
+
+def derive_features(rows):
+    """Derived feature columns for a batch of source rows (vectorized)."""
+    distance = column(rows, "distance")
+    moving_time = column(rows, "moving_time")
+    elapsed_time = column(rows, "elapsed_time")
+    gap_speed = column(rows, "gap_speed")
+    average_speed = column(rows, "average_speed")
+    average_hr = column(rows, "average_heartrate")
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        derived = np.column_stack([
+            moving_time / distance * METERS_PER_MILE,
+            METERS_PER_MILE / gap_speed,
+            column(rows, "elevation_gain") / (distance / 1000),
+            average_speed * 60 / average_hr,
+            1 - moving_time / elapsed_time
+        ])
+    return np.where(np.isfinite(derived), derived, np.nan)
+
+
+def refresh_features(cursor):
+    """Recompute stale feature rows. Returns (stale, deleted, total) counts."""
+    stored = {
+        activity_id: (source, code)
+        for activity_id, source, code in cursor.execute(
+            "SELECT activity_id, source_version, code_version FROM feature_store")
+    }
+
+    code = str(FEATURE_VERSION)
+    cursor.execute(SOURCE_QUERY)
+    stale, total = [], 0
+    for row in cursor.fetchall():
+        total += 1
+        version = source_version(row[1:])
+        if stored.get(row[0]) != (version, code):
+            stale.append((row, version))
+
+    if stale:
+        rows = [row for row, _ in stale]
+        derived = derive_features(rows).tolist()
+
+        cursor.executemany(f"""
+            INSERT OR REPLACE INTO feature_store (
+                activity_id, source_version, code_version, {", ".join(FEATURE_COLUMNS)}
+            ) VALUES (?, ?, ?, {", ".join("?" * len(FEATURE_COLUMNS))})
+        """, [
+            (row[0], version, code) + tuple(row[1:])
+            + tuple(None if np.isnan(v) else v for v in values)
+            for (row, version), values in zip(stale, derived)
+        ])
+
+    # Activities deleted from the source
+    cursor.execute("DELETE FROM feature_store WHERE activity_id NOT IN (SELECT id FROM activities)")
+    return len(stale), cursor.rowcount, total
+
+
+def iter_feature_batches(cursor, batch_size=EXPORT_BATCH_SIZE):
+    """Yield (column names, rows) batches of the feature store, oldest first."""
+    cursor.execute("SELECT * FROM feature_store ORDER BY date, activity_id")
+    names = [d[0] for d in cursor.description]
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield names, rows
+
+
+def export_csv(cursor, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        header_written = False
+        for names, rows in iter_feature_batches(cursor):
+            if not header_written:
+                writer.writerow(names)
+                header_written = True
+            writer.writerows(rows)
+
+
+def export_parquet(cursor, path):
+    """Parquet copy of the feature store, written one row group per batch."""
+    writer = None
+    try:
+        for names, rows in iter_feature_batches(cursor):
+            if writer is None:
+                schema = pyarrow.schema([
+                    (name, pyarrow.int64() if name == "activity_id"
+                     else pyarrow.string() if name in TEXT_COLUMNS
+                     else pyarrow.float64())
+                    for name in names
+                ])
+                writer = pyarrow.parquet.ParquetWriter(path, schema)
+            table = pyarrow.Table.from_pydict(
+                {name: [row[i] for row in rows] for i, name in enumerate(names)},
+                schema=schema
+            )
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def export_dataset(cursor, output_dir=OUTPUT_DIR):
+    os.makedirs(output_dir, exist_ok=True)
+
+    csv_path = os.path.join(output_dir, f"{DATASET_NAME}.csv")
+    export_csv(cursor, csv_path)
+    print(f"Exported {csv_path}")
+
+    if pyarrow is not None:
+        parquet_path = os.path.join(output_dir, f"{DATASET_NAME}.parquet")
+        export_parquet(cursor, parquet_path)
+        print(f"Exported {parquet_path}")
+
+
+def update_feature_store(export=True):
+    conn = sqlite3.connect("strava.db")
+    cursor = conn.cursor()
+
+    stale, deleted, total = refresh_features(cursor)
+    changed = stale > 0 or deleted > 0
+    # Only a real change invalidates the backend's response cache
+    if changed:
+        bump_data_version(cursor)
+    conn.commit()
+    print(f"Feature store: recomputed {stale} of {total} activities, removed {deleted}.")
+
+    if export:
+        export_dataset(cursor)
+
+    conn.close()
+
+    # The aggregates may have changed, so refresh the analytics snapshot
+    write_snapshot()
+
+
+if __name__ == "__main__":
+    update_feature_store(export="--no-export" not in sys.argv)
@@ -0,0 +1,243 @@
+import sqlite3
+import glob
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from database.database import bump_data_version
+
+# ---------------------------------------------------------
+# Route geometry: decodes every activity's GPS track once and
+# stores it in the "routes" table as packed float32
+# (lat, lng) pairs with a precomputed bounding box, start / end
+# point and length, so maps and spatial queries never have to
+# re-decode polylines or scan per-second stream rows.
+#
+# Track source, best first:
+#   1. map.polyline from the detailed activity JSON
+#   2. lat / lng columns of the streams table
+#   3. map.summary_polyline (detailed JSON, else activities_raw.json)
+# The summary polyline is also kept as a light overview track.
+#
+# Polylines are decoded in one batch: all strings are joined
+# into a single byte array and the varint / zigzag / delta
+# decoding is done with NumPy over the whole batch at once.
+#
+# New routes are also added to the R*Tree indexes that
+# processing/spatial.py queries.
+#
+# Only activities without a route are decoded.
+# Run from the pro/ folder:
+#   python -m processing.geometry
+#   python -m processing.geometry --rebuild
+# ---------------------------------------------------------
+
+
+DETAILED_DIR = "data_raw/detailed_activities"
+RAW_ACTIVITIES = "data_raw/activities_raw.json"
+
+POLYLINE_PRECISION = 1e5
+EARTH_RADIUS = 6371008.8  # meters
+
+
+def decode_polylines(polylines):
+    """
+    Decode a batch of Google encoded polylines.
+    Returns a list with one (n, 2) float64 array of (lat, lng) per
+    string; empty or malformed strings give an empty array.
+    """
+    # A string whose last byte says "more follows" would run into the next one
+    polylines = [p if p and p.isascii() and ord(p[-1]) - 63 < 0x20 else "" for p in polylines]
+    lengths = np.array([len(p) for p in polylines], dtype=np.int64)
+    chunks = np.frombuffer("".join(polylines).encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    if len(chunks) == 0:
+        return [np.empty((0, 2)) for _ in polylines]
+
+    # Varints: 5 payload bits per byte, low chunk first; the 0x20 bit means "more follows"
+    last_byte = (chunks & 0x20) == 0
+    value_end = np.flatnonzero(last_byte)
+    value_start = np.r_[0, value_end[:-1] + 1]
+    value_id = np.r_[0, np.cumsum(last_byte)[:-1]]
+    shift = np.minimum(5 * (np.arange(len(chunks)) - value_start[value_id]), 60)
+    raw = np.add.reduceat((chunks & 0x1f) << shift, value_start)
+
+    # Zigzag: the low bit is the sign
+    deltas = np.where(raw & 1, ~(raw >> 1), raw >> 1)
+
+    # Values per string; a valid string holds whole (lat, lng) pairs of legal characters
+    string_end = np.cumsum(lengths)
+    counts = np.bincount(np.searchsorted(string_end, value_end, side="right"), minlength=len(polylines))
+    owner = np.repeat(np.arange(len(polylines)), lengths)
+    bad_bytes = np.bincount(owner[(chunks < 0) | (chunks > 63)], minlength=len(polylines))
+    valid = (counts % 2 == 0) & (bad_bytes == 0)
+
+    # Deltas alternate lat, lng; positions are running sums restarted at each string.
+    # Odd-length strings are padded so pairs stay aligned for the strings after them.
+    pair_counts = (counts + 1) // 2
+    pair_start = np.cumsum(pair_counts) - pair_counts
+    index_in_string = np.arange(len(deltas)) - np.repeat(np.cumsum(counts) - counts, counts)
+    padded = np.zeros(2 * pair_counts.sum(), dtype=np.int64)
+    padded[2 * np.repeat(pair_start, counts) + index_in_string] = deltas
+    positions = np.cumsum(padded.reshape(-1, 2), axis=0)
+
+    routes = []
+    for ok, first, n_pairs in zip(valid.tolist(), pair_start.tolist(), pair_counts.tolist()):
+        last = first + n_pairs
+        if not ok or first == last:
+            routes.append(np.empty((0, 2)))
+            continue
+        base = positions[first - 1] if first else 0
+        routes.append((positions[first:last] - base) / POLYLINE_PRECISION)
+    return routes
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    """Great-circle distance in meters between points given in degrees (broadcasts)."""
+    lat1, lng1, lat2, lng2 = (np.radians(v) for v in (lat1, lng1, lat2, lng2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def segment_lengths(coords):
+    """Length (m) of each segment of an (n, 2) lat / lng track."""
+    return haversine(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1])
+
+
+def pack_coords(coords):
+    return np.ascontiguousarray(coords, dtype=np.float32).tobytes()
+
+
+def unpack_coords(blob):
+    """(n, 2) float32 lat / lng array from a routes BLOB."""
+    if blob is None:
+        return np.empty((0, 2), dtype=np.float32)
+    return np.frombuffer(blob, dtype=np.float32).reshape(-1, 2)
+
+
+def load_route(cursor, activity_id, summary=False):
+    """One activity's stored track (or overview track), or None."""
+    column = "summary_coords" if summary else "coords"
+    cursor.execute(f"SELECT {column} FROM routes WHERE activity_id = ?", (activity_id,))
+    row = cursor.fetchone()
+    return unpack_coords(row[0]) if row else None
+
+
+def read_polylines(detailed_dir=DETAILED_DIR, raw_path=RAW_ACTIVITIES):
+    """{activity_id: (polyline, summary_polyline)} from the raw JSON files."""
+    polylines = {}
+    if os.path.exists(raw_path):
+        with open(raw_path, "r") as f:
+            for a in json.load(f):
+                summary = (a.get("map") or {}).get("summary_polyline") or ""
+                polylines[a["id"]] = ("", summary)
+
+    for path in glob.glob(os.path.join(detailed_dir, "detailed_*.json")):
+        with open(path, "r") as f:
+            a = json.load(f)
+        route_map = a.get("map") or {}
+        summary = route_map.get("summary_polyline") or polylines.get(a["id"], ("", ""))[1]
+        polylines[a["id"]] = (route_map.get("polyline") or "", summary)
+    return polylines
+
+
+def stream_tracks(cursor, activity_ids):
+    """{activity_id: (n, 2) lat / lng} from the streams table."""
+    tracks = {}
+    for activity_id in activity_ids:
+        cursor.execute("""
+            SELECT lat, lng FROM streams
+            WHERE activity_id = ? AND lat IS NOT NULL AND lng IS NOT NULL
+            ORDER BY time
+        """, (activity_id,))
+        rows = cursor.fetchall()
+        if len(rows) >= 2:
+            tracks[activity_id] = np.array(rows, dtype=float)
+    return tracks
+
+
+def route_row(activity_id, source, coords, summary_coords):
+    length = float(segment_lengths(coords).sum()) if len(coords) > 1 else 0.0
+    low, high = coords.min(axis=0), coords.max(axis=0)
+    return (
+        activity_id, source, len(coords), pack_coords(coords), pack_coords(summary_coords),
+        float(low[0]), float(low[1]), float(high[0]), float(high[1]),
+        float(coords[0, 0]), float(coords[0, 1]), float(coords[-1, 0]), float(coords[-1, 1]),
+        length
+    )
+
+
+def index_routes(cursor):
+    """Add routes missing from the R*Tree indexes (start point and bounding box)."""
+    cursor.execute("""
+        INSERT INTO route_start_index (id, min_lat, max_lat, min_lng, max_lng)
+        SELECT activity_id, start_lat, start_lat, start_lng, start_lng FROM routes
+        WHERE activity_id NOT IN (SELECT id FROM route_start_index)
+    """)
+    added = cursor.rowcount
+    cursor.execute("""
+        INSERT INTO route_bbox_index (id, min_lat, max_lat, min_lng, max_lng)
+        SELECT activity_id, min_lat, max_lat, min_lng, max_lng FROM routes
+        WHERE activity_id NOT IN (SELECT id FROM route_bbox_index)
+    """)
+    return added
+
+
+def build_routes(rebuild=False):
+    conn = sqlite3.connect("strava.db")
+    cursor = conn.cursor()
+
+    if rebuild:
+        cursor.execute("DELETE FROM routes")
+        cursor.execute("DELETE FROM route_start_index")
+        cursor.execute("DELETE FROM route_bbox_index")
+    done = {row[0] for row in cursor.execute("SELECT activity_id FROM routes")}
+    pending = [row[0] for row in cursor.execute("SELECT id FROM activities ORDER BY start_date")
+               if row[0] not in done]
+    print(f"Building routes for {len(pending)} activities...")
+
+    started = time.perf_counter()
+    polylines = read_polylines()
+    full = [polylines.get(a, ("", ""))[0] for a in pending]
+    summary = [polylines.get(a, ("", ""))[1] for a in pending]
+    decoded = decode_polylines(full + summary)
+    full_coords, summary_coords = decoded[:len(pending)], decoded[len(pending):]
+
+    no_polyline = [a for a, coords in zip(pending, full_coords) if len(coords) < 2]
+    streams = stream_tracks(cursor, no_polyline)
+
+    rows = []
+    for activity_id, coords, overview in zip(pending, full_coords, summary_coords):
+        if len(coords) >= 2:
+            source = "polyline"
+        elif activity_id in streams:
+            coords, source = streams[activity_id], "streams"
+        elif len(overview) >= 2:
+            coords, source = overview, "summary_polyline"
+        else:
+            continue
+        rows.append(route_row(activity_id, source, coords, overview if len(overview) >= 2 else coords))
+
+    cursor.executemany("""
+        INSERT OR REPLACE INTO routes (
+            activity_id, source, points, coords, summary_coords,
+            min_lat, min_lng, max_lat, max_lng,
+            start_lat, start_lng, end_lat, end_lng, length
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    indexed = index_routes(cursor)
+    if rows or rebuild:
+        bump_data_version(cursor)
+    conn.commit()
+    conn.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"Stored {len(rows)} routes ({len(pending) - len(rows)} activities have no GPS) in {elapsed:.2f}s.")
+    print(f"Added {indexed} routes to the spatial index.")
+
+
+if __name__ == "__main__":
+    build_routes(rebuild="--rebuild" in sys.argv)
@@ -0,0 +1,368 @@
+import sqlite3
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from processing.geometry import unpack_coords
+
+# ---------------------------------------------------------
+# Personal heatmap of every run, as Web-Mercator map tiles.
+#
+# Build (incremental):
+# 1. Project each new route to global pixel coordinates at
+#    every zoom in ZOOM_LEVELS and densify its segments to one
+#    point per pixel
+# 2. Count each pixel once per activity (a loop that crosses
+#    itself doesn't double count)
+# 3. Add the counts into 256x256 count tiles with np.bincount;
+#    only tiles the new activities touch are read and rewritten
+#    (stored sparse: the non-zero pixels and their counts)
+#
+# Count tiles live in data_processed/heatmap/{z}/{x}/{y}.npy.
+# state.json records which activities are already in them
+# plus the busiest pixel per zoom, so a run never re-reads
+# the history. Counts can't be taken back out, so when a run in
+# state.json was deleted or retyped the tiles are rebuilt.
+#
+# Render: counts -> log scale normalized by the busiest pixel
+# at that zoom -> gamma -> color ramp -> PNG, at request time,
+# so gamma can change without rebuilding anything.
+#
+# Run from the pro/ folder:
+#   python -m processing.heatmap                 (add new runs)
+#   python -m processing.heatmap --rebuild
+#   python -m processing.heatmap --serve [PORT]  (tiles at
+#       http://localhost:PORT/{z}/{x}/{y}.png?gamma=0.5)
+# ---------------------------------------------------------
+
+
+HEATMAP_DIR = "data_processed/heatmap"
+STATE_FILE = "state.json"
+HEATMAP_VERSION = 1
+
+ZOOM_LEVELS = range(10, 17)
+TILE_SIZE = 256
+BATCH_SIZE = 200            # activities rasterized together
+DEFAULT_GAMMA = 0.5
+DEFAULT_PORT = 8010
+
+# Stored tile: (pixel index within the tile, count) for non-zero pixels only
+TILE_DTYPE = np.dtype([("pixel", "<u2"), ("count", "<u4")])
+
+# Color ramp stops: intensity -> RGB (dark red -> orange -> yellow -> white)
+RAMP_STOPS = np.array([0.0, 0.35, 0.7, 1.0])
+RAMP_COLORS = np.array([
+    [120, 0, 0],
+    [230, 80, 0],
+    [255, 210, 40],
+    [255, 255, 255]
+])
+
+
+# ------------------------------
+# Projection and rasterization
+# ------------------------------
+
+def to_pixels(coords, zoom):
+    """(n, 2) lat / lng -> (n, 2) global Web-Mercator pixel x / y at zoom."""
+    scale = TILE_SIZE * 2 ** zoom
+    lat = np.radians(np.clip(coords[:, 0], -85.05112878, 85.05112878))
+    x = (coords[:, 1] + 180) / 360 * scale
+    y = (1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / np.pi) / 2 * scale
+    return np.column_stack([x, y])
+
+
+def densify(pixels, owner):
+    """
+    Points along every segment about one pixel apart, plus each
+    track's last point. Segments never join different tracks.
+    Returns (points, point_owner).
+    """
+    same_track = owner[1:] == owner[:-1]
+    a, b = pixels[:-1][same_track], pixels[1:][same_track]
+    seg_owner = owner[:-1][same_track]
+
+    steps = np.maximum(np.ceil(np.abs(b - a).max(axis=1)), 1).astype(np.int64)
+    seg = np.repeat(np.arange(len(a)), steps)
+    frac = (np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)) / steps[seg]
+    points = a[seg] + frac[:, None] * (b - a)[seg]
+
+    # Track ends (and single-point tracks) aren't the start of any segment
+    ends = np.r_[~same_track, True]
+    return np.concatenate([points, pixels[ends]]), np.concatenate([seg_owner[seg], owner[ends]])
+
+
+def tile_counts(pixels, owner, zoom):
+    """
+    {(x, y): 256x256 counts} for one batch of tracks at one zoom,
+    counting each pixel at most once per activity.
+    """
+    points, point_owner = densify(pixels, owner)
+    size = TILE_SIZE * 2 ** zoom
+    px = np.clip(points[:, 0].astype(np.int64), 0, size - 1)
+    py = np.clip(points[:, 1].astype(np.int64), 0, size - 1)
+    pixel = py * size + px
+
+    # One count per (activity, pixel)
+    order = np.lexsort((point_owner, pixel))
+    pixel, point_owner = pixel[order], point_owner[order]
+    first = np.r_[True, (pixel[1:] != pixel[:-1]) | (point_owner[1:] != point_owner[:-1])]
+    pixel = pixel[first]
+
+    # Group by tile and count each tile's pixels
+    py, px = pixel // size, pixel % size
+    tile = (px // TILE_SIZE) * 2 ** zoom + py // TILE_SIZE
+    local = (py % TILE_SIZE) * TILE_SIZE + px % TILE_SIZE
+    order = np.argsort(tile, kind="stable")
+    tile, local = tile[order], local[order]
+
+    tiles, starts = np.unique(tile, return_index=True)
+    ends = np.r_[starts[1:], len(tile)]
+    counts = {}
+    for t, s, e in zip(tiles.tolist(), starts.tolist(), ends.tolist()):
+        grid = np.bincount(local[s:e], minlength=TILE_SIZE * TILE_SIZE)
+        counts[(t // 2 ** zoom, t % 2 ** zoom)] = grid.reshape(TILE_SIZE, TILE_SIZE)
+    return counts
+
+
+# ------------------------------
+# Count tile cache
+# ------------------------------
+
+def tile_path(z, x, y, heatmap_dir=HEATMAP_DIR):
+    return os.path.join(heatmap_dir, str(z), str(x), f"{y}.npy")
+
+
+def load_tile(z, x, y, heatmap_dir=HEATMAP_DIR):
+    """Stored 256x256 counts for one tile, or None if nothing was ever drawn there."""
+    path = tile_path(z, x, y, heatmap_dir)
+    if not os.path.exists(path):
+        return None
+    sparse = np.load(path)
+    counts = np.zeros(TILE_SIZE * TILE_SIZE, dtype=np.uint32)
+    counts[sparse["pixel"]] = sparse["count"]
+    return counts.reshape(TILE_SIZE, TILE_SIZE)
+
+
+def add_to_tile(z, x, y, counts, heatmap_dir=HEATMAP_DIR):
+    """Add counts into the stored tile. Returns the tile's busiest pixel."""
+    existing = load_tile(z, x, y, heatmap_dir)
+    total = counts.astype(np.uint32) if existing is None else existing + counts.astype(np.uint32)
+
+    # Most of a tile is empty, so only non-zero pixels are stored
+    nonzero = np.flatnonzero(total)
+    sparse = np.empty(len(nonzero), dtype=TILE_DTYPE)
+    sparse["pixel"] = nonzero
+    sparse["count"] = total.ravel()[nonzero]
+
+    path = tile_path(z, x, y, heatmap_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, sparse)
+    os.replace(path + ".tmp", path)
+    return int(total.max())
+
+
+def load_state(heatmap_dir=HEATMAP_DIR):
+    path = os.path.join(heatmap_dir, STATE_FILE)
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            state = json.load(f)
+        if state.get("version") == HEATMAP_VERSION and state.get("zooms") == list(ZOOM_LEVELS):
+            return state
+    return {"version": HEATMAP_VERSION, "zooms": list(ZOOM_LEVELS), "activities": [], "max_count": {}}
+
+
+def save_state(state, heatmap_dir=HEATMAP_DIR):
+    os.makedirs(heatmap_dir, exist_ok=True)
+    path = os.path.join(heatmap_dir, STATE_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+
+def clear_tiles(heatmap_dir=HEATMAP_DIR):
+    """Delete every count tile and the state file."""
+    if not os.path.isdir(heatmap_dir):
+        return
+    for root, _, files in os.walk(heatmap_dir, topdown=False):
+        for filename in files:
+            if filename.endswith(".npy") or filename == STATE_FILE:
+                os.remove(os.path.join(root, filename))
+        if root != heatmap_dir and not os.listdir(root):
+            os.rmdir(root)
+
+
+def load_batch(cursor, activity_ids):
+    """(coords, owner) of a batch of routes concatenated."""
+    cursor.execute(f"""
+        SELECT coords FROM routes WHERE activity_id IN ({", ".join("?" * len(activity_ids))})
+    """, activity_ids)
+    tracks = [unpack_coords(row[0]).astype(float) for row in cursor.fetchall()]
+    tracks = [t for t in tracks if len(t)]
+    if not tracks:
+        return np.empty((0, 2)), np.empty(0, dtype=np.int64)
+    owner = np.repeat(np.arange(len(tracks)), [len(t) for t in tracks])
+    return np.concatenate(tracks), owner
+
+
+def update_heatmap(rebuild=False, heatmap_dir=HEATMAP_DIR):
+    conn = sqlite3.connect("strava.db")
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        SELECT r.activity_id FROM routes r
+        JOIN activities a ON a.id = r.activity_id
+        WHERE a.sport_type = 'Run'
+        ORDER BY a.start_date
+    """)
+    runs = [row[0] for row in cursor.fetchall()]
+
+    # Counts can only be added, so a run that was deleted (or is no
+    # longer a run) since it was drawn forces a rebuild
+    removed = set(load_state(heatmap_dir)["activities"]) - set(runs)
+    if removed and not rebuild:
+        print(f"{len(removed)} runs were removed since the last update - rebuilding.")
+        rebuild = True
+
+    if rebuild:
+        clear_tiles(heatmap_dir)
+    state = load_state(heatmap_dir)
+    done = set(state["activities"])
+    pending = [a for a in runs if a not in done]
+    print(f"Adding {len(pending)} runs to the heatmap...")
+
+    started = time.perf_counter()
+    touched = set()
+    for start in range(0, len(pending), BATCH_SIZE):
+        batch = pending[start:start + BATCH_SIZE]
+        coords, owner = load_batch(cursor, batch)
+
+        if len(coords):
+            for zoom in ZOOM_LEVELS:
+                for (x, y), counts in tile_counts(to_pixels(coords, zoom), owner, zoom).items():
+                    busiest = add_to_tile(zoom, x, y, counts, heatmap_dir)
+                    key = str(zoom)
+                    state["max_count"][key] = max(state["max_count"].get(key, 0), busiest)
+                    touched.add((zoom, x, y))
+
+        # Record progress after each batch's tiles are on disk
+        state["activities"].extend(batch)
+        save_state(state, heatmap_dir)
+
+    conn.close()
+    elapsed = time.perf_counter() - started
+    print(f"Updated {len(touched)} tiles in {elapsed:.1f}s ({heatmap_dir}/).")
+
+
+# ------------------------------
+# Rendering
+# ------------------------------
+
+def png_bytes(rgba):
+    """Encode an (h, w, 4) uint8 array as a PNG (no dependencies beyond zlib)."""
+    height, width = rgba.shape[:2]
+
+    def chunk(kind, data):
+        return (struct.pack(">I", len(data)) + kind + data
+                + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff))
+
+    # Filter type 0 (none) at the start of every row
+    raw = np.hstack([np.zeros((height, 1), dtype=np.uint8), rgba.reshape(height, -1)]).tobytes()
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw, 6))
+            + chunk(b"IEND", b""))
+
+
+def colorize(counts, max_count, gamma=DEFAULT_GAMMA):
+    """Counts -> RGBA: log scale, normalized by max_count, then gamma and the color ramp."""
+    intensity = np.log1p(counts) / np.log1p(max(max_count, 1))
+    intensity = np.clip(intensity, 0, 1) ** gamma
+
+    rgba = np.zeros(counts.shape + (4,), dtype=np.uint8)
+    for channel in range(3):
+        rgba[..., channel] = np.interp(intensity, RAMP_STOPS, RAMP_COLORS[:, channel])
+    rgba[..., 3] = np.where(counts > 0, 80 + 175 * intensity, 0)
+    return rgba
+
+
+@lru_cache(maxsize=1)
+def max_counts(state_mtime_ns, heatmap_dir=HEATMAP_DIR):
+    """Busiest pixel per zoom, re-read only when state.json changes."""
+    return load_state(heatmap_dir)["max_count"]
+
+
+@lru_cache(maxsize=512)
+def render_tile(z, x, y, gamma, max_count, mtime_ns, heatmap_dir=HEATMAP_DIR):
+    """
+    PNG for one tile. Cached on the count tile's mtime and the
+    zoom's normalization, so only tiles an update changed are re-rendered.
+    """
+    counts = load_tile(z, x, y, heatmap_dir)
+    if counts is None:
+        counts = np.zeros((TILE_SIZE, TILE_SIZE), dtype=np.uint32)
+    return png_bytes(colorize(counts, max_count, gamma))
+
+
+def tile_png(z, x, y, gamma=DEFAULT_GAMMA, heatmap_dir=HEATMAP_DIR):
+    def mtime(path):
+        return os.stat(path).st_mtime_ns if os.path.exists(path) else 0
+
+    max_count = max_counts(mtime(os.path.join(heatmap_dir, STATE_FILE)), heatmap_dir).get(str(z), 1)
+    return render_tile(z, x, y, round(gamma, 3), max_count, mtime(tile_path(z, x, y, heatmap_dir)), heatmap_dir)
+
+
+class TileHandler(BaseHTTPRequestHandler):
+    """GET /{z}/{x}/{y}.png[?gamma=G]"""
+
+    def do_GET(self):
+        path, _, query = self.path.partition("?")
+        try:
+            z, x, y = path.strip("/").removesuffix(".png").split("/")
+            z, x, y = int(z), int(x), int(y)
+            params = dict(p.split("=", 1) for p in query.split("&") if "=" in p)
+            gamma = float(params.get("gamma", DEFAULT_GAMMA))
+        except ValueError:
+            self.send_error(404)
+            return
+        if gamma <= 0 or not 0 <= x < 2 ** z or not 0 <= y < 2 ** z:
+            self.send_error(404)
+            return
+
+        body = tile_png(z, x, y, gamma)
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Cache-Control", "max-age=60")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=DEFAULT_PORT):
+    server = ThreadingHTTPServer(("127.0.0.1", port), TileHandler)
+    print(f"Serving heatmap tiles at http://localhost:{port}/{{z}}/{{x}}/{{y}}.png")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+
+if __name__ == "__main__":
+    if "--serve" in sys.argv:
+        args = sys.argv[sys.argv.index("--serve") + 1:]
+        serve(int(args[0]) if args else DEFAULT_PORT)
+    else:
+        update_heatmap(rebuild="--rebuild" in sys.argv)
@@ -0,0 +1,176 @@
+import sqlite3
+import hashlib
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from processing.streams import load_streams, activity_ids_with_streams, STREAM_COLUMNS, PAUSE_GAP
+
+# ---------------------------------------------------------
+# Resamples an activity's irregular streams onto uniform grids:
+#
+# - time domain:     one sample per second from start to finish
+# - distance domain: one sample every DISTANCE_STEP meters
+#
+# Gaps in the time stream longer than PAUSE_GAP seconds (from
+# processing.streams, shared with every stage) are auto-pause /
+# stopped time. On the time grid those seconds are kept but
+# flagged moving = False and their values are NaN (nothing is
+# interpolated across a pause). The distance grid skips pauses
+# naturally since distance doesn't advance.
+#
+# Results are cached in memory and as .npz files under
+# data_processed/resampled/<activity id>/, keyed by a hash of
+# the source stream rows, so repeat access is free and any change
+# to the stored streams invalidates the cache automatically.
+#
+# Run from the pro/ folder to warm the cache for every activity:
+#   python -m processing.resample
+# ---------------------------------------------------------
+
+
+DISTANCE_STEP = 10.0    # meters
+
+CACHE_DIR = "data_processed/resampled"
+MEMORY_CACHE_SIZE = 64  # activities
+
+# Bump when the resampling logic changes to invalidate old cache files
+RESAMPLE_VERSION = 2
+
+_memory_cache = OrderedDict()
+
+
+def resample_time(streams, hz=1, pause_gap=PAUSE_GAP):
+    """
+    Interpolate every stream onto a uniform time grid.
+    Returns the resampled arrays plus a boolean "moving" mask.
+    """
+    t = streams["time"]
+    if len(t) < 2:
+        return dict(streams, moving=np.ones(len(t), dtype=bool))
+
+    grid = np.arange(t[0], t[-1] + 1e-9, 1 / hz)
+
+    # A grid point is paused if it falls inside a gap longer than pause_gap
+    idx = np.clip(np.searchsorted(t, grid, side="right"), 1, len(t) - 1)
+    gap = t[idx] - t[idx - 1]
+    moving = (gap <= pause_gap) | (grid == t[idx - 1]) | (grid == t[idx])
+
+    out = {"time": grid, "moving": moving}
+    for name, values in streams.items():
+        if name == "time":
+            continue
+        valid = ~np.isnan(values)
+        if valid.sum() < 2:
+            out[name] = np.full(len(grid), np.nan)
+            continue
+        resampled = np.interp(grid, t[valid], values[valid])
+        out[name] = np.where(moving, resampled, np.nan)
+
+    return out
+
+
+def resample_distance(streams, step=DISTANCE_STEP):
+    """Interpolate every stream onto a uniform distance grid."""
+    d = np.fmax.accumulate(streams["distance"])
+
+    # Only samples where distance advances, so the x values are strictly increasing.
+    # Leading missing distances are skipped, so the first finite sample is kept.
+    previous = np.r_[-np.inf, d[:-1]]
+    advancing = d > np.where(np.isnan(previous), -np.inf, previous)  # NaN compares False
+    d_adv = d[advancing]
+    if len(d_adv) < 2:
+        return None
+
+    grid = np.arange(d_adv[0], d_adv[-1] + 1e-9, step)
+
+    out = {"distance": grid}
+    for name, values in streams.items():
+        if name == "distance":
+            continue
+        values = values[advancing]
+        valid = ~np.isnan(values)
+        if valid.sum() < 2:
+            out[name] = np.full(len(grid), np.nan)
+            continue
+        out[name] = np.interp(grid, d_adv[valid], values[valid])
+
+    return out
+
+
+def source_hash(cursor, activity_id):
+    """Cheap fingerprint of an activity's stream rows (one aggregate query)."""
+    totals = ", ".join(f"TOTAL({c})" for c in STREAM_COLUMNS)
+    cursor.execute(f"""
+        SELECT COUNT(*), MAX(id), {totals}
+        FROM streams WHERE activity_id = ?
+    """, (activity_id,))
+    fingerprint = repr((RESAMPLE_VERSION, PAUSE_GAP, DISTANCE_STEP) + cursor.fetchone())
+    return hashlib.sha1(fingerprint.encode()).hexdigest()[:12]
+
+
+def get_resampled(cursor, activity_id, domain="time"):
+    """
+    Resampled streams for one activity ("time" or "distance" domain),
+    from the memory cache, the on-disk cache, or freshly computed.
+    Returns None if the activity has no streams.
+    """
+    key_hash = source_hash(cursor, activity_id)
+    key = (activity_id, domain, key_hash)
+
+    if key in _memory_cache:
+        _memory_cache.move_to_end(key)
+        return _memory_cache[key]
+
+    activity_dir = os.path.join(CACHE_DIR, str(activity_id))
+    path = os.path.join(activity_dir, f"{domain}_{key_hash}.npz")
+    if os.path.exists(path):
+        with np.load(path) as cached:
+            result = {name: cached[name] for name in cached.files}
+    else:
+        streams = load_streams(cursor, activity_id)
+        if streams is None:
+            return None
+
+        if domain == "time":
+            result = resample_time(streams)
+        else:
+            result = resample_distance(streams)
+        if result is None:
+            return None
+
+        os.makedirs(activity_dir, exist_ok=True)
+        remove_stale_cache_files(activity_dir, domain)
+        np.savez(path, **result)
+
+    _memory_cache[key] = result
+    if len(_memory_cache) > MEMORY_CACHE_SIZE:
+        _memory_cache.popitem(last=False)
+    return result
+
+
+def remove_stale_cache_files(activity_dir, domain):
+    """Delete an activity's cache files built from older stream data."""
+    for filename in os.listdir(activity_dir):
+        if filename.startswith(f"{domain}_"):
+            os.remove(os.path.join(activity_dir, filename))
+
+
+def warm_cache():
+    conn = sqlite3.connect("strava.db")
+    cursor = conn.cursor()
+
+    activity_ids = activity_ids_with_streams(cursor)
+    print(f"Resampling streams for {len(activity_ids)} activities...")
+
+    for activity_id in activity_ids:
+        get_resampled(cursor, activity_id, "time")
+        get_resampled(cursor, activity_id, "distance")
+
+    conn.close()
+    print(f"Resampled streams cached in {CACHE_DIR}/")
+
+
+if __name__ == "__main__":
+    warm_cache()
@@ -0,0 +1,232 @@
+import sqlite3
+import hashlib
+import sys
+import time
+
+import numpy as np
+
+from processing.geometry import EARTH_RADIUS, segment_lengths, unpack_coords
+from processing.units import METERS_PER_MILE
+
+# ---------------------------------------------------------
+# Repeated-route detection: groups runs that follow the same
+# course into route clusters ("the usual 6-miler").
+#
+# Per new run:
+# 1. Signature - the set of ~CELL_METERS grid cells the
+#    track passes through (densified so no cell is skipped),
+#    compressed to a MinHash of NUM_HASHES values
+# 2. LSH - the MinHash is split into BANDS bands; runs that
+#    share any band bucket are candidates (runs with roughly
+#    half their cells in common or more), found with dict
+#    lookups instead of comparing against every run
+# 3. Candidates of similar length are confirmed with the
+#    discrete Frechet distance between the two tracks,
+#    resampled to FRECHET_POINTS points by distance
+# 4. The run joins the cluster of its closest confirmed
+#    match, or starts a new cluster
+#
+# Results: "route_clusters" (cluster per run + the run it
+# matched) and "route_lsh" (band buckets, so later runs can
+# be matched against the history without recomputing it).
+#
+# Run from the pro/ folder:
+#   python -m processing.route_matching
+#   python -m processing.route_matching --rebuild
+#   python -m processing.route_matching --show ACTIVITY_ID
+# ---------------------------------------------------------
+
+
+CELL_METERS = 100
+NUM_HASHES = 64
+BANDS = 16                  # 4 rows per band -> ~50% Jaccard threshold
+MAX_LENGTH_RATIO = 1.15
+FRECHET_POINTS = 64
+FRECHET_METERS = 150
+
+METERS_PER_DEGREE = np.pi * EARTH_RADIUS / 180
+
+# MinHash: h(x) = (a * x + b) mod p, p prime < 2^31 so a * x fits in 64 bits
+HASH_PRIME = 2_147_483_647
+_rng = np.random.default_rng(20240501)
+HASH_A = _rng.integers(1, HASH_PRIME, NUM_HASHES, dtype=np.int64)
+HASH_B = _rng.integers(0, HASH_PRIME, NUM_HASHES, dtype=np.int64)
+
+
+def resample_track(coords, n):
+    """n points evenly spaced by distance along an (m, 2) lat / lng track."""
+    distance = np.r_[0, np.cumsum(segment_lengths(coords))]
+    targets = np.linspace(0, distance[-1], n)
+    return np.column_stack([np.interp(targets, distance, coords[:, 0]),
+                            np.interp(targets, distance, coords[:, 1])])
+
+
+def grid_cells(coords):
+    """Ids of the CELL_METERS grid cells an (n, 2) lat / lng track passes through."""
+    length = segment_lengths(coords).sum()
+    points = resample_track(coords, max(int(length / (CELL_METERS / 4)), 2))
+
+    cell_lat = np.floor(points[:, 0] * METERS_PER_DEGREE / CELL_METERS).astype(np.int64)
+    # Fixed east-west cell width in degrees per latitude row, so cells tile the map
+    row_scale = np.cos(np.radians((cell_lat + 0.5) * CELL_METERS / METERS_PER_DEGREE))
+    cell_lng = np.floor(points[:, 1] * METERS_PER_DEGREE * row_scale / CELL_METERS).astype(np.int64)
+    return np.unique(cell_lat * 1_000_003 + cell_lng)
+
+
+def minhash(cells):
+    """NUM_HASHES-value MinHash signature of a set of cell ids."""
+    x = cells % HASH_PRIME
+    return ((x[:, None] * HASH_A + HASH_B) % HASH_PRIME).min(axis=0)
+
+
+def band_buckets(signature):
+    """One stable 63-bit bucket id per LSH band."""
+    rows = NUM_HASHES // BANDS
+    return [
+        int.from_bytes(hashlib.blake2b(band.tobytes(), digest_size=8).digest(), "big") >> 1
+        for band in signature.reshape(BANDS, rows)
+    ]
+
+
+def discrete_frechet(a, b):
+    """
+    Discrete Frechet distance (m) between two (n, 2) tracks in meters.
+    Dynamic program filled one anti-diagonal at a time.
+    """
+    d = np.hypot(a[:, None, 0] - b[None, :, 0], a[:, None, 1] - b[None, :, 1])
+    n, m = d.shape
+    c = np.full((n + 1, m + 1), np.inf)
+    c[0, 0] = 0
+    for k in range(2, n + m + 1):
+        i = np.arange(max(1, k - m), min(n, k - 1) + 1)
+        j = k - i
+        c[i, j] = np.maximum(d[i - 1, j - 1], np.minimum(np.minimum(c[i - 1, j], c[i, j - 1]), c[i - 1, j - 1]))
+    return float(c[n, m])
+
+
+def to_meters(tracks, lat0, lng0):
+    """Project lat / lng tracks to flat meters around (lat0, lng0)."""
+    scale = METERS_PER_DEGREE * np.cos(np.radians(lat0))
+    return [np.column_stack([(t[:, 1] - lng0) * scale, (t[:, 0] - lat0) * METERS_PER_DEGREE]) for t in tracks]
+
+
+def route_distance(a, b):
+    """Frechet distance between two resampled lat / lng tracks (inf if the ends are too far apart)."""
+    a, b = to_meters([a, b], a[0, 0], a[0, 1])
+    if max(np.hypot(*(a[0] - b[0])), np.hypot(*(a[-1] - b[-1]))) > FRECHET_METERS:
+        return np.inf
+    return discrete_frechet(a, b)
+
+
+def match_routes(rebuild=False):
+    conn = sqlite3.connect("strava.db")
+    cursor = conn.cursor()
+
+    if rebuild:
+        cursor.execute("DELETE FROM route_clusters")
+        cursor.execute("DELETE FROM route_lsh")
+
+    buckets = {}
+    for band, bucket, activity_id in cursor.execute("SELECT band, bucket, activity_id FROM route_lsh"):
+        buckets.setdefault((band, bucket), []).append(activity_id)
+    clusters = dict(cursor.execute("SELECT activity_id, cluster_id FROM route_clusters"))
+    next_cluster = max(clusters.values(), default=0) + 1
+
+    cursor.execute("""
+        SELECT r.activity_id, r.length FROM routes r
+        JOIN activities a ON a.id = r.activity_id
+        WHERE a.sport_type = 'Run' AND r.points >= 2
+        ORDER BY a.start_date
+    """)
+    lengths = dict(cursor.fetchall())
+    pending = [a for a in lengths if a not in clusters]
+    print(f"Matching routes for {len(pending)} runs...")
+
+    started = time.perf_counter()
+    resampled = {}
+
+    def track(activity_id):
+        if activity_id not in resampled:
+            cursor.execute("SELECT coords FROM routes WHERE activity_id = ?", (activity_id,))
+            coords = unpack_coords(cursor.fetchone()[0]).astype(float)
+            resampled[activity_id] = resample_track(coords, FRECHET_POINTS)
+        return resampled[activity_id]
+
+    compared = 0
+    for activity_id in pending:
+        cursor.execute("SELECT coords FROM routes WHERE activity_id = ?", (activity_id,))
+        coords = unpack_coords(cursor.fetchone()[0]).astype(float)
+        keys = list(enumerate(band_buckets(minhash(grid_cells(coords)))))
+
+        # 2. LSH candidates of similar length
+        candidates = {c for key in keys for c in buckets.get(key, ())}
+        length = lengths[activity_id]
+        candidates = [c for c in candidates if c in lengths
+                      and max(length, lengths[c]) <= MAX_LENGTH_RATIO * max(min(length, lengths[c]), 1)]
+
+        # 3. Confirm with Frechet, keep the closest
+        best, best_distance = None, np.inf
+        for candidate in candidates:
+            compared += 1
+            distance = route_distance(track(activity_id), track(candidate))
+            if distance <= FRECHET_METERS and distance < best_distance:
+                best, best_distance = candidate, distance
+
+        # 4. Join or start a cluster
+        if best is None:
+            cluster_id, next_cluster = next_cluster, next_cluster + 1
+        else:
+            cluster_id = clusters[best]
+        clusters[activity_id] = cluster_id
+
+        cursor.execute("""
+            INSERT OR REPLACE INTO route_clusters (activity_id, cluster_id, matched_activity_id, frechet_distance)
+            VALUES (?, ?, ?, ?)
+        """, (activity_id, cluster_id, best, None if best is None else best_distance))
+        cursor.executemany("INSERT INTO route_lsh (band, bucket, activity_id) VALUES (?, ?, ?)",
+                           [key + (activity_id,) for key in keys])
+        for key in keys:
+            buckets.setdefault(key, []).append(activity_id)
+
+    conn.commit()
+    conn.close()
+
+    elapsed = time.perf_counter() - started
+    _, runs_per_route = np.unique(list(clusters.values()), return_counts=True)
+    print(f"Compared {compared} candidate pairs in {elapsed:.1f}s; "
+          f"{len(runs_per_route)} routes, {int((runs_per_route > 1).sum())} run more than once.")
+
+
+def same_route_runs(cursor, activity_id):
+    """[(id, date, name, distance, moving_time)] of every run in activity_id's route cluster."""
+    cursor.execute("""
+        SELECT a.id, substr(a.start_date, 1, 10), a.name, a.distance, a.moving_time
+        FROM route_clusters c
+        JOIN activities a ON a.id = c.activity_id
+        WHERE c.cluster_id = (SELECT cluster_id FROM route_clusters WHERE activity_id = ?)
+        ORDER BY a.start_date
+    """, (activity_id,))
+    return cursor.fetchall()
+
+
+def show_route(activity_id):
+    conn = sqlite3.connect("strava.db")
+    runs = same_route_runs(conn.cursor(), activity_id)
+    conn.close()
+
+    if not runs:
+        print(f"No route cluster for activity {activity_id}.")
+        return
+    print(f"{len(runs)} runs on this route:")
+    for run_id, date, name, distance, moving_time in runs:
+        pace = moving_time / distance * METERS_PER_MILE
+        marker = "  <-" if run_id == activity_id else ""
+        print(f"{date}  {distance / METERS_PER_MILE:5.2f} mi  {moving_time // 60:3d}:{moving_time % 60:02d}  "
+              f"{int(pace // 60)}:{int(pace % 60):02d}/mi  {name}{marker}")
+
+
+if __name__ == "__main__":
+    if "--show" in sys.argv:
+        show_route(int(sys.argv[sys.argv.index("--show") + 1]))
+    else:
+        match_routes(rebuild="--rebuild" in sys.argv)
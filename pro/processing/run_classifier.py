@@ -0,0 +1,346 @@
+import sqlite3
+import sys
+from datetime import date
+
+import numpy as np
+
+from database.database import bump_data_version
+from processing.units import METERS_PER_MILE
+
+# ---------------------------------------------------------
+# Labels every run as easy / tempo / interval / long / race.
+#
+# 1. Features (one row per run in "run_features"):
+#    - distance and average pace
+#    - pace relative to recent easy pace and distance relative
+#      to recent typical distance (previous REFERENCE_DAYS)
+#    - pace variability across mile splits
+#    - HR zone mix (share of time in zones 1-2 and 4-5)
+#    - rep count from interval detection
+#    - Strava's own workout_type tag, when the athlete set one
+# 2. Every row without a label is classified in one vectorized
+#    pass of rules (np.select, first match wins).
+#
+# Runs are dated by their local start date. Each row records a
+# source version (mile split stats and the zone / interval
+# versions it was built from), and each pass only computes
+# features for runs that are new, changed or have new source
+# data, plus the runs whose reference window holds a run that
+# was added, moved or deleted. Of those, only rows whose values
+# changed are written, and those lose their label. So a run
+# classified before its splits, zones or intervals existed is
+# reclassified once they appear, and an unchanged history is
+# left alone. --relabel rewrites every row and reclassifies
+# them all (e.g. after changing the rules or features).
+#
+# Run after splits, zones and intervals (from the pro/ folder):
+#   python -m processing.run_classifier
+#   python -m processing.run_classifier --relabel
+# ---------------------------------------------------------
+
+
+LABELS = ("race", "interval", "long", "tempo", "easy")
+
+# Strava workout_type values for runs
+WORKOUT_RACE = 1
+WORKOUT_LONG = 2
+WORKOUT_WORKOUT = 3
+
+# Recent-history reference for relative pace / distance
+REFERENCE_DAYS = 42
+MIN_REFERENCE_RUNS = 3
+EASY_PACE_PERCENTILE = 60   # most runs are easy, so this sits in the easy band
+
+# Rule thresholds (relative pace < 1 is faster than easy pace)
+RACE_RELATIVE_PACE = 0.85
+RACE_MAX_PACE_CV = 0.06
+RACE_MIN_DISTANCE = 1500        # meters - shorter fast runs are strides, not races
+RACE_MIN_HR_HARD = 0.5
+INTERVAL_MIN_REPS = 3
+INTERVAL_MIN_PACE_CV = 0.08
+LONG_MIN_DISTANCE = 16000       # meters
+LONG_RELATIVE_DISTANCE = 1.5
+LONG_ALWAYS_DISTANCE = 24000    # meters
+TEMPO_RELATIVE_PACE = 0.93
+TEMPO_MIN_HR_HARD = 0.4
+
+
+FEATURE_COLUMNS = (
+    "date", "distance", "pace", "relative_pace", "relative_distance", "pace_cv",
+    "hr_easy_fraction", "hr_hard_fraction", "rep_count", "workout_type"
+)
+
+
+def load_runs(cursor):
+    """
+    (ids, dates, days, distance, pace, workout_type, source_versions) for
+    every run, oldest first by local start date.
+    """
+    cursor.execute(f"""
+        SELECT a.id, substr(COALESCE(a.start_date_local, a.start_date), 1, 10),
+               a.distance, a.moving_time, a.workout_type,
+               COALESCE(s.version, '') || '|' || COALESCE(z.boundaries || h.stream_version, '')
+               || '|' || COALESCE(i.stream_version, '')
+        FROM activities a
+        LEFT JOIN (
+            SELECT activity_id, COUNT(*) || ':' || SUM(pace) AS version
+            FROM splits
+            WHERE split_length = {METERS_PER_MILE} AND distance >= {METERS_PER_MILE - 1}
+            GROUP BY activity_id
+        ) s ON s.activity_id = a.id
+        LEFT JOIN activity_zones z ON z.activity_id = a.id
+        LEFT JOIN zone_histograms h ON h.activity_id = a.id
+        LEFT JOIN interval_summary i ON i.activity_id = a.id
+        WHERE a.sport_type = 'Run' AND a.distance > 0 AND a.moving_time > 0
+        ORDER BY 2, a.start_date
+    """)
+    rows = cursor.fetchall()
+
+    ids = np.array([r[0] for r in rows], dtype=np.int64)
+    dates = [r[1] for r in rows]
+    days = np.array([date.fromisoformat(d).toordinal() for d in dates], dtype=np.int64)
+    distance = np.array([r[2] for r in rows], dtype=float)
+    pace = np.array([r[3] for r in rows], dtype=float) / distance * METERS_PER_MILE
+    workout_type = np.array([r[4] for r in rows], dtype=float)  # None -> NaN
+    sources = [r[5] for r in rows]
+    return ids, dates, days, distance, pace, workout_type, sources
+
+
+def reference_windows(days, rows):
+    """[lo, hi) positions of the runs in the REFERENCE_DAYS before each of the given rows."""
+    lo = np.searchsorted(days, days[rows] - REFERENCE_DAYS, side="left")
+    hi = np.searchsorted(days, days[rows], side="left")
+    return lo, hi
+
+
+def recent_references(days, distance, pace, rows):
+    """
+    Easy pace and typical distance over the REFERENCE_DAYS before each of
+    the given rows (runs sorted by day), falling back to the whole history.
+    """
+    lo, hi = reference_windows(days, rows)
+
+    easy_pace = np.full(len(rows), np.percentile(pace, EASY_PACE_PERCENTILE))
+    typical_distance = np.full(len(rows), np.median(distance))
+
+    # Windows with enough runs, padded with NaN to one matrix
+    enough = np.flatnonzero(hi - lo >= MIN_REFERENCE_RUNS)
+    if len(enough):
+        lo, hi = lo[enough], hi[enough]
+        positions = lo[:, None] + np.arange((hi - lo).max())[None, :]
+        inside = positions < hi[:, None]
+        positions = np.minimum(positions, len(days) - 1)
+        easy_pace[enough] = np.nanpercentile(np.where(inside, pace[positions], np.nan),
+                                             EASY_PACE_PERCENTILE, axis=1)
+        typical_distance[enough] = np.nanmedian(np.where(inside, distance[positions], np.nan), axis=1)
+    return easy_pace, typical_distance
+
+
+def lookup(cursor, query, activity_ids, width):
+    """Per-activity rows of a grouped query as a float matrix aligned with activity_ids (NaN if missing)."""
+    out = np.full((len(activity_ids), width), np.nan)
+    position = {a: i for i, a in enumerate(activity_ids)}
+    for row in cursor.execute(query):
+        if row[0] in position:
+            out[position[row[0]]] = row[1:]
+    return out
+
+
+def pace_variability(cursor, activity_ids):
+    """Coefficient of variation of full mile split paces."""
+    stats = lookup(cursor, f"""
+        SELECT activity_id, AVG(pace), AVG(pace * pace)
+        FROM splits
+        WHERE split_length = {METERS_PER_MILE} AND distance >= {METERS_PER_MILE - 1}
+        GROUP BY activity_id
+        HAVING COUNT(*) >= 2
+    """, activity_ids, 2)
+    mean, mean_sq = stats[:, 0], stats[:, 1]
+    return np.sqrt(np.maximum(mean_sq - mean ** 2, 0)) / mean
+
+
+def hr_zone_mix(cursor, activity_ids):
+    """(easy, hard) fractions of HR zone time: zones 1-2 and zones 4-5."""
+    zones = lookup(cursor, """
+        SELECT activity_id, hr_z1, hr_z2, hr_z3, hr_z4, hr_z5 FROM activity_zones
+    """, activity_ids, 5)
+    total = zones.sum(axis=1)
+    total = np.where(total > 0, total, np.nan)
+    return (zones[:, 0] + zones[:, 1]) / total, (zones[:, 3] + zones[:, 4]) / total
+
+
+def rep_counts(cursor, activity_ids):
+    return lookup(cursor, "SELECT activity_id, rep_count FROM interval_summary", activity_ids, 1)[:, 0]
+
+
+def pending_rows(ids, dates, days, distance, pace, workout_type, sources, stored):
+    """
+    Positions of the runs whose features may have changed: new runs, runs
+    whose own values or source version changed, and runs whose reference
+    window holds a run that was added, moved, changed or deleted.
+    """
+    missing = (None,) * (len(FEATURE_COLUMNS) + 2)
+    own = np.zeros(len(ids), dtype=bool)
+    moved_days = []
+    for i, activity_id in enumerate(ids.tolist()):
+        old = stored.get(activity_id, missing)
+        wt = None if np.isnan(workout_type[i]) else workout_type[i]
+        # Date, distance and pace also feed the other runs' references
+        if old[1:4] != (dates[i], distance[i], pace[i]):
+            own[i] = True
+            moved_days.append(days[i])
+            if old[1] is not None:
+                moved_days.append(date.fromisoformat(old[1]).toordinal())
+        elif old[10] != wt or old[-1] != sources[i]:
+            own[i] = True
+
+    current = set(ids.tolist())
+    moved_days += [date.fromisoformat(old[1]).toordinal()
+                   for activity_id, old in stored.items() if activity_id not in current and old[1]]
+    if not moved_days:
+        return np.flatnonzero(own)
+
+    # Runs with a moved day in their window, and every run on the
+    # whole-history fallback (its reference is all runs)
+    moved_days = np.sort(moved_days)
+    lo, hi = reference_windows(days, np.arange(len(days)))
+    in_window = (np.searchsorted(moved_days, days, side="left")
+                 > np.searchsorted(moved_days, days - REFERENCE_DAYS, side="left"))
+    return np.flatnonzero(own | in_window | (hi - lo < MIN_REFERENCE_RUNS))
+
+
+def compute_features(cursor, recompute=False):
+    """
+    Feature rows for the runs that are new to run_features or whose
+    features changed since they were stored (every run if recompute),
+    plus the ids of stored runs that are no longer runs.
+    """
+    cursor.execute(f"SELECT activity_id, {', '.join(FEATURE_COLUMNS)}, source_version FROM run_features")
+    stored = {row[0]: row for row in cursor.fetchall()}
+
+    ids, dates, days, distance, pace, workout_type, sources = load_runs(cursor)
+    current = set(ids.tolist())
+    removed = [activity_id for activity_id in stored if activity_id not in current]
+    if len(ids) == 0:
+        return [], removed
+
+    if recompute:
+        rows = np.arange(len(ids))
+    else:
+        rows = pending_rows(ids, dates, days, distance, pace, workout_type, sources, stored)
+    if len(rows) == 0:
+        return [], removed
+
+    pending = ids[rows].tolist()
+    easy_pace, typical_distance = recent_references(days, distance, pace, rows)
+    hr_easy, hr_hard = hr_zone_mix(cursor, pending)
+
+    numeric = np.column_stack([
+        distance[rows],
+        pace[rows],
+        pace[rows] / easy_pace,
+        distance[rows] / typical_distance,
+        pace_variability(cursor, pending),
+        hr_easy,
+        hr_hard,
+        rep_counts(cursor, pending),
+        workout_type[rows]
+    ])
+    # NaN -> NULL
+    computed = [
+        (activity_id, dates[i]) + tuple(None if np.isnan(v) else v for v in values) + (sources[i],)
+        for activity_id, i, values in zip(pending, rows.tolist(), numeric.tolist())
+    ]
+    if recompute:
+        return computed, removed
+    return [row for row in computed if stored.get(row[0]) != row], removed
+
+
+def classify(features):
+    """
+    Vectorized rule-based labels for a dict of feature arrays
+    (NaN where a feature is unavailable). First matching rule wins.
+    """
+    wt = features["workout_type"]
+    relative_pace = features["relative_pace"]
+    pace_cv = features["pace_cv"]
+    hr_hard = features["hr_hard_fraction"]
+    reps = np.nan_to_num(features["rep_count"])
+    distance = features["distance"]
+
+    steady = np.isnan(pace_cv) | (pace_cv <= RACE_MAX_PACE_CV)
+    hard_hr = np.isnan(hr_hard) | (hr_hard >= RACE_MIN_HR_HARD)
+
+    conditions = [
+        (wt == WORKOUT_RACE) | ((relative_pace <= RACE_RELATIVE_PACE) & (distance >= RACE_MIN_DISTANCE)
+                               & steady & hard_hr & (reps < INTERVAL_MIN_REPS)),
+        (reps >= INTERVAL_MIN_REPS) | ((wt == WORKOUT_WORKOUT) & (pace_cv >= INTERVAL_MIN_PACE_CV)),
+        (wt == WORKOUT_LONG) | (distance >= LONG_ALWAYS_DISTANCE)
+        | ((distance >= LONG_MIN_DISTANCE) & (features["relative_distance"] >= LONG_RELATIVE_DISTANCE)),
+        (wt == WORKOUT_WORKOUT) | (relative_pace <= TEMPO_RELATIVE_PACE) | (hr_hard >= TEMPO_MIN_HR_HARD),
+    ]
+    return np.select(conditions, LABELS[:-1], default=LABELS[-1])
+
+
+def label_pending(cursor):
+    """Classify every run_features row without a label in one batch."""
+    columns = ("activity_id",) + FEATURE_COLUMNS[1:]
+    cursor.execute(f"SELECT {', '.join(columns)} FROM run_features WHERE label IS NULL")
+    rows = cursor.fetchall()
+    if not rows:
+        return 0
+
+    data = np.array(rows, dtype=float)  # NULL -> NaN
+    features = {name: data[:, i] for i, name in enumerate(columns)}
+    labels = classify(features)
+
+    cursor.executemany("UPDATE run_features SET label = ? WHERE activity_id = ?",
+                       zip(labels.tolist(), (r[0] for r in rows)))
+    return len(rows)
+
+
+def classify_runs(relabel=False):
+    conn = sqlite3.connect("strava.db")
+    cursor = conn.cursor()
+
+    rows, removed = compute_features(cursor, recompute=relabel)
+    print(f"Storing run features for {len(rows)} new or changed runs...")
+    # Replacing a row clears its label, so it is classified again below
+    cursor.executemany(f"""
+        INSERT OR REPLACE INTO run_features (activity_id, {", ".join(FEATURE_COLUMNS)}, source_version)
+        VALUES (?, {", ".join("?" * len(FEATURE_COLUMNS))}, ?)
+    """, rows)
+    # Deleted, or no longer a run
+    cursor.executemany("DELETE FROM run_features WHERE activity_id = ?", [(a,) for a in removed])
+
+    labeled = label_pending(cursor)
+    if rows or labeled or removed:
+        bump_data_version(cursor)
+    conn.commit()
+
+    cursor.execute("SELECT label, COUNT(*) FROM run_features GROUP BY label ORDER BY COUNT(*) DESC")
+    counts = ", ".join(f"{label}: {n}" for label, n in cursor.fetchall())
+    conn.close()
+
+    print(f"Labeled {labeled} runs ({counts})")
+
+
+def activity_ids_with_label(cursor, *labels, since=None):
+    """
+    IDs of runs with any of the given labels, oldest first, e.g.
+    activity_ids_with_label(cursor, "race") or (cursor, "long", since="2024-01-01").
+    """
+    query = f"""
+        SELECT activity_id FROM run_features
+        WHERE label IN ({", ".join("?" * len(labels))})
+    """
+    params = list(labels)
+    if since is not None:
+        query += " AND date >= ?"
+        params.append(since)
+    cursor.execute(query + " ORDER BY date", params)
+    return [row[0] for row in cursor.fetchall()]
+
+
+if __name__ == "__main__":
+    classify_runs(relabel="--relabel" in sys.argv)
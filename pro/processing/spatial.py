@@ -0,0 +1,198 @@
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+from processing.geometry import haversine, unpack_coords, EARTH_RADIUS
+
+# ---------------------------------------------------------
+# Spatial queries over the routes table:
+#
+#   activities_starting_near(cursor, lat, lng, radius)
+#       runs that started within radius meters of a point
+#   activities_passing_near(cursor, lat, lng, radius)
+#       runs whose track came within radius meters of a point
+#   activities_through_box(cursor, min_lat, min_lng, max_lat, max_lng)
+#       runs whose track entered a lat / lng box
+#
+# Each query is two steps:
+# 1. Prefilter with the R*Tree indexes (route_start_index /
+#    route_bbox_index, kept up to date by processing/geometry.py)
+# 2. Exact check of the candidates only, vectorized over all of
+#    their points / segments at once
+#
+# Run from the pro/ folder:
+#   python -m processing.spatial near LAT LNG [RADIUS_M]
+#   python -m processing.spatial passing LAT LNG [RADIUS_M]
+#   python -m processing.spatial box MIN_LAT MIN_LNG MAX_LAT MAX_LNG
+# ---------------------------------------------------------
+
+
+DEFAULT_RADIUS = 200  # meters
+METERS_PER_DEGREE = np.pi * EARTH_RADIUS / 180
+
+
+def radius_box(lat, lng, radius):
+    """(min_lat, max_lat, min_lng, max_lng) enclosing a circle of radius meters."""
+    dlat = radius / METERS_PER_DEGREE
+    dlng = radius / (METERS_PER_DEGREE * max(np.cos(np.radians(lat)), 1e-6))
+    return lat - dlat, lat + dlat, lng - dlng, lng + dlng
+
+
+def index_candidates(cursor, index, min_lat, max_lat, min_lng, max_lng):
+    """Ids whose indexed box overlaps the query box."""
+    cursor.execute(f"""
+        SELECT id FROM {index}
+        WHERE max_lat >= ? AND min_lat <= ? AND max_lng >= ? AND min_lng <= ?
+    """, (min_lat, max_lat, min_lng, max_lng))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def load_tracks(cursor, activity_ids):
+    """
+    Candidate tracks concatenated into one array.
+    Returns (ids, coords, owner) where coords is (n, 2) lat / lng
+    and owner[i] indexes ids for point i.
+    """
+    ids, tracks = [], []
+    for start in range(0, len(activity_ids), 500):
+        batch = activity_ids[start:start + 500]
+        cursor.execute(f"""
+            SELECT activity_id, coords FROM routes
+            WHERE activity_id IN ({", ".join("?" * len(batch))})
+        """, batch)
+        for activity_id, blob in cursor.fetchall():
+            ids.append(activity_id)
+            tracks.append(unpack_coords(blob).astype(float))
+
+    if not tracks:
+        return [], np.empty((0, 2)), np.empty(0, dtype=int)
+    owner = np.repeat(np.arange(len(tracks)), [len(t) for t in tracks])
+    return ids, np.concatenate(tracks), owner
+
+
+def segments(coords, owner):
+    """Start / end points of every segment that lies within one track."""
+    same_track = owner[1:] == owner[:-1]
+    return coords[:-1][same_track], coords[1:][same_track], owner[:-1][same_track]
+
+
+def activities_starting_near(cursor, lat, lng, radius=DEFAULT_RADIUS):
+    """[(activity_id, meters from the point)] for runs starting within radius, closest first."""
+    candidates = index_candidates(cursor, "route_start_index", *radius_box(lat, lng, radius))
+    if not candidates:
+        return []
+
+    cursor.execute(f"""
+        SELECT activity_id, start_lat, start_lng FROM routes
+        WHERE activity_id IN ({", ".join("?" * len(candidates))})
+    """, candidates)
+    rows = np.array(cursor.fetchall(), dtype=float)
+    distance = haversine(lat, lng, rows[:, 1], rows[:, 2])
+
+    inside = np.flatnonzero(distance <= radius)
+    inside = inside[np.argsort(distance[inside])]
+    return [(int(rows[i, 0]), float(distance[i])) for i in inside]
+
+
+def activities_passing_near(cursor, lat, lng, radius=DEFAULT_RADIUS):
+    """[(activity_id, closest approach in meters)] for tracks passing within radius, closest first."""
+    ids, coords, owner = load_tracks(
+        cursor, index_candidates(cursor, "route_bbox_index", *radius_box(lat, lng, radius)))
+    if not ids:
+        return []
+
+    # Local flat projection around the query point (meters), fine at these radii
+    xy = np.column_stack([
+        (coords[:, 1] - lng) * METERS_PER_DEGREE * np.cos(np.radians(lat)),
+        (coords[:, 0] - lat) * METERS_PER_DEGREE
+    ])
+    a, b, seg_owner = segments(xy, owner)
+
+    # Distance from the origin to each segment, and to each point (single-point tracks)
+    ab = b - a
+    length_sq = np.einsum("ij,ij->i", ab, ab)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.clip(-np.einsum("ij,ij->i", a, ab) / length_sq, 0, 1)
+    t = np.nan_to_num(t)
+    closest = np.full(len(ids), np.inf)
+    np.minimum.at(closest, seg_owner, np.hypot(*(a + t[:, None] * ab).T))
+    np.minimum.at(closest, owner, np.hypot(xy[:, 0], xy[:, 1]))
+
+    inside = np.flatnonzero(closest <= radius)
+    inside = inside[np.argsort(closest[inside])]
+    return [(ids[i], float(closest[i])) for i in inside]
+
+
+def activities_through_box(cursor, min_lat, min_lng, max_lat, max_lng):
+    """Ids of runs with a point or a segment inside the box."""
+    ids, coords, owner = load_tracks(
+        cursor, index_candidates(cursor, "route_bbox_index", min_lat, max_lat, min_lng, max_lng))
+    if not ids:
+        return []
+
+    hit = np.zeros(len(ids), dtype=bool)
+    point_inside = ((coords[:, 0] >= min_lat) & (coords[:, 0] <= max_lat)
+                    & (coords[:, 1] >= min_lng) & (coords[:, 1] <= max_lng))
+    hit[owner[point_inside]] = True
+
+    # Segments crossing the box without a point inside it (Liang-Barsky clipping),
+    # only for tracks not already hit and segments whose own box overlaps the query
+    a, b, seg_owner = segments(coords, owner)
+    low, high = np.minimum(a, b), np.maximum(a, b)
+    maybe = (~hit[seg_owner] & (high[:, 0] >= min_lat) & (low[:, 0] <= max_lat)
+             & (high[:, 1] >= min_lng) & (low[:, 1] <= max_lng))
+    a, b, seg_owner = a[maybe], b[maybe], seg_owner[maybe]
+    d = b - a
+    p = np.column_stack([-d[:, 0], d[:, 0], -d[:, 1], d[:, 1]])
+    q = np.column_stack([a[:, 0] - min_lat, max_lat - a[:, 0], a[:, 1] - min_lng, max_lng - a[:, 1]])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = q / p
+    t_enter = np.max(np.where(p < 0, r, 0), axis=1)
+    t_exit = np.min(np.where(p > 0, r, 1), axis=1)
+    parallel_outside = np.any((p == 0) & (q < 0), axis=1)
+    hit[seg_owner[~parallel_outside & (t_enter <= t_exit)]] = True
+
+    return [ids[i] for i in np.flatnonzero(hit)]
+
+
+def describe(cursor, activity_ids):
+    """{activity_id: (date, name)}"""
+    if not activity_ids:
+        return {}
+    cursor.execute(f"""
+        SELECT id, substr(start_date, 1, 10), name FROM activities
+        WHERE id IN ({", ".join("?" * len(activity_ids))})
+    """, activity_ids)
+    return {row[0]: row[1:] for row in cursor.fetchall()}
+
+
+def main(args):
+    conn = sqlite3.connect("strava.db")
+    cursor = conn.cursor()
+
+    query, values = args[0], [float(v) for v in args[1:]]
+    started = time.perf_counter()
+    if query == "near":
+        results = activities_starting_near(cursor, *values)
+    elif query == "passing":
+        results = activities_passing_near(cursor, *values)
+    elif query == "box":
+        results = [(activity_id, None) for activity_id in activities_through_box(cursor, *values)]
+    else:
+        raise SystemExit(f"Unknown query: {query} (expected near, passing or box)")
+    elapsed = (time.perf_counter() - started) * 1000
+
+    info = describe(cursor, [activity_id for activity_id, _ in results])
+    for activity_id, distance in results:
+        date, name = info.get(activity_id, ("", ""))
+        suffix = f"  ({distance:.0f} m)" if distance is not None else ""
+        print(f"{date}  {activity_id}  {name}{suffix}")
+    print(f"{len(results)} activities in {elapsed:.1f} ms")
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
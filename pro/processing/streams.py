@@ -0,0 +1,81 @@
+import numpy as np
+
+# ---------------------------------------------------------
+# Shared helpers for reading per-second stream data out of
+# the "streams" table as NumPy arrays.
+#
+# Streams are loaded one activity at a time so a full pass
+# over the history never holds more than a single activity's
+# samples in memory.
+# ---------------------------------------------------------
+
+
+# Columns available in the streams table
+STREAM_COLUMNS = ("time", "heartrate", "pace", "cadence", "lat", "lng", "elevation", "grade", "distance")
+
+# Gaps in the time stream longer than this many seconds are
+# auto-pause / stopped time, for every stage
+PAUSE_GAP = 10
+
+
+def load_streams(cursor, activity_id, columns=STREAM_COLUMNS):
+    """
+    Load one activity's streams as a dict of float arrays ordered by time.
+    Missing values come back as NaN. Returns None if the activity has no streams.
+    """
+    cursor.execute(f"""
+        SELECT {", ".join(columns)}
+        FROM streams
+        WHERE activity_id = ?
+        ORDER BY time
+    """, (activity_id,))
+    rows = cursor.fetchall()
+
+    if not rows:
+        return None
+
+    data = np.array(rows, dtype=float)
+    return {name: data[:, i] for i, name in enumerate(columns)}
+
+
+def activity_ids_with_streams(cursor):
+    """IDs of every activity that has at least one stream row."""
+    cursor.execute("SELECT DISTINCT activity_id FROM streams")
+    return [row[0] for row in cursor.fetchall()]
+
+
+def stream_versions(cursor):
+    """
+    {activity_id: version} of every activity's stored streams.
+
+    The version is the sample count and highest row id, which both move
+    when insert_streams.py replaces an activity's rows, plus ":c" once
+    processing.clean_streams has repaired that copy in place. Stages
+    store the version they were computed from and redo an activity
+    whose streams no longer match it.
+    """
+    cursor.execute("""
+        SELECT s.activity_id, COUNT(*) || ':' || MAX(s.id), q.stream_version
+        FROM streams s
+        LEFT JOIN stream_quality q ON q.activity_id = s.activity_id
+        GROUP BY s.activity_id
+    """)
+    return {a: version + (":c" if cleaned == version else "") for a, version, cleaned in cursor.fetchall()}
+
+
+def iter_streams(cursor, activity_ids, columns=STREAM_COLUMNS):
+    """Yield (activity_id, streams) for each activity that has stream data."""
+    for activity_id in activity_ids:
+        streams = load_streams(cursor, activity_id, columns)
+        if streams is not None:
+            yield activity_id, streams
+
+
+def sample_durations(t, max_gap=PAUSE_GAP):
+    """
+    Seconds each sample represents, from the gaps in the time stream.
+    Gaps longer than max_gap (auto-pause) are capped so a stopped watch
+    doesn't count as time spent at the next sample's value.
+    """
+    dt = np.diff(t, prepend=t[0])
+    return np.clip(np.nan_to_num(dt), 0, max_gap)
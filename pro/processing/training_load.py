@@ -0,0 +1,228 @@
+import sqlite3
+import json
+import math
+from datetime import date, timedelta
+
+import numpy as np
+
+from database.database import bump_data_version
+from processing.streams import load_streams, sample_durations, stream_versions, PAUSE_GAP
+
+# ---------------------------------------------------------
+# Training load engine
+#
+# 1. Per-activity TRIMP from heart-rate streams
+#    - Banister: minutes * HRr * 0.64 * e^(1.92 * HRr)
+#    - Edwards: minutes in each 10% HRmax zone (50-100%) weighted 1..5
+#    Activities without a HR stream fall back to average_heartrate
+#    over moving_time.
+#
+# 2. Daily fitness / fatigue / form series
+#    - CTL (fitness): 42-day exponentially weighted load
+#    - ATL (fatigue): 7-day exponentially weighted load
+#    - TSB (form): yesterday's CTL - ATL
+#
+# Loads are dated by the activity's local start date. Both steps
+# are incremental: only activities missing from "activity_load"
+# (or stored with other HR settings, another date or from
+# streams that have since been replaced or cleaned) are
+# computed, and the daily series restarts from the last stored
+# day before the earliest changed activity.
+#
+# Run from the pro/ folder:  python -m processing.training_load
+# ---------------------------------------------------------
+
+
+# Athlete heart-rate settings. HR_MAX = None uses the highest
+# max_heartrate recorded in the activities table.
+HR_MAX = None
+HR_REST = 55
+BANISTER_WEIGHT = 1.92  # 1.67 for women
+
+CTL_DAYS = 42
+ATL_DAYS = 7
+
+
+def get_hr_max(cursor):
+    """Athlete max HR (HR_MAX, or the highest recorded max_heartrate)."""
+    if HR_MAX:
+        return HR_MAX
+    cursor.execute("SELECT MAX(max_heartrate) FROM activities")
+    recorded = cursor.fetchone()[0]
+    return recorded or 190
+
+
+def hr_settings(hr_max):
+    """Settings a TRIMP depends on, also used as the stored version string."""
+    return json.dumps({"hr_max": hr_max, "hr_rest": HR_REST, "banister_weight": BANISTER_WEIGHT,
+                       "pause_gap": PAUSE_GAP})
+
+
+def banister_trimp(hr, minutes, hr_max, hr_rest=HR_REST):
+    """Banister TRIMP for HR samples each lasting the given minutes."""
+    hrr = np.clip((hr - hr_rest) / (hr_max - hr_rest), 0, 1)
+    return float(np.nansum(minutes * hrr * 0.64 * np.exp(BANISTER_WEIGHT * hrr)))
+
+
+def edwards_trimp(hr, minutes, hr_max):
+    """Edwards TRIMP: minutes in 50-60%, ..., 90-100% HRmax weighted 1..5."""
+    zone = np.floor((hr / hr_max - 0.4) * 10)
+    weight = np.where(np.isnan(zone), 0, np.clip(zone, 0, 5))
+    return float(np.sum(minutes * weight))
+
+
+def activity_trimp(cursor, activity_id, hr_max):
+    """(banister, edwards, source) for one activity, or None without any HR."""
+    streams = load_streams(cursor, activity_id, ("time", "heartrate"))
+
+    if streams is not None and not np.all(np.isnan(streams["heartrate"])):
+        minutes = sample_durations(streams["time"]) / 60
+        hr = streams["heartrate"]
+        return banister_trimp(hr, minutes, hr_max), edwards_trimp(hr, minutes, hr_max), "stream"
+
+    # No HR stream - treat the whole activity as one sample at average HR
+    cursor.execute("SELECT average_heartrate, moving_time FROM activities WHERE id = ?", (activity_id,))
+    avg_hr, moving_time = cursor.fetchone()
+    if not avg_hr or not moving_time:
+        return None
+
+    hr = np.array([avg_hr])
+    minutes = np.array([moving_time / 60])
+    return banister_trimp(hr, minutes, hr_max), edwards_trimp(hr, minutes, hr_max), "average"
+
+
+def compute_activity_loads(conn):
+    """
+    Compute TRIMP for every activity not yet in activity_load, or stored
+    with other HR settings, on another date or from other streams.
+    Returns (activities computed, earliest date whose daily load changed or None).
+    """
+    cursor = conn.cursor()
+    hr_max = get_hr_max(cursor)
+    settings = hr_settings(hr_max)
+
+    versions = stream_versions(cursor)
+
+    cursor.execute("""
+        SELECT a.id, substr(COALESCE(a.start_date_local, a.start_date), 1, 10), l.date, l.trimp_banister,
+               l.hr_settings, l.stream_version
+        FROM activities a
+        LEFT JOIN activity_load l ON l.activity_id = a.id
+        ORDER BY a.start_date
+    """)
+    pending = [
+        (activity_id, day, old_day, old_banister)
+        for activity_id, day, old_day, old_banister, old_settings, old_version in cursor.fetchall()
+        if old_day != day or old_settings != settings or old_version != versions.get(activity_id)
+    ]
+
+    print(f"Computing TRIMP for {len(pending)} new or changed activities (HR max {hr_max}, rest {HR_REST})...")
+
+    changed_days = []
+    for activity_id, day, old_day, old_banister in pending:
+        load = activity_trimp(cursor, activity_id, hr_max)
+
+        # Store activities without HR as 0 so they aren't revisited every run
+        banister, edwards, source = load if load else (0.0, 0.0, "none")
+
+        cursor.execute("""
+            INSERT OR REPLACE INTO activity_load (
+                activity_id, date, trimp_banister, trimp_edwards, source, hr_settings, stream_version
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (activity_id, day, banister, edwards, source, settings, versions.get(activity_id)))
+
+        if banister > 0:
+            changed_days.append(day)
+        if old_banister:
+            changed_days.append(old_day)
+
+    conn.commit()
+    return len(pending), min(changed_days, default=None)
+
+
+def update_daily_load(conn, since=None):
+    """
+    Extend the daily CTL/ATL/TSB series through today.
+
+    The recurrence restarts from the stored day before `since` (or the
+    last stored day when since is None), so only the affected tail of the
+    history is recomputed. Returns the number of days written.
+    """
+    cursor = conn.cursor()
+
+    if since is None:
+        cursor.execute("SELECT MAX(date) FROM training_load")
+        last = cursor.fetchone()[0]
+        if last:
+            since = (date.fromisoformat(last) + timedelta(days=1)).isoformat()
+        else:
+            cursor.execute("SELECT MIN(date) FROM activity_load")
+            since = cursor.fetchone()[0]
+
+    if since is None:
+        print("No activity loads to build a training load series from.")
+        return 0
+
+    # Starting state: the stored day before `since`, or zero for a fresh series
+    start = date.fromisoformat(since)
+    cursor.execute("SELECT ctl, atl FROM training_load WHERE date = ?",
+                   ((start - timedelta(days=1)).isoformat(),))
+    row = cursor.fetchone()
+    ctl, atl = row if row else (0.0, 0.0)
+
+    # Daily TRIMP totals from `since` onward
+    cursor.execute("""
+        SELECT date, SUM(trimp_banister)
+        FROM activity_load
+        WHERE date >= ?
+        GROUP BY date
+    """, (since,))
+    daily_trimp = dict(cursor.fetchall())
+
+    end = max([date.today()] + [date.fromisoformat(d) for d in daily_trimp])
+    n_days = (end - start).days + 1
+    if n_days <= 0:
+        return 0
+
+    ctl_decay = math.exp(-1 / CTL_DAYS)
+    atl_decay = math.exp(-1 / ATL_DAYS)
+
+    rows = []
+    for i in range(n_days):
+        day = (start + timedelta(days=i)).isoformat()
+        trimp = daily_trimp.get(day, 0.0)
+        tsb = ctl - atl
+        ctl = ctl * ctl_decay + trimp * (1 - ctl_decay)
+        atl = atl * atl_decay + trimp * (1 - atl_decay)
+        rows.append((day, trimp, ctl, atl, tsb))
+
+    cursor.executemany("""
+        INSERT OR REPLACE INTO training_load (date, trimp, ctl, atl, tsb)
+        VALUES (?, ?, ?, ?, ?)
+    """, rows)
+    conn.commit()
+
+    print(f"Updated training load for {len(rows)} days ({rows[0][0]} to {rows[-1][0]}).")
+    return len(rows)
+
+
+def update_training_load():
+    conn = sqlite3.connect("strava.db")
+
+    computed, earliest = compute_activity_loads(conn)
+
+    # Changed activities dated before the stored tail force a restart from there
+    cursor = conn.cursor()
+    cursor.execute("SELECT MAX(date) FROM training_load")
+    last = cursor.fetchone()[0]
+    since = earliest if earliest and (last is None or earliest <= last) else None
+
+    days = update_daily_load(conn, since)
+    if computed or days:
+        bump_data_version(cursor)
+        conn.commit()
+    conn.close()
+
+
+if __name__ == "__main__":
+    update_training_load()
@@ -0,0 +1,7 @@
+# ---------------------------------------------------------
+# Unit constants shared by the processing stages, models and
+# backend, so importing one doesn't pull in any stage's code.
+# ---------------------------------------------------------
+
+
+METERS_PER_MILE = 1609.34  # also the split_length of the mile splits
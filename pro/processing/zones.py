@@ -0,0 +1,180 @@
+import sqlite3
+import json
+
+import numpy as np
+
+from processing.units import METERS_PER_MILE
+from processing.streams import iter_streams, sample_durations, stream_versions, PAUSE_GAP
+from processing.training_load import get_hr_max
+
+# ---------------------------------------------------------
+# Time-in-zone for heart rate and pace
+#
+# Each activity's streams are reduced once to fine histograms
+# (seconds per 1 bpm, seconds per 5 s/mile of pace) weighted by
+# the real gaps in the time stream, and stored packed in
+# "zone_histograms". Zone totals in "activity_zones" are then
+# just sums over histogram bins, so changing zone boundaries
+# rebuilds every activity from the histograms without reading
+# a single stream row. Histograms record the stream version
+# they were built from (processing.streams.stream_versions) and
+# the pause gap, and are rebuilt once either changes.
+#
+# Run from the pro/ folder:  python -m processing.zones
+# ---------------------------------------------------------
+
+
+# HR zone boundaries as fractions of max HR (zone 1 below the first)
+HR_ZONE_FRACTIONS = [0.60, 0.70, 0.80, 0.90]
+
+# Pace zone boundaries in seconds per mile, slowest first
+# (zone 1 slower than 10:00, zone 5 faster than 7:00)
+PACE_ZONES = [600, 540, 480, 420]
+
+# Histogram layout
+HR_BINS = 250               # 1 bpm bins, 0-249 bpm
+PACE_MIN = 180              # 3:00 / mile
+PACE_BIN_SECONDS = 5
+PACE_BINS = 204             # up to 20:00 / mile
+MIN_SPEED = 0.5             # m/s - slower than this counts as stopped
+
+BATCH_SIZE = 500
+
+
+def zone_histograms(streams):
+    """(hr_seconds, pace_seconds) fine histograms for one activity's streams."""
+    seconds = sample_durations(streams["time"])
+
+    hr = streams["heartrate"]
+    has_hr = ~np.isnan(hr)
+    hr_bins = np.clip(hr[has_hr].astype(int), 0, HR_BINS - 1)
+    hr_seconds = np.bincount(hr_bins, weights=seconds[has_hr], minlength=HR_BINS)
+
+    speed = streams["pace"]
+    moving = speed >= MIN_SPEED  # NaN compares False
+    pace = METERS_PER_MILE / speed[moving]
+    pace_bins = np.clip(((pace - PACE_MIN) // PACE_BIN_SECONDS).astype(int), 0, PACE_BINS - 1)
+    pace_seconds = np.bincount(pace_bins, weights=seconds[moving], minlength=PACE_BINS)
+
+    return hr_seconds.astype(np.float32), pace_seconds.astype(np.float32)
+
+
+def zone_boundaries(hr_max):
+    """Current zone boundaries, also used as the stored version string."""
+    hr = [round(f * hr_max) for f in HR_ZONE_FRACTIONS]
+    return {"hr": hr, "pace": PACE_ZONES}
+
+
+def bin_to_zone_matrices(boundaries):
+    """
+    0/1 matrices mapping histogram bins to zones, so zone totals for a
+    whole batch of activities are a single matrix product.
+    """
+    hr_centers = np.arange(HR_BINS) + 0.5
+    hr_zone = np.digitize(hr_centers, boundaries["hr"])
+
+    # Pace boundaries run slowest -> fastest, so digitize on negative pace
+    pace_centers = PACE_MIN + (np.arange(PACE_BINS) + 0.5) * PACE_BIN_SECONDS
+    pace_zone = np.digitize(-pace_centers, [-p for p in boundaries["pace"]])
+
+    n_zones = len(boundaries["hr"]) + 1
+    return np.eye(n_zones)[hr_zone], np.eye(n_zones)[pace_zone]
+
+
+def write_zone_rows(cursor, activity_ids, hr_hists, pace_hists, boundaries):
+    """Collapse a batch of histograms into zone totals and store them."""
+    hr_map, pace_map = bin_to_zone_matrices(boundaries)
+    hr_zones = np.asarray(hr_hists, dtype=float) @ hr_map
+    pace_zones = np.asarray(pace_hists, dtype=float) @ pace_map
+    version = json.dumps(boundaries)
+
+    cursor.executemany("""
+        INSERT OR REPLACE INTO activity_zones (
+            activity_id, boundaries,
+            hr_z1, hr_z2, hr_z3, hr_z4, hr_z5,
+            pace_z1, pace_z2, pace_z3, pace_z4, pace_z5
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (activity_id, version, *map(float, hr_row), *map(float, pace_row))
+        for activity_id, hr_row, pace_row in zip(activity_ids, hr_zones, pace_zones)
+    ])
+
+
+def compute_new_histograms(conn, boundaries):
+    """Build histograms (and zone rows) for activities without one from their current streams."""
+    cursor = conn.cursor()
+    # Sample weights depend on the pause gap, so it is part of the version
+    versions = {a: f"{version}/{PAUSE_GAP}" for a, version in stream_versions(cursor).items()}
+    done = dict(cursor.execute("SELECT activity_id, stream_version FROM zone_histograms"))
+    pending = [a for a, version in versions.items() if done.get(a) != version]
+
+    print(f"Computing zone histograms for {len(pending)} activities...")
+
+    for start in range(0, len(pending), BATCH_SIZE):
+        batch = pending[start:start + BATCH_SIZE]
+        ids, hr_hists, pace_hists = [], [], []
+
+        for activity_id, streams in iter_streams(cursor, batch, ("time", "heartrate", "pace")):
+            hr_seconds, pace_seconds = zone_histograms(streams)
+            ids.append(activity_id)
+            hr_hists.append(hr_seconds)
+            pace_hists.append(pace_seconds)
+
+        cursor.executemany("""
+            INSERT OR REPLACE INTO zone_histograms (activity_id, hr_seconds, pace_seconds, stream_version)
+            VALUES (?, ?, ?, ?)
+        """, [(a, h.tobytes(), p.tobytes(), versions[a]) for a, h, p in zip(ids, hr_hists, pace_hists)])
+
+        if ids:
+            write_zone_rows(cursor, ids, hr_hists, pace_hists, boundaries)
+        conn.commit()
+
+
+def rebuild_zones(conn, boundaries):
+    """Recompute zone totals from stored histograms wherever the boundaries changed."""
+    cursor = conn.cursor()
+    version = json.dumps(boundaries)
+
+    cursor.execute("""
+        SELECT h.activity_id
+        FROM zone_histograms h
+        LEFT JOIN activity_zones z ON z.activity_id = h.activity_id
+        WHERE z.boundaries IS NULL OR z.boundaries != ?
+    """, (version,))
+    stale = [row[0] for row in cursor.fetchall()]
+
+    # Each histogram is ~2 KB, so batches keep memory flat for any history size
+    for start in range(0, len(stale), BATCH_SIZE):
+        batch = stale[start:start + BATCH_SIZE]
+        cursor.execute(f"""
+            SELECT activity_id, hr_seconds, pace_seconds
+            FROM zone_histograms
+            WHERE activity_id IN ({", ".join("?" * len(batch))})
+        """, batch)
+        rows = cursor.fetchall()
+
+        ids = [r[0] for r in rows]
+        hr_hists = [np.frombuffer(r[1], dtype=np.float32) for r in rows]
+        pace_hists = [np.frombuffer(r[2], dtype=np.float32) for r in rows]
+        write_zone_rows(cursor, ids, hr_hists, pace_hists, boundaries)
+
+    conn.commit()
+    if stale:
+        print(f"Rebuilt zone totals for {len(stale)} activities from stored histograms.")
+
+
+def update_zones():
+    conn = sqlite3.connect("strava.db")
+    boundaries = zone_boundaries(get_hr_max(conn.cursor()))
+
+    print(f"HR zones (bpm): {boundaries['hr']}  Pace zones (s/mile): {boundaries['pace']}")
+
+    compute_new_histograms(conn, boundaries)
+    rebuild_zones(conn, boundaries)
+
+    conn.close()
+    print("Zone data updated successfully!")
+
+
+if __name__ == "__main__":
+    update_zones()
@@ -0,0 +1,38 @@
+import numpy as np
+
+from processing.detect_intervals import detect_reps
+
+# Run from the pro/ folder:  python -m pytest tests
+
+
+def synthetic_run(seconds=1800, pauses=(), fast=(), speed=3.0, fast_speed=5.0, seed=0):
+    """1 Hz resampled streams like processing.resample.resample_time returns."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(seconds, dtype=float)
+    moving = np.ones(seconds, dtype=bool)
+    for start, length in pauses:
+        moving[start:start + length] = False
+
+    v = np.full(seconds, speed)
+    for start, length in fast:
+        v[start:start + length] = fast_speed
+    pace = np.where(moving, v + rng.normal(0, 0.1, seconds), np.nan)
+    distance = np.where(moving, np.cumsum(np.nan_to_num(pace)), np.nan)
+    return {"time": t, "pace": pace, "distance": distance, "moving": moving}
+
+
+def test_steady_run_with_stops_has_no_reps():
+    for seed in range(5):
+        for pauses in ([(500, 60), (1200, 60)], [(s, 60) for s in range(100, 1700, 300)]):
+            reps, recovery_pace = detect_reps(synthetic_run(pauses=pauses, seed=seed))
+            assert reps == []
+            assert recovery_pace is None
+
+
+def test_intervals_are_found_across_a_pause():
+    fast = [(300 + k * 180, 90) for k in range(6)]
+    reps, recovery_pace = detect_reps(synthetic_run(pauses=[(1000, 60)], fast=fast))
+
+    assert len(reps) == 6
+    # Recoveries are at the steady 3 m/s (~536 s/mile), not slowed by the stop
+    assert 500 < recovery_pace < 580